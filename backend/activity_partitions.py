@@ -0,0 +1,379 @@
+"""
+Monthly partitions for append-only activity tables
+Each partitioned table is split into one table per calendar month (e.g.
+user_login_history_202610), created on first use. Writes go to the month of
+the row's timestamp and windowed reads visit only the months they cover, so
+the hot path stays on small tables however much history accumulates. Months
+older than the table's retention are exported to gzipped JSON lines under
+ACTIVITY_ARCHIVE_DIR and dropped by a background maintenance thread; with
+several workers only the holder of the maintenance lease does the archiving.
+"""
+import gzip
+import json
+import os
+import re
+import socket
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+from sqlalchemy import Column, Float, Index, MetaData, String, Table, func, insert, inspect, select, text
+from sqlalchemy.exc import NoSuchTableError, OperationalError, ProgrammingError
+from sqlalchemy.schema import CreateIndex, CreateTable
+from config import settings
+from database import Base, engine
+from logger import logger
+
+# Partitions are defined at runtime outside Base.metadata, so create_all
+# never touches them. They carry no foreign keys: audit rows may outlive users.
+partition_metadata = MetaData()
+
+PARTITIONED: List["PartitionedTable"] = []
+
+
+def month_key(timestamp: str) -> str:
+    """'2026-10-19T08:00:00' -> '202610'"""
+    return timestamp[:4] + timestamp[5:7]
+
+
+def shift_month(key: str, months: int) -> str:
+    index = int(key[:4]) * 12 + int(key[4:]) - 1 + months
+    return f"{index // 12:04d}{index % 12 + 1:02d}"
+
+
+def current_month() -> str:
+    return datetime.utcnow().strftime("%Y%m")
+
+
+class PartitionedTable:
+    """
+    Month partitions shaped like `template`, split on `time_column` (ISO text)
+
+    indexes: {name: columns}; each partition gets `{name}_{YYYYMM}`
+    retention_months: full months kept before the current one (0 keeps all)
+    """
+
+    def __init__(
+        self,
+        template: Table,
+        time_column: str,
+        indexes: Dict[str, Sequence[str]],
+        retention_months: int = 0
+    ):
+        self.template = template
+        self.name = template.name
+        self.time_column = time_column
+        self.indexes = indexes
+        self.retention_months = retention_months
+        self._pattern = re.compile(rf"^{re.escape(self.name)}_(\d{{6}})$")
+        self._tables: Dict[str, Table] = {}
+        self._discovered = False
+        self._lock = threading.Lock()
+        PARTITIONED.append(self)
+
+    def _define(self, month: str) -> Table:
+        name = f"{self.name}_{month}"
+        table = partition_metadata.tables.get(name)
+        if table is not None:
+            return table
+        columns = [
+            Column(
+                c.name, c.type,
+                primary_key=c.primary_key,
+                nullable=c.nullable,
+                server_default=c.server_default.arg if c.server_default is not None else None
+            )
+            for c in self.template.columns
+        ]
+        table = Table(name, partition_metadata, *columns)
+        for index_name, index_columns in self.indexes.items():
+            Index(f"{index_name}_{month}", *(table.c[c] for c in index_columns))
+        return table
+
+    def _discover(self):
+        if self._discovered:
+            return
+        with self._lock:
+            if self._discovered:
+                return
+            for name in inspect(engine).get_table_names():
+                match = self._pattern.match(name)
+                if match:
+                    self._tables.setdefault(match.group(1), self._define(match.group(1)))
+            self._discovered = True
+
+    def table_for(self, timestamp: str, conn=None) -> Table:
+        """Partition holding an ISO timestamp, created if missing"""
+        self._discover()
+        month = month_key(timestamp)
+        table = self._tables.get(month)
+        if table is not None:
+            return table
+        with self._lock:
+            table = self._tables.get(month)
+            if table is None:
+                table = self._define(month)
+                # IF NOT EXISTS: another worker may create the same month concurrently
+                if conn is not None:
+                    self._create(conn, table)
+                else:
+                    with engine.begin() as new_conn:
+                        self._create(new_conn, table)
+                self._tables[month] = table
+        return table
+
+    @staticmethod
+    def _create(conn, table: Table):
+        conn.execute(CreateTable(table, if_not_exists=True))
+        for index in table.indexes:
+            conn.execute(CreateIndex(index, if_not_exists=True))
+
+    def current(self) -> Table:
+        return self.table_for(datetime.utcnow().isoformat())
+
+    def oldest_kept(self) -> Optional[str]:
+        """First month inside retention, or None if everything is kept"""
+        if self.retention_months <= 0:
+            return None
+        return shift_month(current_month(), -self.retention_months)
+
+    def covering(self, since: Optional[str] = None) -> List[Table]:
+        """
+        Partitions with rows at or after `since` (ISO), newest first
+        The current month is always included; months past retention never
+        are, so no query reads a partition that may be archived under it.
+        """
+        self.current()
+        lowest = max(filter(None, [month_key(since) if since else None, self.oldest_kept()]), default="")
+        return [self._tables[m] for m in sorted(self._tables, reverse=True) if m >= lowest]
+
+    def _forget(self, month: str, table: Table):
+        with self._lock:
+            self._tables.pop(month, None)
+        if partition_metadata.tables.get(table.name) is table:
+            partition_metadata.remove(table)
+
+    def refresh(self):
+        """Re-read the partition list, forgetting months another worker dropped"""
+        existing = set(inspect(engine).get_table_names())
+        for month, table in list(self._tables.items()):
+            if table.name not in existing:
+                self._forget(month, table)
+        self._discovered = False
+        self._discover()
+
+    def aged(self) -> List[Tuple[str, Table]]:
+        """Partitions older than retention, oldest first"""
+        self._discover()
+        oldest = self.oldest_kept()
+        if oldest is None:
+            return []
+        return [(m, self._tables[m]) for m in sorted(self._tables) if m < oldest]
+
+    def absorb(self, conn) -> int:
+        """Move rows from the unpartitioned template table into month partitions"""
+        time_column = self.template.c[self.time_column]
+        month = func.substr(time_column, 1, 7)
+        months = [row[0] for row in conn.execute(select(month).distinct()) if row[0]]
+        moved = 0
+        for prefix in months:
+            table = self.table_for(f"{prefix}-01", conn)
+            moved += conn.execute(insert(table).from_select(
+                [c.name for c in self.template.columns],
+                select(*self.template.columns).where(month == prefix)
+            )).rowcount
+        conn.execute(self.template.delete())
+        return moved
+
+    def archive(self, month: str, table: Table, archive_dir: Optional[str]) -> int:
+        """
+        Export a partition to {archive_dir}/{name}.jsonl.gz (if set), then drop it
+        A partition already dropped (by a worker that held the lease before)
+        is forgotten and counts 0 rows.
+        """
+        if not inspect(engine).has_table(table.name):
+            self._forget(month, table)
+            return 0
+        rows = 0
+        if archive_dir:
+            os.makedirs(archive_dir, exist_ok=True)
+            archive_file = os.path.join(archive_dir, f"{table.name}.jsonl.gz")
+            if os.path.exists(archive_file):
+                # Rows written late into an already archived month
+                archive_file = os.path.join(archive_dir, f"{table.name}.{datetime.utcnow():%Y%m%d%H%M%S}.jsonl.gz")
+            tmp_file = f"{archive_file}.{os.getpid()}.tmp"
+            try:
+                with engine.connect() as conn, gzip.open(tmp_file, "wt", encoding="utf-8") as out:
+                    for row in conn.execute(select(table).order_by(table.c[self.time_column])).mappings():
+                        out.write(json.dumps(dict(row), default=str) + "\n")
+                        rows += 1
+            except (NoSuchTableError, OperationalError, ProgrammingError):
+                if os.path.exists(tmp_file):
+                    os.remove(tmp_file)
+                if inspect(engine).has_table(table.name):
+                    raise
+                # Dropped between the check and the export
+                self._forget(month, table)
+                return 0
+            os.replace(tmp_file, archive_file)
+        with engine.begin() as conn:
+            table.drop(conn, checkfirst=True)
+        self._forget(month, table)
+        logger.info(f"🗄️ Partition {table.name} archived ({rows} rows)")
+        return rows
+
+
+# ============= MAINTENANCE LEASE =============
+
+maintenance_leases = Table(
+    "maintenance_leases", Base.metadata,
+    Column("name", String, primary_key=True),
+    Column("holder", String, nullable=False),
+    Column("expires_at", Float, nullable=False)
+)
+
+
+def acquire_lease(name: str, holder: str, seconds: float) -> bool:
+    """Take or renew a named lease; False while another holder's lease is unexpired"""
+    now = time.time()
+    with engine.begin() as conn:
+        won = conn.execute(text("""
+            INSERT INTO maintenance_leases (name, holder, expires_at) VALUES (:name, :holder, :expires_at)
+            ON CONFLICT(name) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at
+            WHERE maintenance_leases.holder = excluded.holder OR maintenance_leases.expires_at <= :now
+            RETURNING holder
+        """), {"name": name, "holder": holder, "expires_at": now + seconds, "now": now}).first()
+    return won is not None
+
+
+def release_lease(name: str, holder: str):
+    with engine.begin() as conn:
+        conn.execute(maintenance_leases.delete().where(
+            maintenance_leases.c.name == name,
+            maintenance_leases.c.holder == holder
+        ))
+
+
+def read_archive(path: str):
+    """Rows of an archived partition, oldest first"""
+    with gzip.open(path, "rt", encoding="utf-8") as archive:
+        for line in archive:
+            yield json.loads(line)
+
+
+class PartitionMaintenance:
+    """
+    Creates upcoming partitions and archives aged ones on an interval
+    Every worker runs the thread, but only the one holding the
+    "activity-partitions" lease archives; a lease outlives one interval, so a
+    holder that dies is replaced by another worker within about two.
+    """
+
+    LEASE = "activity-partitions"
+
+    def __init__(self, interval_hours: float = 24, archive_dir: Optional[str] = None):
+        self.interval = interval_hours * 3600
+        self.archive_dir = archive_dir
+        self.holder = f"{socket.gethostname()}:{os.getpid()}"
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.leader = False
+        self.archived_partitions = 0
+        self.archived_rows = 0
+        self.failures = 0
+        self.last_run: Optional[str] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="partition-maintenance", daemon=True)
+        self._thread.start()
+        logger.info(f"✅ Partition maintenance started (every {self.interval / 3600:g}h)")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=10)
+            self._thread = None
+        if self.leader:
+            # Let another worker take over at its next run instead of after expiry
+            try:
+                release_lease(self.LEASE, self.holder)
+            except Exception as e:
+                logger.warning(f"⚠️ Partition maintenance lease not released: {e}")
+            self.leader = False
+
+    def _loop(self):
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"❌ Partition maintenance failed: {e}")
+            if self._stop.wait(self.interval):
+                return
+
+    def run_once(self) -> dict:
+        """
+        Create this and next month's partitions, then, if this worker holds
+        the lease, archive aged ones; a failure on one table does not stop
+        the others
+        """
+        started = time.perf_counter()
+        next_month = shift_month(current_month(), 1)
+        self.leader = acquire_lease(self.LEASE, self.holder, self.interval * 1.5)
+        archived = 0
+        failed = 0
+        for partitioned in PARTITIONED:
+            try:
+                # Another worker may have archived months since we last looked
+                partitioned.refresh()
+                # Month rollover then never creates a table on the request path
+                partitioned.current()
+                partitioned.table_for(f"{next_month[:4]}-{next_month[4:]}-01")
+                if not self.leader:
+                    continue
+                for month, table in partitioned.aged():
+                    self.archived_rows += partitioned.archive(month, table, self.archive_dir)
+                    archived += 1
+            except Exception as e:
+                failed += 1
+                logger.error(f"❌ Partition maintenance failed for {partitioned.name}: {e}")
+        self.archived_partitions += archived
+        self.failures += failed
+        self.last_run = datetime.utcnow().isoformat()
+        return {
+            "leader": self.leader,
+            "archived": archived,
+            "failed": failed,
+            "seconds": round(time.perf_counter() - started, 3)
+        }
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "leader": self.leader,
+            "holder": self.holder,
+            "archive_dir": self.archive_dir,
+            "archived_partitions": self.archived_partitions,
+            "archived_rows": self.archived_rows,
+            "failures": self.failures,
+            "last_run": self.last_run,
+            "tables": {
+                p.name: {
+                    "retention_months": p.retention_months,
+                    "partitions": [t.name for t in p.covering()]
+                }
+                for p in PARTITIONED
+            }
+        }
+
+
+partition_maintenance = PartitionMaintenance(
+    interval_hours=settings.ACTIVITY_MAINTENANCE_INTERVAL_HOURS,
+    archive_dir=settings.ACTIVITY_ARCHIVE_DIR or None
+)
@@ -0,0 +1,198 @@
+"""
+Write-behind queue for activity logging
+Request handlers enqueue audit rows without touching the database; a
+background thread group-commits them with one executemany per table
+"""
+import queue
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, Optional
+from sqlalchemy import Table, insert
+from sqlalchemy.exc import IntegrityError
+from config import settings
+from database import engine
+from logger import logger
+
+OVERFLOW_POLICIES = ("drop", "block")
+
+
+class ActivityWriter:
+    """Bounded in-memory queue flushed every `flush_interval_ms` or `batch_size` rows"""
+
+    def __init__(
+        self,
+        flush_interval_ms: int = 200,
+        batch_size: int = 500,
+        max_queue_size: int = 10000,
+        overflow_policy: str = "drop",
+        block_timeout_ms: int = 50
+    ):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"overflow_policy must be one of {OVERFLOW_POLICIES}")
+        self.flush_interval = flush_interval_ms / 1000
+        self.batch_size = batch_size
+        self.overflow_policy = overflow_policy
+        self.block_timeout = block_timeout_ms / 1000
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue_size)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.enqueued = 0
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self.flushes = 0
+        self.last_flush_ms = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="activity-writer", daemon=True)
+        self._thread.start()
+        logger.info(f"✅ Activity writer started (flush={self.flush_interval * 1000:.0f}ms, batch={self.batch_size})")
+
+    def stop(self, timeout: float = 10):
+        """Stop the flusher once everything already queued has been written"""
+        if not self.running:
+            return
+        self._stop.set()
+        self._thread.join(timeout=timeout)
+        self._thread = None
+        if self.queue_depth():
+            logger.warning(f"⚠️ Activity writer stopped with {self.queue_depth()} unwritten events")
+
+    def enqueue(self, table: Table, row: Dict[str, Any]) -> bool:
+        """
+        Queue one row for `table`; never waits on the database
+        When the queue is full the row is dropped ("drop") or the caller
+        waits up to block_timeout_ms for space first ("block").
+        Returns False if the row was dropped.
+        """
+        try:
+            if self.overflow_policy == "block":
+                self._queue.put((table, row), timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait((table, row))
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped % 1000 == 1:
+                logger.warning(f"⚠️ Activity queue full, {self.dropped} events dropped so far")
+            return False
+        self.enqueued += 1
+        return True
+
+    def flush(self):
+        """Block until every event queued so far has been written (or failed)"""
+        if self.running:
+            self._queue.join()
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "queue_depth": self.queue_depth(),
+            "queue_capacity": self._queue.maxsize,
+            "overflow_policy": self.overflow_policy,
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "flushes": self.flushes,
+            "last_flush_ms": round(self.last_flush_ms, 2)
+        }
+
+    def _run(self):
+        while not (self._stop.is_set() and self._queue.empty()):
+            batch = self._collect()
+            if batch:
+                self._write(batch)
+
+    def _collect(self) -> list:
+        """Wait for the first event, then gather more until the window or batch fills"""
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._stop.is_set():
+                # On shutdown, drain whatever is already queued without waiting
+                remaining = 0
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch: list):
+        """Group-commit a batch: one transaction, one executemany per table"""
+        rows_by_table = defaultdict(list)
+        for table, row in batch:
+            rows_by_table[table].append(row)
+
+        started = time.perf_counter()
+        try:
+            written = self._insert(rows_by_table)
+            self.written += written
+            self.failed += len(batch) - written
+        except Exception as e:
+            self.failed += len(batch)
+            logger.error(f"Activity flush failed, {len(batch)} events lost: {e}")
+        finally:
+            self.flushes += 1
+            self.last_flush_ms = (time.perf_counter() - started) * 1000
+            for _ in batch:
+                self._queue.task_done()
+
+
+    def _insert(self, rows_by_table: Dict[Table, list]) -> int:
+        """
+        Insert a batch in one transaction; returns the number of rows written
+        A constraint violation (e.g. a repeated session token) rolls back the
+        whole transaction, so the batch is then retried one table at a time
+        and the offending table row by row: only the bad row is lost.
+        """
+        total = sum(len(rows) for rows in rows_by_table.values())
+        try:
+            with engine.begin() as conn:
+                for table, rows in rows_by_table.items():
+                    conn.execute(insert(table), rows)
+            return total
+        except IntegrityError as e:
+            logger.warning(f"⚠️ Activity batch rejected, retrying per table: {e.orig}")
+
+        written = 0
+        for table, rows in rows_by_table.items():
+            try:
+                with engine.begin() as conn:
+                    conn.execute(insert(table), rows)
+                written += len(rows)
+                continue
+            except IntegrityError:
+                pass
+            for row in rows:
+                try:
+                    with engine.begin() as conn:
+                        conn.execute(insert(table), [row])
+                    written += 1
+                except IntegrityError as e:
+                    logger.error(f"❌ Activity event dropped ({table.name}): {e.orig}")
+        return written
+
+
+activity_writer = ActivityWriter(
+    flush_interval_ms=settings.ACTIVITY_FLUSH_INTERVAL_MS,
+    batch_size=settings.ACTIVITY_FLUSH_BATCH_SIZE,
+    max_queue_size=settings.ACTIVITY_QUEUE_SIZE,
+    overflow_policy=settings.ACTIVITY_OVERFLOW_POLICY,
+    block_timeout_ms=settings.ACTIVITY_BLOCK_TIMEOUT_MS
+)
@@ -0,0 +1,135 @@
+"""
+Prediction Analytics
+Server-side aggregation for the admin analytics dashboard. Counts come from
+the per-day prediction_rollups table; only the confidence histogram reads
+predictions, as a single grouped query over the requested date range.
+The response size depends on the range and bucket, never on table size.
+"""
+from datetime import date, datetime, time, timedelta
+from typing import Optional
+from fastapi import HTTPException
+from sqlalchemy import Integer, case, cast, func
+from sqlalchemy.orm import Session
+import models as db_models
+
+BUCKETS = ("day", "week", "month")
+HIGH_CONFIDENCE = 0.9
+DEFAULT_RANGE_DAYS = 30
+MAX_RANGE_DAYS = 3660
+RECENT_LIMIT = 10
+
+
+def bucket_key(day: date, bucket: str) -> str:
+    """Label for the bucket containing `day`: the day, its ISO week's Monday, or YYYY-MM"""
+    if bucket == "week":
+        return (day - timedelta(days=day.weekday())).isoformat()
+    if bucket == "month":
+        return day.strftime("%Y-%m")
+    return day.isoformat()
+
+
+def _rate(part: int, total: int) -> float:
+    return round(part / total, 4) if total else 0.0
+
+
+def get_analytics(
+    db: Session,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    bucket: str = "day",
+    bins: int = 10,
+    top_users: int = 10
+) -> dict:
+    if bucket not in BUCKETS:
+        raise HTTPException(status_code=400, detail=f"bucket must be one of {BUCKETS}")
+    if not 1 <= bins <= 100:
+        raise HTTPException(status_code=400, detail="bins must be between 1 and 100")
+
+    end = end or datetime.utcnow().date()
+    start = start or end - timedelta(days=DEFAULT_RANGE_DAYS - 1)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    if (end - start).days >= MAX_RANGE_DAYS:
+        raise HTTPException(status_code=400, detail=f"Date range is limited to {MAX_RANGE_DAYS} days")
+
+    R = db_models.PredictionRollup
+    P = db_models.Prediction
+    in_range = (R.day >= start.isoformat(), R.day <= end.isoformat())
+    parasitized = func.sum(case((R.prediction == "Parasitized", R.count), else_=0))
+
+    # Time series: one rollup row group per day, bucketed here (O(days))
+    series = {}
+    for day, total, infected in db.query(R.day, func.sum(R.count), parasitized).filter(*in_range).group_by(R.day):
+        key = bucket_key(date.fromisoformat(day), bucket)
+        entry = series.setdefault(key, {"bucket": key, "total": 0, "parasitized": 0})
+        entry["total"] += total
+        entry["parasitized"] += infected
+    for entry in series.values():
+        entry["uninfected"] = entry["total"] - entry["parasitized"]
+        entry["infection_rate"] = _rate(entry["parasitized"], entry["total"])
+
+    total = sum(entry["total"] for entry in series.values())
+    infected = sum(entry["parasitized"] for entry in series.values())
+
+    # Per-user breakdown, largest first
+    user_rows = db.query(
+        R.user_id, db_models.User.email, db_models.User.full_name,
+        func.sum(R.count).label("total"), parasitized.label("parasitized")
+    ).outerjoin(
+        db_models.User, db_models.User.id == R.user_id
+    ).filter(*in_range).group_by(
+        R.user_id, db_models.User.email, db_models.User.full_name
+    ).order_by(func.sum(R.count).desc()).limit(top_users).all()
+
+    # Confidence histogram over [0, 1] in `bins` equal-width bins
+    range_start = datetime.combine(start, time.min)
+    range_end = datetime.combine(end + timedelta(days=1), time.min)
+    scaled = P.confidence * bins
+    # CAST truncates on SQLite (confidences are non-negative); other dialects round, so floor first
+    truncated = cast(scaled if db.bind.dialect.name == "sqlite" else func.floor(scaled), Integer)
+    bin_index = case((P.confidence >= 1, bins - 1), else_=truncated)
+    counts = dict(db.query(bin_index, func.count()).filter(
+        P.created_at >= range_start,
+        P.created_at < range_end,
+        P.confidence.isnot(None)
+    ).group_by(bin_index).all())
+    high_confidence, mean_confidence = db.query(
+        func.coalesce(func.sum(case((P.confidence > HIGH_CONFIDENCE, 1), else_=0)), 0),
+        func.avg(P.confidence)
+    ).filter(P.created_at >= range_start, P.created_at < range_end).one()
+
+    recent = db.query(P.id, P.user_id, P.prediction, P.confidence, P.created_at).order_by(
+        P.created_at.desc(), P.id.desc()
+    ).limit(RECENT_LIMIT).all()
+
+    return {
+        "start": start,
+        "end": end,
+        "bucket": bucket,
+        "totals": {
+            "total": total,
+            "parasitized": infected,
+            "uninfected": total - infected,
+            "infection_rate": _rate(infected, total),
+            "high_confidence": high_confidence,
+            "high_confidence_rate": _rate(high_confidence, total),
+            "mean_confidence": round(mean_confidence, 4) if mean_confidence is not None else None
+        },
+        "series": [series[key] for key in sorted(series)],
+        "confidence_histogram": [
+            {"lower": round(i / bins, 4), "upper": round((i + 1) / bins, 4), "count": counts.get(i, 0)}
+            for i in range(bins)
+        ],
+        "by_user": [
+            {
+                "user_id": row.user_id,
+                "email": row.email,
+                "full_name": row.full_name,
+                "total": row.total,
+                "parasitized": row.parasitized,
+                "infection_rate": _rate(row.parasitized, row.total)
+            }
+            for row in user_rows
+        ],
+        "recent": [dict(row._mapping) for row in recent]
+    }
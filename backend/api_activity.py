@@ -5,6 +5,10 @@ View login history, signup data, and user activity
 from fastapi import APIRouter, Depends, HTTPException
 from typing import List, Dict, Any
 import user_activity
+from activity_partitions import partition_maintenance
+from activity_writer import activity_writer
+from login_guard import login_guard
+from session_tracker import session_tracker
 from auth import get_current_user, get_current_admin
 import models as db_models
 
@@ -14,7 +18,7 @@ router = APIRouter(prefix="/api/activity", tags=["User Activity"])
 # ============= USER ENDPOINTS =============
 
 @router.get("/my-logins")
-async def get_my_login_history(
+def get_my_login_history(
     limit: int = 50,
     current_user: db_models.User = Depends(get_current_user)
 ):
@@ -29,7 +33,7 @@ async def get_my_login_history(
 
 
 @router.get("/my-activity")
-async def get_my_activity(
+def get_my_activity(
     limit: int = 100,
     current_user: db_models.User = Depends(get_current_user)
 ):
@@ -44,7 +48,7 @@ async def get_my_activity(
 
 
 @router.get("/my-sessions")
-async def get_my_sessions(
+def get_my_sessions(
     current_user: db_models.User = Depends(get_current_user)
 ):
     """Get current user's active sessions"""
@@ -58,7 +62,7 @@ async def get_my_sessions(
 
 
 @router.get("/my-summary")
-async def get_my_activity_summary(
+def get_my_activity_summary(
     current_user: db_models.User = Depends(get_current_user)
 ):
     """Get current user's activity summary"""
@@ -73,7 +77,7 @@ async def get_my_activity_summary(
 # ============= ADMIN ENDPOINTS =============
 
 @router.get("/admin/login-stats")
-async def get_login_statistics(
+def get_login_statistics(
     days: int = 30,
     current_user: db_models.User = Depends(get_current_admin)
 ):
@@ -83,7 +87,7 @@ async def get_login_statistics(
 
 
 @router.get("/admin/signup-stats")
-async def get_signup_statistics(
+def get_signup_statistics(
     days: int = 30,
     current_user: db_models.User = Depends(get_current_admin)
 ):
@@ -93,7 +97,7 @@ async def get_signup_statistics(
 
 
 @router.get("/admin/recent-signups")
-async def get_recent_signups(
+def get_recent_signups(
     days: int = 7,
     limit: int = 100,
     current_user: db_models.User = Depends(get_current_admin)
@@ -108,7 +112,7 @@ async def get_recent_signups(
 
 
 @router.get("/admin/user/{user_id}/logins")
-async def get_user_logins(
+def get_user_logins(
     user_id: int,
     limit: int = 50,
     current_user: db_models.User = Depends(get_current_admin)
@@ -123,7 +127,7 @@ async def get_user_logins(
 
 
 @router.get("/admin/user/{user_id}/activity")
-async def get_user_activity_admin(
+def get_user_activity_admin(
     user_id: int,
     limit: int = 100,
     current_user: db_models.User = Depends(get_current_admin)
@@ -138,7 +142,7 @@ async def get_user_activity_admin(
 
 
 @router.get("/admin/user/{user_id}/summary")
-async def get_user_summary_admin(
+def get_user_summary_admin(
     user_id: int,
     current_user: db_models.User = Depends(get_current_admin)
 ):
@@ -151,7 +155,7 @@ async def get_user_summary_admin(
 
 
 @router.get("/admin/failed-logins/{email}")
-async def get_failed_logins(
+def get_failed_logins(
     email: str,
     hours: int = 24,
     current_user: db_models.User = Depends(get_current_admin)
@@ -164,3 +168,35 @@ async def get_failed_logins(
         "count": len(attempts),
         "period_hours": hours
     }
+
+
+@router.get("/admin/writer-stats")
+def get_writer_stats(
+    current_user: db_models.User = Depends(get_current_admin)
+):
+    """Get write-behind activity queue metrics (admin only)"""
+    return activity_writer.stats()
+
+
+@router.get("/admin/login-guard")
+def get_login_guard_stats(
+    current_user: db_models.User = Depends(get_current_admin)
+):
+    """Get brute-force guard counters for this worker (admin only)"""
+    return login_guard.stats()
+
+
+@router.get("/admin/session-tracker")
+def get_session_tracker_stats(
+    current_user: db_models.User = Depends(get_current_admin)
+):
+    """Get batched session-activity and sweep counters for this worker (admin only)"""
+    return session_tracker.stats()
+
+
+@router.get("/admin/partitions")
+def get_partition_stats(
+    current_user: db_models.User = Depends(get_current_admin)
+):
+    """Get live activity partitions, retention and archive counters (admin only)"""
+    return partition_maintenance.stats()
@@ -0,0 +1,141 @@
+"""
+Doctor API Endpoints
+Review work queue for doctors: list pending cases, claim them, record
+reviews, and the doctor dashboard's patients, appointments and stats
+"""
+from typing import List
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+import models as db_models
+import review_queue
+import schemas
+from appointment_queries import appointment_details_query, to_details
+from auth import get_current_doctor
+from database import get_db
+from logger import logger
+from pagination import page_limit
+
+router = APIRouter(prefix="/api/doctor", tags=["Doctor"])
+
+
+def _pending_case(prediction: db_models.Prediction, patient_name) -> db_models.Prediction:
+    """Attach the joined patient name for the PendingCase response"""
+    prediction.patient_name = patient_name
+    return prediction
+
+
+# ============= REVIEW QUEUE =============
+
+@router.get("/pending-cases", response_model=List[schemas.PendingCase])
+def get_pending_cases(
+    limit: int = 50,
+    current_user: db_models.User = Depends(get_current_doctor),
+    db: Session = Depends(get_db)
+):
+    """Pending cases in review order: this doctor's claims and unclaimed cases"""
+    rows = review_queue.pending_cases(db, current_user.id, page_limit(limit))
+    return [_pending_case(prediction, patient_name) for prediction, patient_name in rows]
+
+
+@router.post("/cases/claim-next", response_model=schemas.PendingCase)
+def claim_next_case(
+    current_user: db_models.User = Depends(get_current_doctor),
+    db: Session = Depends(get_db)
+):
+    """Claim the highest-priority unclaimed case"""
+    case_id = review_queue.claim_next(db, current_user.id)
+    if case_id is None:
+        raise HTTPException(status_code=404, detail="No cases waiting for review")
+    return _claimed_case(db, case_id)
+
+
+@router.post("/cases/{case_id}/claim", response_model=schemas.PendingCase)
+def claim_case(
+    case_id: int,
+    current_user: db_models.User = Depends(get_current_doctor),
+    db: Session = Depends(get_db)
+):
+    """Claim (or renew the claim on) a specific case"""
+    if not review_queue.claim_case(db, case_id, current_user.id):
+        raise HTTPException(status_code=409, detail="Case is already claimed or reviewed")
+    return _claimed_case(db, case_id)
+
+
+@router.post("/cases/{case_id}/release")
+def release_case(
+    case_id: int,
+    current_user: db_models.User = Depends(get_current_doctor),
+    db: Session = Depends(get_db)
+):
+    """Return a claimed case to the queue"""
+    if not review_queue.release_case(db, case_id, current_user.id):
+        raise HTTPException(status_code=409, detail="Case is not claimed by you")
+    return {"message": "Case released"}
+
+
+@router.put("/cases/{case_id}/review")
+def review_case(
+    case_id: int,
+    review: schemas.CaseReview,
+    current_user: db_models.User = Depends(get_current_doctor),
+    db: Session = Depends(get_db)
+):
+    """Record a review; fails with 409 if another doctor holds or already reviewed the case"""
+    if not review_queue.review_case(
+        db, case_id, current_user.id, review.status,
+        diagnosis=review.diagnosis, notes=review.notes, prescription=review.prescription
+    ):
+        if not db.query(db_models.Prediction.id).filter(db_models.Prediction.id == case_id).first():
+            raise HTTPException(status_code=404, detail="Case not found")
+        raise HTTPException(status_code=409, detail="Case is claimed by another doctor or already reviewed")
+
+    logger.info(f"Case {case_id} reviewed by {current_user.email}")
+    return {"message": "Case reviewed successfully"}
+
+
+def _claimed_case(db: Session, case_id: int) -> db_models.Prediction:
+    prediction, patient_name = db.query(
+        db_models.Prediction, db_models.Patient.name
+    ).outerjoin(
+        db_models.Patient, db_models.Patient.id == db_models.Prediction.patient_id
+    ).filter(db_models.Prediction.id == case_id).one()
+    return _pending_case(prediction, patient_name)
+
+
+# ============= DASHBOARD =============
+
+@router.get("/stats")
+def get_doctor_stats(
+    current_user: db_models.User = Depends(get_current_doctor),
+    db: Session = Depends(get_db)
+):
+    """Review totals from the per-doctor running counters"""
+    return review_queue.doctor_stats(db, current_user.id)
+
+
+@router.get("/appointments", response_model=List[schemas.AppointmentWithDetails])
+def get_doctor_appointments(
+    limit: int = 200,
+    current_user: db_models.User = Depends(get_current_doctor),
+    db: Session = Depends(get_db)
+):
+    """This doctor's appointments, most recent first"""
+    rows = appointment_details_query(db).filter(
+        db_models.Appointment.doctor_id == current_user.id
+    ).order_by(db_models.Appointment.appointment_date.desc()).limit(page_limit(limit)).all()
+    return [to_details(row) for row in rows]
+
+
+@router.get("/patients", response_model=List[schemas.Patient])
+def get_doctor_patients(
+    limit: int = 200,
+    current_user: db_models.User = Depends(get_current_doctor),
+    db: Session = Depends(get_db)
+):
+    """Patient records belonging to users who have booked with this doctor"""
+    booked = db.query(db_models.Appointment.patient_id).filter(
+        db_models.Appointment.doctor_id == current_user.id
+    )
+    return db.query(db_models.Patient).filter(
+        db_models.Patient.user_id.in_(booked)
+    ).order_by(db_models.Patient.created_at.desc()).limit(page_limit(limit)).all()
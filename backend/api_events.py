@@ -0,0 +1,71 @@
+"""
+Event Stream API Endpoints
+Server-Sent Events feed of prediction, review and appointment changes so
+dashboards can apply deltas instead of re-fetching their lists
+"""
+import asyncio
+import json
+from typing import Optional
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+import models as db_models
+from auth import get_current_admin, get_current_user_or_media_token
+from config import settings
+from database import get_db
+from event_bus import event_bus
+
+router = APIRouter(prefix="/api/events", tags=["Events"])
+
+
+def _format(event) -> str:
+    return f"id: {event.id}\nevent: {event.type}\ndata: {json.dumps(event.data)}\n\n"
+
+
+@router.get("")
+async def stream_events(
+    request: Request,
+    topics: Optional[str] = None,
+    current_user: db_models.User = Depends(get_current_user_or_media_token("events")),
+    db: Session = Depends(get_db)
+):
+    """
+    SSE stream for the current user. EventSource cannot send headers, so a
+    media token for scope "events" may be passed as ?access_token= (see
+    POST /api/auth/media-token). `topics` is a comma-separated list
+    of event prefixes (prediction, case, appointment); default is all.
+    """
+    # Don't hold a pooled connection (and SQLite read snapshot) for the life of the stream
+    db.close()
+    subscription = event_bus.subscribe(
+        current_user.id,
+        current_user.role,
+        [topic.strip() for topic in topics.split(",") if topic.strip()] if topics else None
+    )
+
+    async def stream():
+        try:
+            yield f"retry: {settings.EVENT_RETRY_MS}\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), settings.EVENT_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    # Comment line keeps proxies from closing an idle connection
+                    yield ": keepalive\n\n"
+                    continue
+                yield _format(event)
+        finally:
+            event_bus.unsubscribe(subscription)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get("/stats")
+async def get_event_stats(current_user: db_models.User = Depends(get_current_admin)):
+    """Connected subscribers, published events and overflow drops"""
+    # async: runs on the event loop, the only thread that touches subscriptions
+    return event_bus.stats()
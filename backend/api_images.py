@@ -0,0 +1,185 @@
+"""
+Image Serving API Endpoints
+Serves stored uploads and heatmaps with ETags, conditional GET, Range
+requests and cached thumbnail derivatives
+"""
+import hashlib
+import io
+import os
+import re
+from typing import Optional, Tuple
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from PIL import Image
+from sqlalchemy.orm import Session
+import image_storage
+import models as db_models
+from auth import get_current_user_or_media_token
+from config import settings
+from database import get_db
+from logger import logger
+
+router = APIRouter(prefix="/api/images", tags=["Images"])
+
+THUMB_DIR = f"{settings.UPLOAD_DIR}/thumbs"
+THUMBNAIL_SIZES = (64, 128, 256)
+CACHE_CONTROL = "private, max-age=86400"
+
+RANGE_PATTERN = re.compile(r"bytes=(\d*)-(\d*)$")
+
+
+def _content_type(data: bytes) -> str:
+    if data.startswith(b"\x89PNG"):
+        return "image/png"
+    if data.startswith(b"\xff\xd8"):
+        return "image/jpeg"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return "application/octet-stream"
+
+
+def _object_key(path: str) -> Optional[str]:
+    """
+    Stable key for content-addressed objects, taken from the object name
+    (<digest>[.z.<id>].<ext>), which changes whenever the stored bytes do.
+    Legacy flat files and heatmaps have no digest and return None.
+    """
+    if path.startswith(image_storage.STORE_DIR) or image_storage.is_archived(path):
+        return os.path.basename(path.split("#")[-1])
+    return None
+
+
+def _read_source(path: str, db: Session) -> bytes:
+    try:
+        return image_storage.read_image(path, db)
+    except (FileNotFoundError, KeyError):
+        raise HTTPException(status_code=404, detail="Image not found")
+
+
+def _thumbnail_path(source_key: str, size: int) -> str:
+    thumb_key = f"{source_key.replace('.', '_')}_{size}"
+    return f"{THUMB_DIR}/{thumb_key[:2]}/{thumb_key}.webp"
+
+
+def _make_thumbnail(data: bytes, thumb_path: str, size: int) -> bytes:
+    """Generate a WebP thumbnail and cache it for later requests"""
+    image = Image.open(io.BytesIO(data))
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGB")
+    image.thumbnail((size, size))
+
+    buffer = io.BytesIO()
+    image.save(buffer, format="WEBP", quality=80)
+    thumb = buffer.getvalue()
+
+    try:
+        image_storage.atomic_write(thumb_path, thumb)
+    except OSError as e:
+        logger.warning(f"Could not cache thumbnail {thumb_path}: {e}")
+    return thumb
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison as required for If-None-Match"""
+    if if_none_match.strip() == "*":
+        return True
+    bare = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == bare:
+            return True
+    return False
+
+
+def _range_response(data: bytes, range_header: str, headers: dict, media_type: str) -> Response:
+    """Serve a single byte range; multi-range requests get the full body"""
+    match = RANGE_PATTERN.match(range_header.strip())
+    if not match or (not match.group(1) and not match.group(2)):
+        return Response(content=data, headers=headers, media_type=media_type)
+
+    total = len(data)
+    start_text, end_text = match.groups()
+    if start_text and end_text and int(end_text) < int(start_text):
+        # Syntactically invalid (last < first): ignored, full response (RFC 9110 14.2)
+        return Response(content=data, headers=headers, media_type=media_type)
+    if start_text:
+        start = int(start_text)
+        end = min(int(end_text), total - 1) if end_text else total - 1
+    else:
+        # Suffix range: the last N bytes
+        start = max(total - int(end_text), 0)
+        end = total - 1
+
+    if start >= total or start > end:
+        # Unsatisfiable: starts past the end, or an empty suffix (bytes=-0)
+        return Response(status_code=416, headers={"Content-Range": f"bytes */{total}"})
+
+    headers["Content-Range"] = f"bytes {start}-{end}/{total}"
+    return Response(content=data[start:end + 1], status_code=206, headers=headers, media_type=media_type)
+
+
+@router.get("/predictions/{prediction_id}")
+def get_prediction_image(
+    prediction_id: int,
+    request: Request,
+    kind: str = "image",
+    size: Optional[int] = None,
+    current_user: db_models.User = Depends(get_current_user_or_media_token("images")),
+    db: Session = Depends(get_db)
+):
+    """
+    Get a prediction's uploaded image (kind=image) or heatmap (kind=gradcam)
+    Pass size=64|128|256 for a cached thumbnail instead of the original.
+    """
+    if kind not in ("image", "gradcam"):
+        raise HTTPException(status_code=400, detail="kind must be 'image' or 'gradcam'")
+    if size is not None and size not in THUMBNAIL_SIZES:
+        raise HTTPException(status_code=400, detail=f"size must be one of {THUMBNAIL_SIZES}")
+
+    prediction = db.query(db_models.Prediction).filter(db_models.Prediction.id == prediction_id).first()
+    if not prediction:
+        raise HTTPException(status_code=404, detail="Prediction not found")
+
+    # Check authorization
+    if current_user.role not in ["admin", "doctor"] and prediction.user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized to view this image")
+
+    path = prediction.gradcam_path if kind == "gradcam" else prediction.image_path
+    if not path:
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    # Content-addressed objects are tagged without reading them, so repeat
+    # views return 304 without touching disk; other files are tagged by content
+    source_key = _object_key(path)
+    strong = source_key is not None
+    data = None
+    if not strong:
+        data = _read_source(path, db)
+        source_key = hashlib.sha256(data).hexdigest()[:32]
+
+    etag_key = f"{source_key}-t{size}" if size else source_key
+    etag = f'"{etag_key}"' if strong else f'W/"{etag_key}"'
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL, "Accept-Ranges": "bytes"}
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    if size:
+        thumb_path = _thumbnail_path(source_key, size)
+        if os.path.exists(thumb_path):
+            with open(thumb_path, "rb") as f:
+                data = f.read()
+        else:
+            data = _make_thumbnail(data or _read_source(path, db), thumb_path, size)
+    elif data is None:
+        data = _read_source(path, db)
+    media_type = _content_type(data)
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and strong and (not if_range or if_range == etag):
+        return _range_response(data, range_header, headers, media_type)
+
+    return Response(content=data, headers=headers, media_type=media_type)
@@ -2,40 +2,63 @@
 ParaDetect AI - Professional Backend API
 Version: 2.0.0
 """
-from fastapi import FastAPI, File, UploadFile, HTTPException, Depends, Form
+from fastapi import FastAPI, File, UploadFile, HTTPException, Depends, Form, Request, Response, WebSocket, WebSocketDisconnect, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
-from datetime import datetime, timedelta
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session, joinedload, load_only
+from datetime import date, datetime, timedelta
 from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 import torch
 import torchvision.transforms as transforms
 from torchvision import models
 from PIL import Image
+import asyncio
+import hashlib
 import io
 import os
 from typing import Optional, List
-import uuid
 
 # Import local modules
 import models as db_models
 import schemas
 import auth
-from database import engine, get_db
+from database import engine, get_db, SessionLocal
 from chatbot_gemini import get_gemini_response
 from config import settings
 from logger import logger
 import user_activity
 from api_activity import router as activity_router
+from api_images import router as images_router
+from api_doctor import router as doctor_router
+from api_events import router as events_router
 import phone_verification
+import migrations
+import rollups
+import analytics
+from appointment_queries import appointment_details_query, to_details
+from pagination import NEXT_CURSOR_HEADER, paginate
 import image_validator
+import raw_ingest
+import image_storage
+from activity_partitions import partition_maintenance
+from activity_writer import activity_writer
+import event_bus
+from user_cache import user_cache
+from password_hasher import password_hasher
+from login_guard import client_ip, login_guard
+from session_tracker import session_tracker
+from rate_limiting import raw_frame_cost, raw_frame_cost_known, user_or_ip_key
+from storage_maintenance import storage_maintenance
+from inference_batcher import InferenceBatcher
+from upload_reader import BodySizeLimitMiddleware, read_upload_capped
 from smart_image_validator import SmartImageValidator, validate_blood_cell_image_simple
 
-# Create database tables
-db_models.Base.metadata.create_all(bind=engine)
+# Create database tables and upgrade existing databases in place
+migrations.run_migrations()
 
 # Create phone verification table
 phone_verification.create_phone_verification_table()
@@ -49,11 +72,20 @@ app = FastAPI(
     redoc_url="/redoc"
 )
 
-# Rate limiting
-limiter = Limiter(key_func=get_remote_address)
+# Rate limiting: counters shared by all local workers (see rate_limiting)
+limiter = Limiter(
+    key_func=user_or_ip_key,
+    storage_uri=settings.RATE_LIMIT_STORAGE_URI,
+    strategy="fixed-window",
+    enabled=settings.RATE_LIMIT_ENABLED
+)
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
+# Refuse request bodies beyond the upload limit (plus room for multipart framing)
+# Added before CORS so 413 responses still carry CORS headers
+app.add_middleware(BodySizeLimitMiddleware, max_body_size=settings.MAX_FILE_SIZE + 64 * 1024)
+
 # CORS configuration
 app.add_middleware(
     CORSMiddleware,
@@ -61,10 +93,14 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 # Include routers
 app.include_router(activity_router)
+app.include_router(images_router)
+app.include_router(doctor_router)
+app.include_router(events_router)
 
 # Global model variable
 model = None
@@ -73,6 +109,13 @@ CLASS_NAMES = ["Parasitized", "Uninfected"]
 IMG_SIZE = 224
 DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
+# Batched inference for streaming clients
+inference_batcher = InferenceBatcher(
+    max_batch_size=settings.INFERENCE_BATCH_SIZE,
+    max_wait_ms=settings.INFERENCE_BATCH_WAIT_MS,
+    max_queue_size=settings.INFERENCE_QUEUE_SIZE
+)
+
 # Image preprocessing
 transform = transforms.Compose([
     transforms.Resize((IMG_SIZE, IMG_SIZE)),
@@ -82,6 +125,7 @@ transform = transforms.Compose([
 
 # Create upload directories
 os.makedirs(f"{settings.UPLOAD_DIR}/images", exist_ok=True)
+os.makedirs(image_storage.STORE_DIR, exist_ok=True)
 os.makedirs(f"{settings.UPLOAD_DIR}/gradcam", exist_ok=True)
 
 def load_model():
@@ -127,6 +171,15 @@ def load_model():
         logger.error(f"❌ Model loading error: {e}", exc_info=True)
         raise
 
+def _start_service(name: str, start) -> bool:
+    """Start one background service; a failure is logged without blocking the others"""
+    try:
+        start()
+        return True
+    except Exception as e:
+        logger.error(f"❌ {name} failed to start: {e}", exc_info=True)
+        return False
+
 @app.on_event("startup")
 async def startup_event():
     """Initialize application on startup"""
@@ -134,13 +187,37 @@ async def startup_event():
         logger.info("🚀 Starting ParaDetect AI Backend...")
         
         # Initialize activity tracking tables
-        try:
-            user_activity.init_activity_tables()
+        if _start_service("Activity tracking", user_activity.init_activity_tables):
             logger.info("✅ Activity tracking initialized")
-        except Exception as e:
-            logger.warning(f"⚠️ Activity tracking initialization warning: {e}")
         
-        load_model()
+        # Each service starts on its own so one failure cannot skip the rest
+        if settings.ACTIVITY_WRITE_BEHIND:
+            _start_service("Activity writer", activity_writer.start)
+        _start_service("Session tracker", session_tracker.start)
+        _start_service("Partition maintenance", partition_maintenance.start)
+        _start_service("OTP store", phone_verification.otp_store.start)
+        
+        def rebuild_login_guard():
+            with engine.connect() as conn:
+                login_guard.rebuild(conn, user_activity.failed_logins)
+        _start_service("Login guard", rebuild_login_guard)
+        
+        # Write paths publish dashboard events from worker threads onto this loop
+        loop = asyncio.get_running_loop()
+        _start_service("Event bus", lambda: event_bus.event_bus.bind(loop))
+        
+        # Without a model the server still serves everything but predictions
+        if _start_service("Model", load_model):
+            _start_service("Inference batcher", lambda: inference_batcher.start(classify_batch))
+        else:
+            logger.warning("⚠️  Server will continue but predictions may not work")
+        
+        # Recompress and archive aged uploads, yielding to queued inference
+        if settings.STORAGE_MAINTENANCE_ENABLED:
+            _start_service(
+                "Storage maintenance",
+                lambda: storage_maintenance.start(is_busy=lambda: inference_batcher.queue_depth() > 0)
+            )
         
         # Create default admin user
         db = next(get_db())
@@ -169,6 +246,18 @@ async def startup_event():
         logger.error(f"❌ Startup error: {e}", exc_info=True)
         logger.warning("⚠️  Server will continue but predictions may not work")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Release background workers on shutdown"""
+    await inference_batcher.stop()
+    storage_maintenance.stop()
+    # Flush queued audit events before the process exits
+    activity_writer.stop()
+    session_tracker.stop()
+    partition_maintenance.stop()
+    phone_verification.otp_store.stop()
+    password_hasher.stop()
+
 def preprocess_image(image_bytes: bytes):
     """Preprocess image for model prediction"""
     try:
@@ -182,6 +271,35 @@ def preprocess_image(image_bytes: bytes):
         logger.error(f"Image preprocessing error: {e}")
         raise HTTPException(status_code=400, detail=f"Error processing image: {str(e)}")
 
+def classify_batch(img_tensor: torch.Tensor):
+    """Run the model on a preprocessed NCHW batch and return class probabilities per row"""
+    with torch.no_grad():
+        outputs = model(img_tensor.to(DEVICE))
+        probabilities = torch.nn.functional.softmax(outputs, dim=1)
+    return probabilities.cpu().numpy()
+
+async def run_inference(img_tensor: torch.Tensor):
+    """Classify one preprocessed image without blocking the event loop"""
+    if inference_batcher.running:
+        return await inference_batcher.submit(img_tensor)
+    return (await run_in_threadpool(classify_batch, img_tensor))[0]
+
+async def run_batch_inference(img_tensor: torch.Tensor):
+    """Classify a preprocessed NCHW batch through the batcher's model thread"""
+    if inference_batcher.running:
+        return await inference_batcher.submit_many(img_tensor)
+    return await run_in_threadpool(classify_batch, img_tensor)
+
+def validate_and_preprocess(image_bytes: bytes, filename: str) -> torch.Tensor:
+    """Blood cell validation followed by preprocessing (CPU-bound, run in a worker thread)"""
+    # Smart validation - check if image is blood cell related
+    if smart_validator:
+        smart_validator.validate_blood_cell_image(image_bytes, filename)
+    else:
+        # Fallback to simple validation
+        validate_blood_cell_image_simple(image_bytes, filename)
+    return preprocess_image(image_bytes)
+
 def validate_image_file(file: UploadFile):
     """Validate uploaded image file"""
     if not file.content_type or not file.content_type.startswith("image/"):
@@ -237,68 +355,60 @@ async def health_check():
 
 # ============= AUTH ENDPOINTS =============
 
+def create_user(db: Session, user: schemas.UserCreate, role: str, hashed_password: str) -> dict:
+    """Insert the user, record the signup and return the token response"""
+    db_user = db_models.User(
+        email=user.email,
+        hashed_password=hashed_password,
+        full_name=user.full_name,
+        role=role,
+        phone=user.phone if user.phone else None
+    )
+    db.add(db_user)
+    db.commit()
+    db.refresh(db_user)
+    
+    # Generate token
+    access_token = auth.create_access_token(data={"sub": user.email})
+    
+    # Log signup activity and create session (one transaction)
+    try:
+        user_activity.record_signup(
+            user_id=db_user.id,
+            email=db_user.email,
+            full_name=db_user.full_name,
+            role=role,
+            session_token=access_token
+        )
+    except Exception as e:
+        logger.warning(f"Failed to log signup activity: {e}")
+    
+    logger.info(f"New user registered: {user.email} as {role}")
+    
+    return {
+        "access_token": access_token,
+        "token_type": "bearer",
+        "user": db_user
+    }
+
+def find_user(db: Session, email: str) -> Optional[db_models.User]:
+    return db.query(db_models.User).filter(db_models.User.email == email).first()
+
 @app.post("/api/auth/register", response_model=schemas.Token)
 async def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
     """Register new user - Simple registration without phone verification"""
     try:
         # Check if user exists
-        db_user = db.query(db_models.User).filter(db_models.User.email == user.email).first()
-        if db_user:
+        if await run_in_threadpool(find_user, db, user.email):
             raise HTTPException(status_code=400, detail="Email already registered")
         
         # Validate role
         valid_roles = ['patient', 'doctor', 'admin']
         role = user.role if user.role in valid_roles else 'patient'
         
-        # Create new user - phone is optional, no verification required
-        hashed_password = auth.get_password_hash(user.password)
-        db_user = db_models.User(
-            email=user.email,
-            hashed_password=hashed_password,
-            full_name=user.full_name,
-            role=role,
-            phone=user.phone if user.phone else None
-        )
-        db.add(db_user)
-        db.commit()
-        db.refresh(db_user)
-        
-        # Log signup activity
-        try:
-            user_activity.log_user_signup(
-                user_id=db_user.id,
-                email=db_user.email,
-                full_name=db_user.full_name
-            )
-            user_activity.log_user_activity(
-                user_id=db_user.id,
-                email=db_user.email,
-                activity_type="signup",
-                activity_description=f"User registered successfully as {role}"
-            )
-        except Exception as e:
-            logger.warning(f"Failed to log signup activity: {e}")
-        
-        # Generate token
-        access_token = auth.create_access_token(data={"sub": user.email})
-        
-        # Create session
-        try:
-            user_activity.create_user_session(
-                user_id=db_user.id,
-                email=db_user.email,
-                session_token=access_token
-            )
-        except Exception as e:
-            logger.warning(f"Failed to create session: {e}")
-        
-        logger.info(f"New user registered: {user.email} as {role}")
-        
-        return {
-            "access_token": access_token,
-            "token_type": "bearer",
-            "user": db_user
-        }
+        # bcrypt runs on the dedicated hashing pool; DB work in the threadpool
+        hashed_password = await password_hasher.hash(user.password)
+        return await run_in_threadpool(create_user, db, user, role, hashed_password)
     except HTTPException:
         raise
     except Exception as e:
@@ -306,17 +416,25 @@ async def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail="Registration failed")
 
 @app.post("/api/auth/send-otp", response_model=schemas.PhoneVerificationResponse)
-async def send_otp(request: schemas.PhoneVerificationRequest):
+def send_otp(request: schemas.PhoneVerificationRequest):
     """Send OTP to phone number for verification"""
     try:
         result = phone_verification.send_otp(request.phone)
+        if "retry_after" in result:
+            raise HTTPException(
+                status_code=429,
+                detail=result["message"],
+                headers={"Retry-After": str(result["retry_after"])}
+            )
         return result
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error sending OTP: {e}")
         raise HTTPException(status_code=500, detail="Failed to send OTP")
 
 @app.post("/api/auth/verify-otp", response_model=schemas.PhoneVerificationResponse)
-async def verify_otp(request: schemas.PhoneVerificationVerify):
+def verify_otp(request: schemas.PhoneVerificationVerify):
     """Verify OTP for phone number"""
     try:
         result = phone_verification.verify_otp(request.phone, request.otp)
@@ -329,65 +447,103 @@ async def verify_otp(request: schemas.PhoneVerificationVerify):
         logger.error(f"Error verifying OTP: {e}")
         raise HTTPException(status_code=500, detail="Verification failed")
 
+def complete_login(
+    db: Session,
+    user: db_models.User,
+    new_hash: Optional[str],
+    ip_address: Optional[str] = None,
+    user_agent: Optional[str] = None
+) -> dict:
+    """Upgrade an outdated hash, record the login and return the token response"""
+    if new_hash:
+        # Stored hash predates the current BCRYPT_ROUNDS
+        user.hashed_password = new_hash
+        db.commit()
+        db.refresh(user)
+        logger.info(f"Password hash upgraded for {user.email}")
+    
+    # Generate token
+    access_token = auth.create_access_token(data={"sub": user.email})
+    
+    # Log successful login and create session (one transaction)
+    try:
+        user_activity.record_login(
+            user_id=user.id,
+            email=user.email,
+            session_token=access_token,
+            ip_address=ip_address,
+            user_agent=user_agent,
+            device_info=user_activity.parse_user_agent(user_agent)
+        )
+    except Exception as e:
+        logger.warning(f"Failed to log login activity: {e}")
+    
+    logger.info(f"User logged in: {user.email}")
+    
+    return {
+        "access_token": access_token,
+        "token_type": "bearer",
+        "user": user
+    }
+
+def reject_login(email: str, ip_address: Optional[str] = None, user_agent: Optional[str] = None):
+    login_guard.record_failure(email, ip_address)
+    try:
+        user_activity.record_failed_login(
+            email=email,
+            ip_address=ip_address,
+            user_agent=user_agent,
+            reason="Invalid credentials"
+        )
+    except Exception as e:
+        logger.warning(f"Failed to log failed login: {e}")
+    
+    raise HTTPException(status_code=401, detail="Incorrect email or password")
+
 @app.post("/api/auth/login", response_model=schemas.Token)
-async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login(request: Request, form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
     """Login user"""
+    ip_address = client_ip(request)
+    user_agent = request.headers.get("user-agent")
     try:
-        user = db.query(db_models.User).filter(db_models.User.email == form_data.username).first()
-        
-        if not user or not auth.verify_password(form_data.password, user.hashed_password):
-            # Log failed login attempt
-            try:
-                user_activity.log_failed_login(
-                    email=form_data.username,
-                    reason="Invalid credentials"
-                )
-            except Exception as e:
-                logger.warning(f"Failed to log failed login: {e}")
-            
-            raise HTTPException(status_code=401, detail="Incorrect email or password")
-        
-        # Generate token
-        access_token = auth.create_access_token(data={"sub": user.email})
-        
-        # Log successful login
-        try:
-            user_activity.log_user_login(
-                user_id=user.id,
-                email=user.email
-            )
-            user_activity.log_user_activity(
-                user_id=user.id,
-                email=user.email,
-                activity_type="login",
-                activity_description="User logged in successfully"
+        # Refuse before any DB lookup or bcrypt work while the email or IP is over its limit
+        retry_after = login_guard.check(form_data.username, ip_address)
+        if retry_after:
+            logger.warning(f"⚠️ Login throttled: {form_data.username} from {ip_address}")
+            raise HTTPException(
+                status_code=429,
+                detail="Too many failed login attempts, try again later",
+                headers={"Retry-After": str(retry_after)}
             )
-        except Exception as e:
-            logger.warning(f"Failed to log login activity: {e}")
         
-        # Create session
-        try:
-            user_activity.create_user_session(
-                user_id=user.id,
-                email=user.email,
-                session_token=access_token
-            )
-        except Exception as e:
-            logger.warning(f"Failed to create session: {e}")
+        user = await run_in_threadpool(find_user, db, form_data.username)
         
-        logger.info(f"User logged in: {user.email}")
+        valid, new_hash = False, None
+        if user:
+            valid, new_hash = await password_hasher.verify(form_data.password, user.hashed_password)
         
-        return {
-            "access_token": access_token,
-            "token_type": "bearer",
-            "user": user
-        }
+        if not valid:
+            await run_in_threadpool(reject_login, form_data.username, ip_address, user_agent)
+        
+        login_guard.record_success(form_data.username)
+        return await run_in_threadpool(complete_login, db, user, new_hash, ip_address, user_agent)
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Login error: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Login failed")
 
+@app.post("/api/auth/media-token", response_model=schemas.MediaToken)
+def create_media_token(scope: str, current_user: db_models.User = Depends(auth.get_current_user)):
+    """Short-lived token for ?access_token= on image and event-stream URLs and ?token= on /ws/classify"""
+    if scope not in auth.MEDIA_SCOPES:
+        raise HTTPException(status_code=400, detail=f"scope must be one of {auth.MEDIA_SCOPES}")
+    return {
+        "access_token": auth.create_media_token(current_user.email, scope),
+        "scope": scope,
+        "expires_in": settings.MEDIA_TOKEN_TTL_SECONDS
+    }
+
 @app.get("/api/auth/me", response_model=schemas.User)
 async def get_me(current_user: db_models.User = Depends(auth.get_current_user)):
     """Get current user"""
@@ -396,7 +552,7 @@ async def get_me(current_user: db_models.User = Depends(auth.get_current_user)):
 # ============= PATIENT ENDPOINTS =============
 
 @app.post("/api/patients", response_model=schemas.Patient)
-async def create_patient(
+def create_patient(
     patient: schemas.PatientCreate,
     current_user: db_models.User = Depends(auth.get_current_user),
     db: Session = Depends(get_db)
@@ -425,17 +581,21 @@ async def create_patient(
         raise HTTPException(status_code=500, detail="Failed to create patient")
 
 @app.get("/api/patients", response_model=List[schemas.Patient])
-async def get_patients(
+def get_patients(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
     current_user: db_models.User = Depends(auth.get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Get all patients for current user"""
-    return db.query(db_models.Patient).filter(
+    """Get patients for current user, newest first (paged via X-Next-Cursor)"""
+    query = db.query(db_models.Patient).filter(
         db_models.Patient.user_id == current_user.id
-    ).all()
+    )
+    return paginate(query, db_models.Patient.created_at, db_models.Patient.id, response, cursor, limit)
 
 @app.get("/api/patients/{patient_id}/history", response_model=List[schemas.Prediction])
-async def get_patient_history(
+def get_patient_history(
     patient_id: int,
     current_user: db_models.User = Depends(auth.get_current_user),
     db: Session = Depends(get_db)
@@ -449,7 +609,8 @@ async def get_patient_history(
 # ============= PREDICTION ENDPOINTS =============
 
 @app.post("/predict")
-async def predict_public(file: UploadFile = File(...)):
+@limiter.limit(lambda: settings.RATE_LIMIT_PUBLIC_PREDICT)
+async def predict_public(request: Request, file: UploadFile = File(...)):
     """Public prediction endpoint (no auth required)"""
     if model is None:
         raise HTTPException(status_code=503, detail="Model not loaded")
@@ -457,33 +618,15 @@ async def predict_public(file: UploadFile = File(...)):
     validate_image_file(file)
     
     try:
-        image_bytes = await file.read()
-        
-        # Check file size
-        if len(image_bytes) > settings.MAX_FILE_SIZE:
-            raise HTTPException(
-                status_code=400,
-                detail=f"File too large. Maximum size: {settings.MAX_FILE_SIZE / 1024 / 1024}MB"
-            )
+        # Chunked read: size cap, header sniffing and hashing in one pass
+        upload = await read_upload_capped(file, settings.MAX_FILE_SIZE)
         
-        # Smart validation - check if image is blood cell related
-        if smart_validator:
-            smart_validator.validate_blood_cell_image(image_bytes, file.filename)
-        else:
-            # Fallback to simple validation
-            validate_blood_cell_image_simple(image_bytes, file.filename)
+        # Validation, preprocessing and inference all run off the event loop
+        img_tensor = await run_in_threadpool(validate_and_preprocess, upload.data, file.filename)
+        probs = await run_inference(img_tensor)
         
-        img_tensor = preprocess_image(image_bytes)
-        img_tensor = img_tensor.to(DEVICE)
-        
-        with torch.no_grad():
-            outputs = model(img_tensor)
-            probabilities = torch.nn.functional.softmax(outputs, dim=1)
-            confidence, predicted_idx = torch.max(probabilities, 1)
-            
-            predicted_class = CLASS_NAMES[predicted_idx.item()]
-            confidence_value = confidence.item()
-            probs = probabilities[0].cpu().numpy()
+        predicted_class = CLASS_NAMES[int(probs.argmax())]
+        confidence_value = float(probs.max())
         
         response = {
             "prediction": predicted_class,
@@ -505,8 +648,35 @@ async def predict_public(file: UploadFile = File(...)):
         logger.error(f"Prediction error: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
 
+def save_prediction(db: Session, current_user: db_models.User, patient_id: Optional[int], upload, probs):
+    """Register the stored image and insert the prediction row"""
+    image_path, _ = image_storage.register_image(db, upload.sha256, upload.data, upload.format)
+    
+    predicted_class = CLASS_NAMES[int(probs.argmax())]
+    confidence_value = float(probs.max())
+    
+    db_prediction = db_models.Prediction(
+        user_id=current_user.id,
+        patient_id=patient_id,
+        image_path=image_path,
+        prediction=predicted_class,
+        confidence=confidence_value,
+        prob_parasitized=float(probs[0]),
+        prob_uninfected=float(probs[1])
+    )
+    db.add(db_prediction)
+    db.commit()
+    db.refresh(db_prediction)
+    event_bus.prediction_created(db_prediction)
+    
+    logger.info(f"Prediction saved: {predicted_class} ({confidence_value:.2%}) by {current_user.email}")
+    return db_prediction
+
+# Single uploads and raw batches draw on one per-user budget of images
 @app.post("/api/predict")
+@limiter.shared_limit(lambda: settings.RATE_LIMIT_PREDICT, scope="predict")
 async def predict(
+    request: Request,
     file: UploadFile = File(...),
     patient_id: Optional[int] = Form(None),
     current_user: db_models.User = Depends(auth.get_current_user),
@@ -519,61 +689,20 @@ async def predict(
     validate_image_file(file)
     
     try:
-        # Save uploaded image
-        image_bytes = await file.read()
+        # Chunked read: size cap, header sniffing and hashing in one pass
+        upload = await read_upload_capped(file, settings.MAX_FILE_SIZE)
         
-        # Check file size
-        if len(image_bytes) > settings.MAX_FILE_SIZE:
-            raise HTTPException(
-                status_code=400,
-                detail=f"File too large. Maximum size: {settings.MAX_FILE_SIZE / 1024 / 1024}MB"
-            )
+        # Validation, preprocessing and inference all run off the event loop
+        img_tensor = await run_in_threadpool(validate_and_preprocess, upload.data, file.filename)
+        probs = await run_inference(img_tensor)
         
-        # Smart validation - check if image is blood cell related
-        if smart_validator:
-            smart_validator.validate_blood_cell_image(image_bytes, file.filename)
-        else:
-            # Fallback to simple validation
-            validate_blood_cell_image_simple(image_bytes, file.filename)
-        
-        image_filename = f"{uuid.uuid4()}_{file.filename}"
-        image_path = f"{settings.UPLOAD_DIR}/images/{image_filename}"
-        with open(image_path, "wb") as f:
-            f.write(image_bytes)
-        
-        # Preprocess and predict
-        img_tensor = preprocess_image(image_bytes)
-        img_tensor = img_tensor.to(DEVICE)
-        
-        with torch.no_grad():
-            outputs = model(img_tensor)
-            probabilities = torch.nn.functional.softmax(outputs, dim=1)
-            confidence, predicted_idx = torch.max(probabilities, 1)
-            
-            predicted_class = CLASS_NAMES[predicted_idx.item()]
-            confidence_value = confidence.item()
-            probs = probabilities[0].cpu().numpy()
-        
-        # Save prediction to database
-        db_prediction = db_models.Prediction(
-            user_id=current_user.id,
-            patient_id=patient_id,
-            image_path=image_path,
-            prediction=predicted_class,
-            confidence=float(confidence_value),
-            prob_parasitized=float(probs[0]),
-            prob_uninfected=float(probs[1])
-        )
-        db.add(db_prediction)
-        db.commit()
-        db.refresh(db_prediction)
-        
-        logger.info(f"Prediction saved: {predicted_class} ({confidence_value:.2%}) by {current_user.email}")
+        # Content-addressed storage: the object file is written before its row is committed
+        db_prediction = await run_in_threadpool(save_prediction, db, current_user, patient_id, upload, probs)
         
         response = {
             "id": db_prediction.id,
-            "prediction": predicted_class,
-            "confidence": round(float(confidence_value), 4),
+            "prediction": db_prediction.prediction,
+            "confidence": round(db_prediction.confidence, 4),
             "probabilities": {
                 CLASS_NAMES[0]: round(float(probs[0]), 4),
                 CLASS_NAMES[1]: round(float(probs[1]), 4)
@@ -590,17 +719,143 @@ async def predict(
         logger.error(f"Prediction error: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
 
-@app.get("/api/predictions", response_model=List[schemas.PredictionWithPatient])
-async def get_predictions(
-    skip: int = 0,
-    limit: int = 100,
+def validate_raw_frames(body: bytes):
+    """
+    Parse and validate a raw frame body (run in a worker thread)
+    Returns the frames, a result slot per frame (errors filled in) and the
+    indices of the frames to classify
+    """
+    frames = raw_ingest.parse_frames(body)
+    
+    # Statistical validation per frame; rejected frames are reported, not fatal
+    results = [None] * len(frames)
+    valid_indices = []
+    for index, frame in enumerate(frames):
+        try:
+            smart_validator.validate_array(frame)
+            valid_indices.append(index)
+        except HTTPException as e:
+            results[index] = {"index": index, "error": e.detail}
+    return frames, results, valid_indices
+
+def record_raw_frames(
+    frames,
+    results: list,
+    valid_indices: list,
+    probs_batch,
+    patient_id: Optional[int],
+    current_user: db_models.User,
+    db: Session
+):
+    """Store and record classified raw frames (run in a worker thread); fills in `results`"""
+    if valid_indices:
+        # Store objects first; register_image writes the file and commits on its own
+        image_paths = {}
+        for index in valid_indices:
+            png_bytes = raw_ingest.encode_frame(frames[index])
+            digest = hashlib.sha256(png_bytes).hexdigest()
+            image_paths[index], _ = image_storage.register_image(db, digest, png_bytes, "PNG")
+        
+        saved = []
+        for index, probs in zip(valid_indices, probs_batch):
+            image_path = image_paths[index]
+            db_prediction = db_models.Prediction(
+                user_id=current_user.id,
+                patient_id=patient_id,
+                image_path=image_path,
+                prediction=CLASS_NAMES[int(probs.argmax())],
+                confidence=float(probs.max()),
+                prob_parasitized=float(probs[0]),
+                prob_uninfected=float(probs[1])
+            )
+            db.add(db_prediction)
+            saved.append((index, db_prediction, probs))
+        db.commit()
+        
+        for index, db_prediction, probs in saved:
+            event_bus.prediction_created(db_prediction)
+            results[index] = {
+                "index": index,
+                "id": db_prediction.id,
+                "prediction": db_prediction.prediction,
+                "confidence": round(db_prediction.confidence, 4),
+                "probabilities": {
+                    CLASS_NAMES[0]: round(float(probs[0]), 4),
+                    CLASS_NAMES[1]: round(float(probs[1]), 4)
+                }
+            }
+    
+    logger.info(f"Raw prediction: {len(valid_indices)}/{len(frames)} frames classified by {current_user.email}")
+
+@app.post("/api/predict/raw")
+@limiter.shared_limit(lambda: settings.RATE_LIMIT_PREDICT, scope="predict", cost=raw_frame_cost)
+async def predict_raw(
+    request: Request,
+    patient_id: Optional[int] = None,
+    current_user: db_models.User = Depends(auth.get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Authenticated prediction for pre-resized raw frames from capture stations
+    Body is one 224x224 uint8 RGB frame or a packed batch (see raw_ingest)
+    """
+    # The rate-limit cost is counted from Content-Length before the body is
+    # read; a chunked body would be charged one unit whatever it holds
+    if not raw_frame_cost_known(request):
+        raise HTTPException(status_code=411, detail="Content-Length required for raw uploads")
+    if model is None:
+        raise HTTPException(status_code=503, detail="Model not loaded")
+    
+    try:
+        body = await request.body()
+        
+        # Check body size
+        if len(body) > settings.MAX_FILE_SIZE:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Body too large. Maximum size: {settings.MAX_FILE_SIZE / 1024 / 1024}MB"
+            )
+        
+        frames, results, valid_indices = await run_in_threadpool(validate_raw_frames, body)
+        probs_batch = []
+        if valid_indices:
+            # Through the batcher, so raw ingest never runs the model alongside it
+            probs_batch = await run_batch_inference(raw_ingest.frames_to_tensor(frames[valid_indices]))
+        await run_in_threadpool(
+            record_raw_frames, frames, results, valid_indices, probs_batch, patient_id, current_user, db
+        )
+        
+        return JSONResponse(content={"count": len(results), "results": results})
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Raw prediction error: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
+
+def prediction_list_query(db: Session, with_patient: bool = False):
+    """Predictions without the large text columns, for list endpoints"""
+    P = db_models.Prediction
+    query = db.query(P).options(load_only(
+        P.id, P.user_id, P.patient_id, P.image_path, P.gradcam_path, P.prediction,
+        P.confidence, P.prob_parasitized, P.prob_uninfected, P.status, P.created_at
+    ))
+    if with_patient:
+        query = query.options(joinedload(P.patient))
+    return query
+
+@app.get("/api/predictions", response_model=List[schemas.PredictionListItemWithPatient])
+def get_predictions(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
     current_user: db_models.User = Depends(auth.get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Get all predictions for current user with optional date filter"""
-    query = db.query(db_models.Prediction).filter(
+    """Get predictions for current user with optional date filter, newest first (paged via X-Next-Cursor)"""
+    query = prediction_list_query(db, with_patient=True).filter(
         db_models.Prediction.user_id == current_user.id
     )
     
@@ -609,10 +864,10 @@ async def get_predictions(
     if end_date:
         query = query.filter(db_models.Prediction.created_at <= datetime.fromisoformat(end_date))
     
-    return query.order_by(db_models.Prediction.created_at.desc()).offset(skip).limit(limit).all()
+    return paginate(query, db_models.Prediction.created_at, db_models.Prediction.id, response, cursor, limit)
 
 @app.put("/api/predictions/{prediction_id}/notes")
-async def update_notes(
+def update_notes(
     prediction_id: int,
     notes: str = Form(...),
     current_user: db_models.User = Depends(auth.get_current_user),
@@ -634,29 +889,126 @@ async def update_notes(
     
     return {"message": "Notes updated successfully"}
 
+# ============= STREAMING ENDPOINTS =============
+
+def prepare_stream_frame(data: bytes) -> torch.Tensor:
+    """Validate and preprocess one streamed frame (raw RGB or encoded image)"""
+    if len(data) == raw_ingest.FRAME_BYTES:
+        frames = raw_ingest.parse_frames(data)
+        smart_validator.validate_array(frames[0])
+        return raw_ingest.frames_to_tensor(frames)
+    
+    if len(data) > settings.MAX_FILE_SIZE:
+        raise HTTPException(status_code=400, detail="Frame too large")
+    smart_validator.validate_blood_cell_image(data, "stream")
+    return preprocess_image(data)
+
+@app.websocket("/ws/classify")
+async def classify_stream(websocket: WebSocket, token: str):
+    """
+    Streaming classification for live microscope feeds
+    Authenticates once with a "stream" media token in the query string (see
+    POST /api/auth/media-token; session JWTs are refused), then accepts binary
+    frames and pushes back {"seq": n, ...} results as they complete.
+    A client may have at most STREAM_MAX_IN_FLIGHT unanswered frames;
+    further frames are not read until a result is sent.
+    """
+    def authenticate():
+        db = SessionLocal()
+        try:
+            return auth.get_media_token_user(token, "stream", db)
+        finally:
+            db.close()
+    
+    try:
+        current_user = await run_in_threadpool(authenticate)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    
+    if model is None or not inference_batcher.running:
+        await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+        return
+    
+    await websocket.accept()
+    logger.info(f"Classification stream opened by {current_user.email}")
+    
+    in_flight = asyncio.Semaphore(settings.STREAM_MAX_IN_FLIGHT)
+    send_lock = asyncio.Lock()
+    pending = set()
+    
+    async def process(seq: int, data: bytes):
+        try:
+            img_tensor = await run_in_threadpool(prepare_stream_frame, data)
+            probs = await inference_batcher.submit(img_tensor)
+            message = {
+                "seq": seq,
+                "prediction": CLASS_NAMES[int(probs.argmax())],
+                "confidence": round(float(probs.max()), 4),
+                "probabilities": {
+                    CLASS_NAMES[0]: round(float(probs[0]), 4),
+                    CLASS_NAMES[1]: round(float(probs[1]), 4)
+                }
+            }
+        except HTTPException as e:
+            message = {"seq": seq, "error": e.detail}
+        except Exception as e:
+            logger.error(f"Stream prediction error: {e}", exc_info=True)
+            message = {"seq": seq, "error": "Prediction failed"}
+        finally:
+            in_flight.release()
+        
+        try:
+            async with send_lock:
+                await websocket.send_json(message)
+        except Exception:
+            pass  # Client went away; the receive loop handles cleanup
+    
+    seq = 0
+    try:
+        while True:
+            await in_flight.acquire()
+            event = await websocket.receive()
+            if event["type"] == "websocket.disconnect":
+                break
+            
+            data = event.get("bytes")
+            if data is None:
+                in_flight.release()
+                async with send_lock:
+                    await websocket.send_json({"error": "Frames must be sent as binary messages"})
+                continue
+            
+            task = asyncio.create_task(process(seq, data))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+            seq += 1
+    except WebSocketDisconnect:
+        pass
+    finally:
+        for task in pending:
+            task.cancel()
+        logger.info(f"Classification stream closed by {current_user.email} after {seq} frames")
+
 # ============= STATS ENDPOINTS =============
 
 @app.get("/api/stats", response_model=schemas.Stats)
-async def get_stats(
+def get_stats(
     current_user: db_models.User = Depends(auth.get_current_user),
     db: Session = Depends(get_db)
 ):
     """Get user statistics"""
-    total_scans = db.query(db_models.Prediction).filter(
-        db_models.Prediction.user_id == current_user.id
-    ).count()
-    
-    infected = db.query(db_models.Prediction).filter(
-        db_models.Prediction.user_id == current_user.id,
-        db_models.Prediction.prediction == "Parasitized"
-    ).count()
+    R = db_models.PredictionRollup
+    total_scans, infected, total_patients = db.query(
+        func.coalesce(func.sum(R.count), 0),
+        func.coalesce(func.sum(case((R.prediction == "Parasitized", R.count), else_=0)), 0),
+        db.query(func.count(db_models.Patient.id)).filter(
+            db_models.Patient.user_id == current_user.id
+        ).scalar_subquery()
+    ).filter(R.user_id == current_user.id).one()
     
     uninfected = total_scans - infected
     
-    total_patients = db.query(db_models.Patient).filter(
-        db_models.Patient.user_id == current_user.id
-    ).count()
-    
     return {
         "total_scans": total_scans,
         "infected_detected": infected,
@@ -668,33 +1020,28 @@ async def get_stats(
 # ============= ADMIN ENDPOINTS =============
 
 @app.get("/api/admin/stats", response_model=schemas.AdminStats)
-async def get_admin_stats(
+def get_admin_stats(
     current_user: db_models.User = Depends(auth.get_current_admin),
     db: Session = Depends(get_db)
 ):
     """Get platform statistics (admin only)"""
-    total_scans = db.query(db_models.Prediction).count()
-    infected = db.query(db_models.Prediction).filter(
-        db_models.Prediction.prediction == "Parasitized"
-    ).count()
-    total_users = db.query(db_models.User).count()
-    total_patients = db.query(db_models.Patient).count()
-    
     today = datetime.utcnow().date()
     week_ago = today - timedelta(days=7)
     month_ago = today - timedelta(days=30)
     
-    predictions_today = db.query(db_models.Prediction).filter(
-        db_models.Prediction.created_at >= datetime.combine(today, datetime.min.time())
-    ).count()
-    
-    predictions_week = db.query(db_models.Prediction).filter(
-        db_models.Prediction.created_at >= datetime.combine(week_ago, datetime.min.time())
-    ).count()
-    
-    predictions_month = db.query(db_models.Prediction).filter(
-        db_models.Prediction.created_at >= datetime.combine(month_ago, datetime.min.time())
-    ).count()
+    # One pass over the per-day rollups plus two small table counts
+    R = db_models.PredictionRollup
+    since = lambda day: func.coalesce(func.sum(case((R.day >= day.isoformat(), R.count), else_=0)), 0)
+    (total_scans, infected, predictions_today, predictions_week, predictions_month,
+     total_users, total_patients) = db.query(
+        func.coalesce(func.sum(R.count), 0),
+        func.coalesce(func.sum(case((R.prediction == "Parasitized", R.count), else_=0)), 0),
+        since(today),
+        since(week_ago),
+        since(month_ago),
+        db.query(func.count(db_models.User.id)).scalar_subquery(),
+        db.query(func.count(db_models.Patient.id)).scalar_subquery()
+    ).one()
     
     return {
         "total_scans": total_scans,
@@ -708,15 +1055,18 @@ async def get_admin_stats(
     }
 
 @app.get("/api/admin/users", response_model=List[schemas.User])
-async def get_all_users(
+def get_all_users(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
     current_user: db_models.User = Depends(auth.get_current_admin),
     db: Session = Depends(get_db)
 ):
-    """Get all users (admin only)"""
-    return db.query(db_models.User).all()
+    """Get users, newest first (admin only, paged via X-Next-Cursor)"""
+    return paginate(db.query(db_models.User), db_models.User.created_at, db_models.User.id, response, cursor, limit)
 
 @app.put("/api/admin/users/{user_id}")
-async def update_user(
+def update_user(
     user_id: int,
     full_name: Optional[str] = Form(None),
     role: Optional[str] = Form(None),
@@ -747,7 +1097,7 @@ async def update_user(
     return {"message": "User updated successfully", "user": user}
 
 @app.delete("/api/admin/users/{user_id}")
-async def delete_user(
+def delete_user(
     user_id: int,
     current_user: db_models.User = Depends(auth.get_current_admin),
     db: Session = Depends(get_db)
@@ -769,54 +1119,94 @@ async def delete_user(
     return {"message": "User deleted successfully"}
 
 @app.get("/api/admin/appointments")
-async def get_all_appointments(
+def get_all_appointments(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
     current_user: db_models.User = Depends(auth.get_current_admin),
     db: Session = Depends(get_db)
 ):
-    """Get all appointments (admin only)"""
-    
-    appointments = db.query(db_models.Appointment).order_by(
-        db_models.Appointment.appointment_date.desc()
-    ).all()
-    
-    # Enrich with user details
-    result = []
-    for apt in appointments:
-        patient = db.query(db_models.User).filter(db_models.User.id == apt.patient_id).first()
-        doctor = db.query(db_models.User).filter(db_models.User.id == apt.doctor_id).first()
-        
-        apt_dict = {
-            "id": apt.id,
-            "patient_id": apt.patient_id,
-            "doctor_id": apt.doctor_id,
-            "appointment_date": apt.appointment_date,
-            "reason": apt.reason,
-            "status": apt.status,
-            "notes": apt.notes,
-            "created_at": apt.created_at,
-            "updated_at": apt.updated_at,
-            "patient_name": patient.full_name if patient else None,
-            "patient_email": patient.email if patient else None,
-            "doctor_name": doctor.full_name if doctor else None,
-            "doctor_email": doctor.email if doctor else None,
-            "doctor_specialization": doctor.specialization if doctor else None
-        }
-        result.append(apt_dict)
-    
+    """Get appointments, latest date first (admin only, paged via X-Next-Cursor)"""
+    appointments = paginate(
+        appointment_details_query(db),
+        db_models.Appointment.appointment_date,
+        db_models.Appointment.id,
+        response, cursor, limit
+    )
+    return [to_details(apt) for apt in appointments]
+
+@app.get("/api/admin/predictions", response_model=List[schemas.PredictionListItem])
+def get_all_predictions(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    current_user: db_models.User = Depends(auth.get_current_admin),
+    db: Session = Depends(get_db)
+):
+    """Get predictions, newest first (admin only, paged via X-Next-Cursor)"""
+    return paginate(
+        prediction_list_query(db),
+        db_models.Prediction.created_at,
+        db_models.Prediction.id,
+        response, cursor, limit
+    )
+
+@app.get("/api/admin/storage/stats", response_model=schemas.StorageStats)
+def get_storage_stats(
+    current_user: db_models.User = Depends(auth.get_current_admin),
+    db: Session = Depends(get_db)
+):
+    """Get upload storage dedup ratio and bytes saved (admin only)"""
+    return image_storage.get_storage_stats(db)
+
+@app.get("/api/admin/password-hashing/stats")
+def get_password_hashing_stats(current_user: db_models.User = Depends(auth.get_current_admin)):
+    """bcrypt pool queue depth, wait and hash times (admin only)"""
+    return password_hasher.stats()
+
+@app.get("/api/admin/user-cache/stats")
+def get_user_cache_stats(current_user: db_models.User = Depends(auth.get_current_admin)):
+    """Authenticated-user cache size and hit rate (admin only)"""
+    return user_cache.stats()
+
+@app.get("/api/admin/otp/stats")
+def get_otp_stats(current_user: db_models.User = Depends(auth.get_current_admin)):
+    """Pending OTPs, verification outcomes and purge counts for this worker (admin only)"""
+    return phone_verification.otp_store.stats()
+
+@app.post("/api/admin/rollups/reconcile")
+def reconcile_rollups(
+    current_user: db_models.User = Depends(auth.get_current_admin),
+    db: Session = Depends(get_db)
+):
+    """Verify stats rollups against predictions and rebuild them if they drifted (admin only)"""
+    result = rollups.reconcile(db.connection())
+    db.commit()
+    logger.info(f"Rollup reconciliation by {current_user.email}: {result['mismatches']} mismatches")
     return result
 
-@app.get("/api/admin/predictions")
-async def get_all_predictions(
+@app.get("/api/admin/analytics", response_model=schemas.AnalyticsReport)
+def get_admin_analytics(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    bucket: str = "day",
+    bins: int = 10,
+    top_users: int = 10,
     current_user: db_models.User = Depends(auth.get_current_admin),
     db: Session = Depends(get_db)
 ):
-    """Get all predictions (admin only)"""
-    return db.query(db_models.Prediction).order_by(db_models.Prediction.created_at.desc()).all()
+    """
+    Aggregated prediction analytics for a date range (admin only)
+    Defaults to the last 30 days in daily buckets; bucket may be day, week or month
+    """
+    return analytics.get_analytics(db, start, end, bucket, bins, min(max(top_users, 1), 100))
 
 # ============= CHATBOT ENDPOINTS =============
 
 @app.post("/api/chatbot")
-async def chat_with_ai(
+@limiter.limit(lambda: settings.RATE_LIMIT_CHATBOT)
+def chat_with_ai(
+    request: Request,
     message: str = Form(...),
     current_user: db_models.User = Depends(auth.get_current_user),
     db: Session = Depends(get_db)
@@ -851,7 +1241,8 @@ async def chat_with_ai(
         raise HTTPException(status_code=500, detail=f"Chatbot error: {str(e)}")
 
 @app.post("/api/chatbot/public")
-async def chat_with_ai_public(message: str = Form(...)):
+@limiter.limit(lambda: settings.RATE_LIMIT_CHATBOT)
+def chat_with_ai_public(request: Request, message: str = Form(...)):
     """Public AI Chatbot endpoint - no authentication required, powered by Google Gemini AI"""
     try:
         response = get_gemini_response(message, None)
@@ -870,16 +1261,22 @@ async def chat_with_ai_public(message: str = Form(...)):
 # ============= APPOINTMENT ENDPOINTS =============
 
 @app.get("/api/doctors", response_model=List[schemas.DoctorInfo])
-async def get_doctors(db: Session = Depends(get_db)):
-    """Get all doctors for appointment booking"""
-    doctors = db.query(db_models.User).filter(
-        db_models.User.role == "doctor",
-        db_models.User.is_active == True
-    ).all()
-    return doctors
+def get_doctors(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    db: Session = Depends(get_db)
+):
+    """Get doctors for appointment booking (paged via X-Next-Cursor)"""
+    U = db_models.User
+    query = db.query(U).options(load_only(U.id, U.full_name, U.email, U.specialization, U.created_at)).filter(
+        U.role == "doctor",
+        U.is_active == True
+    )
+    return paginate(query, U.created_at, U.id, response, cursor, limit)
 
 @app.post("/api/appointments", response_model=schemas.Appointment)
-async def create_appointment(
+def create_appointment(
     appointment: schemas.AppointmentCreate,
     current_user: db_models.User = Depends(auth.get_current_user),
     db: Session = Depends(get_db)
@@ -914,6 +1311,7 @@ async def create_appointment(
         db.add(db_appointment)
         db.commit()
         db.refresh(db_appointment)
+        event_bus.appointment_changed("appointment.created", db_appointment)
         
         logger.info(f"Appointment created: Patient {current_user.email} with Doctor {doctor.email}")
         
@@ -925,59 +1323,34 @@ async def create_appointment(
         raise HTTPException(status_code=500, detail=f"Failed to create appointment: {str(e)}")
 
 @app.get("/api/appointments", response_model=List[schemas.AppointmentWithDetails])
-async def get_appointments(
+def get_appointments(
     current_user: db_models.User = Depends(auth.get_current_user),
     db: Session = Depends(get_db)
 ):
     """Get all appointments for current user (patient or doctor)"""
     try:
+        # Patient and doctor details come from the same joined query
+        query = appointment_details_query(db)
         if current_user.role == "doctor":
-            appointments = db.query(db_models.Appointment).filter(
-                db_models.Appointment.doctor_id == current_user.id
-            ).order_by(db_models.Appointment.appointment_date.desc()).all()
+            query = query.filter(db_models.Appointment.doctor_id == current_user.id)
         else:
-            appointments = db.query(db_models.Appointment).filter(
-                db_models.Appointment.patient_id == current_user.id
-            ).order_by(db_models.Appointment.appointment_date.desc()).all()
+            query = query.filter(db_models.Appointment.patient_id == current_user.id)
         
-        # Enrich with user details
-        result = []
-        for apt in appointments:
-            patient = db.query(db_models.User).filter(db_models.User.id == apt.patient_id).first()
-            doctor = db.query(db_models.User).filter(db_models.User.id == apt.doctor_id).first()
-            
-            apt_dict = {
-                "id": apt.id,
-                "patient_id": apt.patient_id,
-                "doctor_id": apt.doctor_id,
-                "appointment_date": apt.appointment_date,
-                "reason": apt.reason,
-                "status": apt.status,
-                "notes": apt.notes,
-                "created_at": apt.created_at,
-                "updated_at": apt.updated_at,
-                "patient_name": patient.full_name if patient else None,
-                "patient_email": patient.email if patient else None,
-                "doctor_name": doctor.full_name if doctor else None,
-                "doctor_email": doctor.email if doctor else None,
-                "doctor_specialization": doctor.specialization if doctor else None
-            }
-            result.append(apt_dict)
-        
-        return result
+        appointments = query.order_by(db_models.Appointment.appointment_date.desc()).all()
+        return [to_details(apt) for apt in appointments]
     except Exception as e:
         logger.error(f"Error fetching appointments: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Failed to fetch appointments: {str(e)}")
 
 @app.get("/api/appointments/{appointment_id}", response_model=schemas.AppointmentWithDetails)
-async def get_appointment(
+def get_appointment(
     appointment_id: int,
     current_user: db_models.User = Depends(auth.get_current_user),
     db: Session = Depends(get_db)
 ):
     """Get specific appointment details"""
     
-    appointment = db.query(db_models.Appointment).filter(
+    appointment = appointment_details_query(db).filter(
         db_models.Appointment.id == appointment_id
     ).first()
     
@@ -990,28 +1363,10 @@ async def get_appointment(
        appointment.doctor_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized to view this appointment")
     
-    patient = db.query(db_models.User).filter(db_models.User.id == appointment.patient_id).first()
-    doctor = db.query(db_models.User).filter(db_models.User.id == appointment.doctor_id).first()
-    
-    return {
-        "id": appointment.id,
-        "patient_id": appointment.patient_id,
-        "doctor_id": appointment.doctor_id,
-        "appointment_date": appointment.appointment_date,
-        "reason": appointment.reason,
-        "status": appointment.status,
-        "notes": appointment.notes,
-        "created_at": appointment.created_at,
-        "updated_at": appointment.updated_at,
-        "patient_name": patient.full_name if patient else None,
-        "patient_email": patient.email if patient else None,
-        "doctor_name": doctor.full_name if doctor else None,
-        "doctor_email": doctor.email if doctor else None,
-        "doctor_specialization": doctor.specialization if doctor else None
-    }
+    return to_details(appointment)
 
 @app.put("/api/appointments/{appointment_id}", response_model=schemas.Appointment)
-async def update_appointment(
+def update_appointment(
     appointment_id: int,
     appointment_update: schemas.AppointmentUpdate,
     current_user: db_models.User = Depends(auth.get_current_user),
@@ -1053,13 +1408,14 @@ async def update_appointment(
     
     db.commit()
     db.refresh(appointment)
+    event_bus.appointment_changed("appointment.updated", appointment)
     
     logger.info(f"Appointment {appointment_id} updated by {current_user.email}")
     
     return appointment
 
 @app.delete("/api/appointments/{appointment_id}")
-async def delete_appointment(
+def delete_appointment(
     appointment_id: int,
     current_user: db_models.User = Depends(auth.get_current_user),
     db: Session = Depends(get_db)
@@ -1079,6 +1435,7 @@ async def delete_appointment(
     
     db.delete(appointment)
     db.commit()
+    event_bus.appointment_changed("appointment.deleted", appointment)
     
     logger.info(f"Appointment {appointment_id} deleted by {current_user.email}")
     
@@ -1087,7 +1444,7 @@ async def delete_appointment(
 # ============= DOCTOR-SPECIFIC ENDPOINTS =============
 
 @app.get("/api/patients/{patient_id}")
-async def get_patient_details(
+def get_patient_details(
     patient_id: int,
     current_user: db_models.User = Depends(auth.get_current_user),
     db: Session = Depends(get_db)
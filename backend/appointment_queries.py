@@ -0,0 +1,44 @@
+"""
+Appointment Queries
+Appointment listings with patient and doctor details fetched in a single
+joined query instead of two User lookups per appointment
+"""
+from typing import Any, Dict
+from sqlalchemy.orm import Query, Session, aliased
+import models as db_models
+
+Appointment = db_models.Appointment
+PatientUser = aliased(db_models.User, name="patient_user")
+DoctorUser = aliased(db_models.User, name="doctor_user")
+
+
+def appointment_details_query(db: Session) -> Query:
+    """
+    Appointment columns plus the patient/doctor fields the listings show
+    Outer joins keep appointments whose patient or doctor was deleted.
+    """
+    return db.query(
+        Appointment.id,
+        Appointment.patient_id,
+        Appointment.doctor_id,
+        Appointment.appointment_date,
+        Appointment.reason,
+        Appointment.status,
+        Appointment.notes,
+        Appointment.created_at,
+        Appointment.updated_at,
+        PatientUser.full_name.label("patient_name"),
+        PatientUser.email.label("patient_email"),
+        DoctorUser.full_name.label("doctor_name"),
+        DoctorUser.email.label("doctor_email"),
+        DoctorUser.specialization.label("doctor_specialization")
+    ).outerjoin(
+        PatientUser, PatientUser.id == Appointment.patient_id
+    ).outerjoin(
+        DoctorUser, DoctorUser.id == Appointment.doctor_id
+    )
+
+
+def to_details(row) -> Dict[str, Any]:
+    """Row from appointment_details_query as an AppointmentWithDetails dict"""
+    return dict(row._mapping)
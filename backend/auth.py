@@ -1,20 +1,26 @@
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 import models
 import schemas
+from config import settings
 from database import get_db
+from user_cache import user_cache
+from password_hasher import pwd_context
+from session_tracker import session_tracker
 
 SECRET_KEY = "your-secret-key-change-in-production"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30 * 24 * 60  # 30 days
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
+oauth2_scheme_optional = OAuth2PasswordBearer(tokenUrl="api/auth/login", auto_error=False)
+
+# Scopes for media tokens: short-lived JWTs that may appear in a URL
+MEDIA_SCOPES = ("images", "events", "stream")
 
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
@@ -32,25 +38,96 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
+def create_media_token(email: str, scope: str) -> str:
+    """
+    Token for URLs that cannot carry an Authorization header (<img>,
+    EventSource, WebSocket)
+    Valid only for `scope` and for MEDIA_TOKEN_TTL_SECONDS, so one leaked
+    through access logs or a Referer header is of little use.
+    """
+    return create_access_token(
+        {"sub": email, "scope": scope},
+        expires_delta=timedelta(seconds=settings.MEDIA_TOKEN_TTL_SECONDS)
+    )
+
+def _credentials_exception():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+def _active_user(email: str, db: Session):
+    # Cached copy when fresh; writes to the user evict it (see user_cache)
+    user = user_cache.get(email)
+    if user is None:
+        user = db.query(models.User).filter(models.User.email == email).first()
+        if user is None:
+            raise _credentials_exception()
+        user_cache.put(email, user)
+    if not user.is_active:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Inactive user"
+        )
+    return user
+
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
+        # Media tokens only authorize their own URL, never the API
+        if email is None or payload.get("scope"):
+            raise _credentials_exception()
     except JWTError:
-        raise credentials_exception
+        raise _credentials_exception()
     
-    user = db.query(models.User).filter(models.User.email == email).first()
-    if user is None:
-        raise credentials_exception
+    user = _active_user(email, db)
+    # In-memory only; the tracker writes last_activity in periodic batches
+    if session_tracker.running:
+        session_tracker.touch(token)
     return user
 
+def get_media_token_user(token: str, scope: str, db: Session):
+    """Active user of a media token for `scope`; session JWTs and other scopes are refused"""
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise _credentials_exception()
+    if payload.get("scope") != scope or payload.get("sub") is None:
+        raise _credentials_exception()
+    return _active_user(payload["sub"], db)
+
+def get_current_user_or_media_token(scope: str):
+    """
+    Dependency like get_current_user that also accepts ?access_token= for
+    <img> and EventSource URLs. The query token must be a media token for
+    `scope` (see create_media_token); session JWTs are refused there.
+    """
+    def dependency(
+        token: Optional[str] = Depends(oauth2_scheme_optional),
+        access_token: Optional[str] = None,
+        db: Session = Depends(get_db)
+    ):
+        if token:
+            return get_current_user(token=token, db=db)
+        if not access_token:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Not authenticated",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        return get_media_token_user(access_token, scope, db)
+    return dependency
+
+def get_current_doctor(current_user: models.User = Depends(get_current_user)):
+    if current_user.role not in ("doctor", "admin"):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+    return current_user
+
 def get_current_admin(current_user: models.User = Depends(get_current_user)):
     if current_user.role != "admin":
         raise HTTPException(
@@ -0,0 +1,101 @@
+"""
+Query-count check for appointment listings
+Seeds a scratch database with N appointments and counts the SQL statements
+the old per-row User lookups and the joined listing each issue; the joined
+listing must stay at one statement whatever N is (exit 1 otherwise).
+tests/test_appointment_queries.py enforces the one-statement listing in the
+test suite; this script adds the timings.
+
+Usage (from backend/): python benchmarks/bench_appointment_queries.py --sizes 10 100 1000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+import models as db_models
+from appointment_queries import appointment_details_query, to_details
+from database import create_db_engine
+
+
+def seed(Session, appointments: int):
+    db = Session()
+    patient = db_models.User(email="patient@example.com", hashed_password="x", full_name="Patient", role="patient")
+    doctor = db_models.User(email="doctor@example.com", hashed_password="x", full_name="Doctor", role="doctor")
+    db.add_all([patient, doctor])
+    db.flush()
+    start = datetime(2024, 1, 1)
+    db.add_all([
+        db_models.Appointment(
+            patient_id=patient.id,
+            doctor_id=doctor.id,
+            appointment_date=start + timedelta(hours=n),
+            reason="Checkup"
+        )
+        for n in range(appointments)
+    ])
+    db.commit()
+    db.close()
+
+
+def per_row_listing(db):
+    """The previous implementation: two User queries per appointment"""
+    result = []
+    for apt in db.query(db_models.Appointment).order_by(db_models.Appointment.appointment_date.desc()).all():
+        patient = db.query(db_models.User).filter(db_models.User.id == apt.patient_id).first()
+        doctor = db.query(db_models.User).filter(db_models.User.id == apt.doctor_id).first()
+        result.append((apt.id, patient.full_name, doctor.full_name))
+    return result
+
+
+def joined_listing(db):
+    rows = appointment_details_query(db).order_by(db_models.Appointment.appointment_date.desc()).all()
+    return [to_details(row) for row in rows]
+
+
+def measure(engine, Session, listing) -> dict:
+    statements = []
+    counter = lambda *args: statements.append(1)
+    event.listen(engine, "before_cursor_execute", counter)
+    db = Session()
+    started = time.perf_counter()
+    rows = listing(db)
+    elapsed = time.perf_counter() - started
+    db.close()
+    event.remove(engine, "before_cursor_execute", counter)
+    return {"rows": len(rows), "statements": len(statements), "ms": elapsed * 1000}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    args = parser.parse_args()
+
+    print(f"{'appointments':>12} {'per-row stmts':>14} {'per-row ms':>11} {'joined stmts':>13} {'joined ms':>10}")
+    failures = 0
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = create_db_engine(f"sqlite:///{tmp}/appointments.db")
+            db_models.Base.metadata.create_all(bind=engine)
+            Session = sessionmaker(bind=engine)
+            seed(Session, size)
+
+            per_row = measure(engine, Session, per_row_listing)
+            joined = measure(engine, Session, joined_listing)
+            engine.dispose()
+
+        failures += joined["statements"] != 1 or joined["rows"] != size
+        print(f"{size:>12} {per_row['statements']:>14} {per_row['ms']:>11.1f} "
+              f"{joined['statements']:>13} {joined['ms']:>10.1f}")
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
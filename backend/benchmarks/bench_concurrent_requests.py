@@ -0,0 +1,111 @@
+"""
+Concurrent request benchmark against a running backend
+Keeps N clients posting images to /predict while a probe polls /health;
+if handlers block the event loop, /health latency climbs with the upload load
+
+Usage (from backend/, server on :8000):
+    python benchmarks/bench_concurrent_requests.py --clients 16 --requests 20
+"""
+import argparse
+import io
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+import numpy as np
+from PIL import Image
+
+
+def make_image() -> bytes:
+    """Pinkish noise that passes the statistical blood cell checks"""
+    rng = np.random.default_rng(0)
+    base = np.array([200, 120, 140], dtype=np.float32)
+    pixels = np.clip(base + rng.normal(0, 40, (224, 224, 3)), 0, 255).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def multipart_body(image: bytes):
+    boundary = uuid.uuid4().hex
+    body = (
+        f"--{boundary}\r\n"
+        'Content-Disposition: form-data; name="file"; filename="bench.png"\r\n'
+        "Content-Type: image/png\r\n\r\n"
+    ).encode() + image + f"\r\n--{boundary}--\r\n".encode()
+    return body, f"multipart/form-data; boundary={boundary}"
+
+
+def timed_request(request: urllib.request.Request):
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=60) as response:
+            response.read()
+            ok = response.status < 400
+    except (urllib.error.URLError, OSError):
+        ok = False
+    return time.perf_counter() - started, ok
+
+
+def percentiles(samples):
+    if not samples:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(int(q * len(ordered)), len(ordered) - 1)] * 1000
+    return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99), "max": ordered[-1] * 1000}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=20, help="uploads per client")
+    args = parser.parse_args()
+
+    body, content_type = multipart_body(make_image())
+    upload_latencies, upload_errors = [], []
+    probe_latencies = []
+    done = threading.Event()
+    lock = threading.Lock()
+
+    def client():
+        for _ in range(args.requests):
+            request = urllib.request.Request(
+                f"{args.url}/predict", data=body, headers={"Content-Type": content_type}
+            )
+            elapsed, ok = timed_request(request)
+            with lock:
+                (upload_latencies if ok else upload_errors).append(elapsed)
+
+    def probe():
+        while not done.is_set():
+            elapsed, ok = timed_request(urllib.request.Request(f"{args.url}/health"))
+            if ok:
+                probe_latencies.append(elapsed)
+            time.sleep(0.05)
+
+    probe_thread = threading.Thread(target=probe)
+    probe_thread.start()
+    clients = [threading.Thread(target=client) for _ in range(args.clients)]
+    started = time.perf_counter()
+    for t in clients:
+        t.start()
+    for t in clients:
+        t.join()
+    elapsed = time.perf_counter() - started
+    done.set()
+    probe_thread.join()
+
+    print(f"{args.clients} clients x {args.requests} uploads in {elapsed:.2f}s "
+          f"({len(upload_latencies) / elapsed:.1f} req/s, {len(upload_errors)} errors)")
+    print(f"{'endpoint':<10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for name, samples in (("/predict", upload_latencies), ("/health", probe_latencies)):
+        p = percentiles(samples)
+        print(f"{name:<10} {p['p50']:>9.1f} {p['p95']:>9.1f} {p['p99']:>9.1f} {p['max']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Concurrent write benchmark for the SQLite engine
+Compares the bare engine (rollback journal, no pragmas) with the tuned
+engine from database.create_db_engine on a scratch database file
+
+Usage (from backend/): python benchmarks/bench_db_writes.py --threads 8 --writes 200
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+import models as db_models
+from database import create_db_engine
+
+
+def run_writes(engine, threads: int, writes: int) -> dict:
+    """Each thread commits `writes` single-row prediction inserts"""
+    db_models.Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    errors = []
+
+    def worker(worker_id: int):
+        for _ in range(writes):
+            db = Session()
+            try:
+                db.add(db_models.Prediction(
+                    user_id=worker_id,
+                    image_path="benchmark",
+                    prediction="Parasitized",
+                    confidence=0.9,
+                    prob_parasitized=0.9,
+                    prob_uninfected=0.1
+                ))
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                errors.append(str(e))
+            finally:
+                db.close()
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    started = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    committed = threads * writes - len(errors)
+    engine.dispose()
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "committed": committed,
+        "errors": len(errors),
+        "writes_per_s": round(committed / elapsed, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--writes", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        baseline_url = f"sqlite:///{tmp}/baseline.db"
+        tuned_url = f"sqlite:///{tmp}/tuned.db"
+
+        baseline = run_writes(
+            create_engine(baseline_url, connect_args={"check_same_thread": False}),
+            args.threads, args.writes
+        )
+        tuned = run_writes(create_db_engine(tuned_url), args.threads, args.writes)
+
+    print(f"{'engine':<10} {'writes/s':>10} {'committed':>10} {'errors':>8} {'elapsed':>9}")
+    for name, result in (("baseline", baseline), ("tuned", tuned)):
+        print(f"{name:<10} {result['writes_per_s']:>10} {result['committed']:>10} "
+              f"{result['errors']:>8} {result['elapsed_s']:>8}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Login-path write benchmark for user_activity
+Compares the three separate writes a login used to make (login history,
+activity log, session) with record_login's single transaction and with
+the write-behind queue, counting commits (one WAL sync each) and
+connection checkouts per login
+
+Usage (from backend/): python benchmarks/bench_login_writes.py --logins 500
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Point the shared engine at a scratch database before it is created
+_tmp = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp}/bench.db"
+
+from sqlalchemy import event
+import models  # noqa: F401  (users table for the activity foreign keys)
+import user_activity
+from activity_writer import activity_writer
+from database import Base, engine
+
+counters = {"commits": 0, "checkouts": 0}
+event.listen(engine, "commit", lambda conn: counters.__setitem__("commits", counters["commits"] + 1))
+event.listen(engine.pool, "checkout", lambda *args: counters.__setitem__("checkouts", counters["checkouts"] + 1))
+
+
+def separate_writes(user_id: int, email: str):
+    user_activity.log_user_login(user_id=user_id, email=email)
+    user_activity.log_user_activity(
+        user_id=user_id, email=email, activity_type="login",
+        activity_description="User logged in successfully"
+    )
+    user_activity.create_user_session(user_id=user_id, email=email, session_token=uuid.uuid4().hex)
+
+
+def combined_write(user_id: int, email: str):
+    user_activity.record_login(user_id=user_id, email=email, session_token=uuid.uuid4().hex)
+
+
+def run(login, logins: int, write_behind: bool = False) -> dict:
+    if write_behind:
+        activity_writer.start()
+    counters.update(commits=0, checkouts=0)
+    latencies = []
+    for _ in range(logins):
+        started = time.perf_counter()
+        login(1, "bench@example.com")
+        latencies.append(time.perf_counter() - started)
+    if write_behind:
+        # Include the background flushes in the commit count
+        activity_writer.stop()
+    latencies.sort()
+    return {
+        "commits": counters["commits"] / logins,
+        "checkouts": counters["checkouts"] / logins,
+        "mean_ms": statistics.mean(latencies) * 1000,
+        "p95_ms": latencies[int(0.95 * len(latencies))] * 1000
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--logins", type=int, default=500)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    results = (
+        ("separate", run(separate_writes, args.logins)),
+        ("combined", run(combined_write, args.logins)),
+        ("queued", run(combined_write, args.logins, write_behind=True))
+    )
+
+    print(f"{'path':<10} {'commits':>8} {'checkouts':>10} {'mean ms':>9} {'p95 ms':>8}")
+    for name, r in results:
+        print(f"{name:<10} {r['commits']:>8.3f} {r['checkouts']:>10.3f} "
+              f"{r['mean_ms']:>9.2f} {r['p95_ms']:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
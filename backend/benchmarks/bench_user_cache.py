@@ -0,0 +1,105 @@
+"""
+Authenticated-user cache check
+Resolves the same token N times through auth.get_current_user, counting SQL
+statements with the cache on, then verifies that committed user changes are
+seen immediately: a role change, deactivation (403) and deletion (401).
+Exits 1 if any step serves a stale user.
+
+Usage (from backend/): python benchmarks/bench_user_cache.py --requests 1000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import HTTPException
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+import auth
+import models as db_models
+from database import create_db_engine
+from user_cache import user_cache
+
+
+def resolve(Session, token: str):
+    db = Session()
+    try:
+        return auth.get_current_user(token=token, db=db)
+    finally:
+        db.close()
+
+
+def status_of(Session, token: str) -> int:
+    try:
+        resolve(Session, token)
+        return 200
+    except HTTPException as e:
+        return e.status_code
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=1000)
+    args = parser.parse_args()
+
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_db_engine(f"sqlite:///{tmp}/users.db")
+        db_models.Base.metadata.create_all(bind=engine)
+        Session = sessionmaker(bind=engine)
+
+        db = Session()
+        db.add(db_models.User(email="user@example.com", hashed_password="x", full_name="User", role="patient"))
+        db.commit()
+        db.close()
+        token = auth.create_access_token({"sub": "user@example.com"})
+
+        statements = []
+        counter = lambda *a: statements.append(1)
+        event.listen(engine, "before_cursor_execute", counter)
+        user_cache.clear()
+        started = time.perf_counter()
+        for _ in range(args.requests):
+            resolve(Session, token)
+        elapsed = time.perf_counter() - started
+        event.remove(engine, "before_cursor_execute", counter)
+        print(f"{args.requests} lookups: {len(statements)} SQL statements, "
+              f"{elapsed / args.requests * 1e6:.1f}us each, stats={user_cache.stats()}")
+        if len(statements) != 1:
+            failures.append(f"expected 1 statement with a warm cache, saw {len(statements)}")
+
+        db = Session()
+        user = db.query(db_models.User).filter(db_models.User.email == "user@example.com").one()
+        user.role = "doctor"
+        db.commit()
+        if resolve(Session, token).role != "doctor":
+            failures.append("role change not visible")
+
+        user.is_active = False
+        db.commit()
+        if status_of(Session, token) != 403:
+            failures.append("deactivated user still accepted")
+
+        user.is_active = True
+        db.commit()
+        if status_of(Session, token) != 200:
+            failures.append("reactivated user rejected")
+
+        db.delete(user)
+        db.commit()
+        db.close()
+        if status_of(Session, token) != 401:
+            failures.append("deleted user still accepted")
+        engine.dispose()
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    print("ok" if not failures else f"{len(failures)} failure(s)")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
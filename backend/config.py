@@ -13,9 +13,17 @@ class Settings(BaseSettings):
     SECRET_KEY: str = "your-super-secret-key-change-this-in-production-min-32-chars"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 43200  # 30 days
+    MEDIA_TOKEN_TTL_SECONDS: int = 300  # Tokens passed in <img>/EventSource URLs
     
     # Database
     DATABASE_URL: str = "sqlite:///./paradetect.db"
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: int = 30
+    DB_POOL_RECYCLE: int = 1800  # Seconds; server databases only
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_CACHE_SIZE_KB: int = 65536
+    SQLITE_MMAP_SIZE: int = 268435456  # 256MB
     
     # Google Gemini AI
     GOOGLE_API_KEY: str = ""
@@ -32,6 +40,77 @@ class Settings(BaseSettings):
     MAX_FILE_SIZE: int = 10485760  # 10MB
     ALLOWED_EXTENSIONS: str = "png,jpg,jpeg"
     
+    # Inference batching
+    INFERENCE_BATCH_SIZE: int = 16
+    INFERENCE_BATCH_WAIT_MS: int = 5
+    INFERENCE_QUEUE_SIZE: int = 256
+    STREAM_MAX_IN_FLIGHT: int = 8  # Unanswered frames per WebSocket client
+    
+    # Activity logging (write-behind)
+    ACTIVITY_WRITE_BEHIND: bool = True
+    ACTIVITY_FLUSH_INTERVAL_MS: int = 200
+    ACTIVITY_FLUSH_BATCH_SIZE: int = 500
+    ACTIVITY_QUEUE_SIZE: int = 10000
+    ACTIVITY_OVERFLOW_POLICY: str = "drop"  # drop or block
+    ACTIVITY_BLOCK_TIMEOUT_MS: int = 50
+    
+    # Activity history partitions (monthly; retention in months, 0 keeps all)
+    LOGIN_HISTORY_RETENTION_MONTHS: int = 12
+    ACTIVITY_LOG_RETENTION_MONTHS: int = 12
+    FAILED_LOGIN_RETENTION_MONTHS: int = 3
+    ACTIVITY_ARCHIVE_DIR: str = "archive/activity"  # Aged months as .jsonl.gz; empty drops them
+    ACTIVITY_MAINTENANCE_INTERVAL_HOURS: float = 24
+    
+    # Session tracking (last-activity writes are batched)
+    SESSION_FLUSH_INTERVAL_SECONDS: float = 30
+    SESSION_IDLE_TIMEOUT_MINUTES: int = 1440  # Idle sessions are ended after this
+    SESSION_SWEEP_INTERVAL_SECONDS: int = 300
+    SESSION_RETENTION_DAYS: int = 90  # Ended sessions are deleted after this; 0 keeps them
+    
+    # Phone verification OTPs
+    OTP_TTL_SECONDS: int = 300
+    OTP_MAX_ATTEMPTS: int = 5  # Wrong codes per phone per window, across resends
+    OTP_ATTEMPT_WINDOW_SECONDS: int = 3600
+    OTP_PURGE_INTERVAL_SECONDS: int = 60
+    
+    # Password hashing
+    BCRYPT_ROUNDS: int = 12  # Existing hashes are upgraded on the next login
+    PASSWORD_HASH_WORKERS: int = 2  # Concurrent bcrypt calls
+    PASSWORD_HASH_USE_PROCESSES: bool = False  # Process pool instead of threads
+    PASSWORD_HASH_MAX_PENDING: int = 64  # Beyond this, login/register return 503
+    
+    # Rate limiting (slowapi); sqlite:// storage is shared by all local workers
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_STORAGE_URI: str = "sqlite:///./rate_limits.db"  # or memory://
+    RATE_LIMIT_PREDICT: str = "120/minute"  # Images per user; a raw batch counts each frame
+    RATE_LIMIT_PUBLIC_PREDICT: str = "10/minute"  # Per IP
+    RATE_LIMIT_CHATBOT: str = "30/minute"
+    
+    # Login brute-force guard (per worker process)
+    LOGIN_FAILURE_WINDOW_SECONDS: int = 900  # 0 disables
+    LOGIN_MAX_FAILURES_PER_EMAIL: int = 5
+    LOGIN_MAX_FAILURES_PER_IP: int = 20  # 0 disables
+    TRUSTED_PROXIES: str = ""  # Comma-separated IPs/CIDRs of reverse proxies whose X-Forwarded-For is used
+    LOGIN_GUARD_MAX_KEYS: int = 100000
+    
+    # Authenticated-user cache
+    USER_CACHE_TTL_SECONDS: int = 60  # 0 disables
+    USER_CACHE_MAX_SIZE: int = 10000
+    USER_CACHE_SYNC_SECONDS: float = 1  # Poll for other workers' evictions; bounds their staleness
+    
+    # Doctor review queue
+    REVIEW_CLAIM_MINUTES: int = 15  # Lease length for a claimed case
+    REVIEW_UNCERTAIN_CONFIDENCE: float = 0.8  # Below this a result is reviewed sooner
+    
+    # Dashboard event stream (SSE)
+    EVENT_BUFFER_SIZE: int = 100  # Events per subscriber before it is told to resync
+    EVENT_KEEPALIVE_SECONDS: int = 15
+    EVENT_RETRY_MS: int = 3000  # Client reconnect delay
+    
+    # List pagination
+    PAGE_SIZE_DEFAULT: int = 100  # For a cursor without limit; lists are unpaged unless asked
+    PAGE_SIZE_MAX: int = 1000
+    
     # Email
     SMTP_HOST: str = "smtp.gmail.com"
     SMTP_PORT: int = 587
@@ -48,6 +127,15 @@ class Settings(BaseSettings):
     UPLOAD_DIR: str = "uploads"
     MODEL_DIR: str = "models"
     
+    # Storage maintenance (recompression and archive tier)
+    STORAGE_MAINTENANCE_ENABLED: bool = True
+    STORAGE_MAINTENANCE_INTERVAL_MINUTES: int = 60
+    STORAGE_RECOMPRESS_AFTER_DAYS: int = 7
+    STORAGE_RECOMPRESS_FORMAT: str = "png"  # png (optimized) or webp (lossless)
+    STORAGE_ARCHIVE_AFTER_DAYS: int = 0  # 0 disables the archive tier
+    STORAGE_MAINTENANCE_BATCH_SIZE: int = 100
+    STORAGE_MAINTENANCE_DUTY_CYCLE: float = 0.1  # Max share of one core
+    
     @property
     def cors_origins_list(self) -> List[str]:
         """Get CORS origins as list"""
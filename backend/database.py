@@ -1,12 +1,72 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from config import settings
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./paradetect.db"
+SQLALCHEMY_DATABASE_URL = settings.DATABASE_URL
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+
+def apply_sqlite_pragmas(dbapi_connection, connection_record=None):
+    """
+    Per-connection SQLite tuning, applied when the pool opens a connection
+    WAL lets readers proceed during writes, and busy_timeout makes writers
+    wait for the lock instead of failing with "database is locked".
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={settings.SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA cache_size=-{settings.SQLITE_CACHE_SIZE_KB}")
+    cursor.execute(f"PRAGMA mmap_size={settings.SQLITE_MMAP_SIZE}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+
+def is_sqlite_memory(url: str) -> bool:
+    parsed = make_url(url)
+    return parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:")
+
+
+def create_db_engine(url: str = SQLALCHEMY_DATABASE_URL):
+    """
+    Create the engine for a database URL with per-dialect pooling
+    - in-memory SQLite: one shared connection (StaticPool), otherwise every
+      pooled connection would see its own empty database
+    - file SQLite: QueuePool of pragma-tuned connections
+    - server databases: QueuePool with pre-ping and recycling so stale
+      connections are replaced transparently
+    """
+    if make_url(url).get_backend_name() == "sqlite":
+        connect_args = {
+            "check_same_thread": False,
+            "timeout": settings.SQLITE_BUSY_TIMEOUT_MS / 1000
+        }
+        if is_sqlite_memory(url):
+            db_engine = create_engine(url, connect_args=connect_args, poolclass=StaticPool)
+        else:
+            db_engine = create_engine(
+                url,
+                connect_args=connect_args,
+                pool_size=settings.DB_POOL_SIZE,
+                max_overflow=settings.DB_MAX_OVERFLOW,
+                pool_timeout=settings.DB_POOL_TIMEOUT
+            )
+        event.listen(db_engine, "connect", apply_sqlite_pragmas)
+        return db_engine
+
+    return create_engine(
+        url,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_pre_ping=True,
+        pool_recycle=settings.DB_POOL_RECYCLE
+    )
+
+
+engine = create_db_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
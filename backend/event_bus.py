@@ -0,0 +1,161 @@
+"""
+In-process event bus for dashboard push updates
+Write paths publish small change events (new prediction, review, appointment
+change); each connected dashboard holds a bounded queue filtered to the
+events its user may see. Publishing never blocks: a subscriber that falls
+more than `buffer_size` events behind gets a single "resync" event telling
+it to reload instead of an unbounded backlog.
+"""
+import asyncio
+import itertools
+from datetime import datetime
+from typing import Any, Dict, FrozenSet, Iterable, NamedTuple, Optional, Set
+from config import settings
+
+RESYNC = "resync"
+
+
+class Event(NamedTuple):
+    id: int
+    type: str
+    data: Dict[str, Any]
+    roles: FrozenSet[str]  # Every user with one of these roles
+    user_ids: FrozenSet[int]  # Plus these specific users
+
+
+class Subscription:
+    """One connected client; only touched from the event loop thread"""
+
+    def __init__(self, user_id: int, role: str, topics: Optional[Set[str]], buffer_size: int):
+        self.user_id = user_id
+        self.role = role
+        self.topics = topics  # Event type prefixes, None for all
+        self.queue: "asyncio.Queue[Event]" = asyncio.Queue(maxsize=buffer_size)
+        self.dropped = 0
+
+    def wants(self, event: Event) -> bool:
+        if self.topics is not None and event.type.split(".")[0] not in self.topics:
+            return False
+        return self.role == "admin" or self.role in event.roles or self.user_id in event.user_ids
+
+    def deliver(self, event: Event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Too far behind to replay: discard the backlog and ask for a reload
+            self.dropped += self.queue.qsize() + 1
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(Event(event.id, RESYNC, {}, frozenset(), frozenset()))
+
+
+class EventBus:
+    def __init__(self, buffer_size: int = 100):
+        self.buffer_size = buffer_size
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._subscribers: Set[Subscription] = set()
+        self._ids = itertools.count(1)
+        self.published = 0
+
+    def bind(self, loop: asyncio.AbstractEventLoop):
+        """Attach to the server's event loop (called at startup)"""
+        self._loop = loop
+
+    # subscribe, unsubscribe, _dispatch and stats run on the loop thread only
+
+    def subscribe(self, user_id: int, role: str, topics: Optional[Iterable[str]] = None) -> Subscription:
+        subscription = Subscription(user_id, role, set(topics) if topics else None, self.buffer_size)
+        self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self._subscribers.discard(subscription)
+
+    def publish(
+        self,
+        event_type: str,
+        data: Dict[str, Any],
+        roles: Iterable[str] = (),
+        user_ids: Iterable[Optional[int]] = ()
+    ):
+        """
+        Queue an event for matching subscribers. Safe to call from request
+        worker threads; a no-op when no server loop is bound (CLI scripts).
+        Admins receive every event.
+        """
+        if self._loop is None or self._loop.is_closed():
+            return
+        event = Event(
+            next(self._ids),
+            event_type,
+            {key: value.isoformat() if isinstance(value, datetime) else value for key, value in data.items()},
+            frozenset(roles),
+            frozenset(user_id for user_id in user_ids if user_id is not None)
+        )
+        try:
+            self._loop.call_soon_threadsafe(self._dispatch, event)
+        except RuntimeError:
+            # Loop shut down between the check and the call
+            return
+        self.published += 1
+
+    def _dispatch(self, event: Event):
+        for subscription in self._subscribers:
+            if subscription.wants(event):
+                subscription.deliver(event)
+
+    def stats(self) -> dict:
+        """Call on the event loop thread: subscriptions are not locked"""
+        return {
+            "subscribers": len(self._subscribers),
+            "published": self.published,
+            "buffer_size": self.buffer_size,
+            "dropped": sum(s.dropped for s in self._subscribers),
+            "max_backlog": max((s.queue.qsize() for s in self._subscribers), default=0)
+        }
+
+
+event_bus = EventBus(buffer_size=settings.EVENT_BUFFER_SIZE)
+
+
+# ============= EVENT HELPERS =============
+
+def prediction_created(prediction):
+    """New result: the owner's history and every doctor's review queue"""
+    event_bus.publish("prediction.created", {
+        "id": prediction.id,
+        "user_id": prediction.user_id,
+        "patient_id": prediction.patient_id,
+        "image_path": prediction.image_path,
+        "prediction": prediction.prediction,
+        "confidence": prediction.confidence,
+        "prob_parasitized": prediction.prob_parasitized,
+        "prob_uninfected": prediction.prob_uninfected,
+        "status": prediction.status,
+        "priority": prediction.priority,
+        "created_at": prediction.created_at
+    }, roles=("doctor",), user_ids=(prediction.user_id,))
+
+
+def case_changed(event_type: str, case_id: int, doctor_id: int, owner_id: Optional[int] = None, **data):
+    """Claim, release or review of a queued case"""
+    event_bus.publish(
+        event_type,
+        {"id": case_id, "doctor_id": doctor_id, **data},
+        roles=("doctor",),
+        user_ids=(owner_id,)
+    )
+
+
+def appointment_changed(event_type: str, appointment, **data):
+    """Appointment created/updated/deleted: its patient and doctor"""
+    event_bus.publish(event_type, {
+        "id": appointment.id,
+        "patient_id": appointment.patient_id,
+        "doctor_id": appointment.doctor_id,
+        "appointment_date": appointment.appointment_date,
+        "reason": appointment.reason,
+        "status": appointment.status,
+        "notes": appointment.notes,
+        **data
+    }, user_ids=(appointment.patient_id, appointment.doctor_id))
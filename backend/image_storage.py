@@ -0,0 +1,198 @@
+"""
+Content-addressed upload storage
+Each unique image is stored once under a digest-sharded path
+(objects/ab/cd/abcd....png) and shared by every prediction that uploads it
+"""
+import hashlib
+import os
+import uuid
+import zipfile
+from typing import Tuple
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+import models as db_models
+from config import settings
+from logger import logger
+
+STORE_DIR = f"{settings.UPLOAD_DIR}/objects"
+ARCHIVE_DIR = f"{settings.UPLOAD_DIR}/archive"
+
+# Archived objects live inside immutable zip files: archive:<zip path>#<member>
+ARCHIVE_PREFIX = "archive:"
+
+FORMAT_EXTENSIONS = {"PNG": "png", "JPEG": "jpg"}
+
+
+def digest_path(digest: str, image_format: str) -> str:
+    """Sharded path for a digest, two levels deep to keep directories small"""
+    ext = FORMAT_EXTENSIONS.get(image_format, "bin")
+    return f"{STORE_DIR}/{digest[:2]}/{digest[2:4]}/{digest}.{ext}"
+
+
+def register_image(db: Session, digest: str, data: bytes, image_format: str) -> Tuple[str, bool]:
+    """
+    Look up or store the image for a digest
+    Returns (path, is_new). The object file is written before its row is
+    committed, so a row never points at a missing file; a failed write raises
+    and nothing is recorded. Must be called before other changes are added
+    to the session, since a concurrent insert of the same digest rolls it back.
+    """
+    stored = db.get(db_models.StoredImage, digest)
+    if stored:
+        if not is_archived(stored.path) and not os.path.exists(stored.path):
+            # Re-create an object lost before this ordering was enforced
+            atomic_write(stored.path, data)
+        return stored.path, False
+
+    stored = db_models.StoredImage(
+        digest=digest,
+        path=digest_path(digest, image_format),
+        size_bytes=len(data),
+        format=image_format
+    )
+    # Concurrent writers of the same digest write identical bytes, and the
+    # rename is atomic, so the loser's write is harmless
+    atomic_write(stored.path, data)
+    db.add(stored)
+    try:
+        db.commit()
+        return stored.path, True
+    except IntegrityError:
+        # Another request stored the same image first
+        db.rollback()
+        stored = db.get(db_models.StoredImage, digest)
+        return stored.path, False
+
+
+def atomic_write(path: str, data: bytes):
+    """Write a file via temp file + rename so readers never see partial data"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def is_archived(path: str) -> bool:
+    return path.startswith(ARCHIVE_PREFIX)
+
+
+def archive_member_path(archive_file: str, member: str) -> str:
+    return f"{ARCHIVE_PREFIX}{archive_file}#{member}"
+
+
+def digest_from_path(path: str) -> str:
+    """Objects are always named <digest>.<ext>, whichever tier they are in"""
+    return os.path.basename(path.split("#")[-1]).split(".")[0]
+
+
+def read_image(path: str, db: Session = None) -> bytes:
+    """
+    Read a stored image from whichever tier holds it
+    If the path is stale (the object was recompressed or archived after the
+    reference was taken) and a session is given, the current location is
+    looked up by digest.
+    """
+    try:
+        if is_archived(path):
+            archive_file, member = path[len(ARCHIVE_PREFIX):].split("#", 1)
+            with zipfile.ZipFile(archive_file) as zf:
+                return zf.read(member)
+        with open(path, "rb") as f:
+            return f.read()
+    except (FileNotFoundError, KeyError):
+        if db is None:
+            raise
+        stored = db.get(db_models.StoredImage, digest_from_path(path))
+        if stored is None or stored.path == path:
+            raise FileNotFoundError(path)
+        return read_image(stored.path)
+
+
+def get_storage_stats(db: Session) -> dict:
+    """Dedup statistics: unique stored objects versus prediction references"""
+    stored_images, stored_bytes = db.query(
+        func.count(db_models.StoredImage.digest),
+        func.coalesce(func.sum(db_models.StoredImage.size_bytes), 0)
+    ).one()
+
+    referenced_images, referenced_bytes = db.query(
+        func.count(db_models.Prediction.id),
+        func.coalesce(func.sum(db_models.StoredImage.size_bytes), 0)
+    ).join(
+        db_models.StoredImage, db_models.Prediction.image_path == db_models.StoredImage.path
+    ).one()
+
+    return {
+        "stored_images": stored_images,
+        "stored_bytes": stored_bytes,
+        "referenced_images": referenced_images,
+        "referenced_bytes": referenced_bytes,
+        "dedup_ratio": round(referenced_images / stored_images, 4) if stored_images else 1.0,
+        "bytes_saved": referenced_bytes - stored_bytes
+    }
+
+
+def migrate_legacy_uploads(db: Session) -> dict:
+    """
+    Move flat uploads/images/{uuid}_{filename} files into the content store
+    Duplicates collapse onto one object and the flat copies are removed.
+    """
+    legacy_prefix = f"{settings.UPLOAD_DIR}/images/"
+    predictions = db.query(db_models.Prediction).filter(
+        db_models.Prediction.image_path.like(f"{legacy_prefix}%")
+    ).all()
+
+    moved_paths = set()
+    failed_paths = set()
+    for prediction in predictions:
+        legacy_path = prediction.image_path
+        if not os.path.exists(legacy_path):
+            continue
+
+        with open(legacy_path, "rb") as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()
+        image_format = "PNG" if data.startswith(b"\x89PNG") else "JPEG"
+        try:
+            path, _ = register_image(db, digest, data, image_format)
+            # The flat file is the only copy until the object reads back intact
+            if hashlib.sha256(read_image(path)).hexdigest() != digest:
+                raise IOError(f"stored object {path} does not match {legacy_path}")
+        except Exception as e:
+            db.rollback()
+            failed_paths.add(legacy_path)
+            logger.error(f"Legacy upload {legacy_path} not migrated: {e}")
+            continue
+
+        prediction.image_path = path
+        db.commit()
+        moved_paths.add(legacy_path)
+
+    # Remove the flat copies now that no prediction points at them
+    for legacy_path in moved_paths - failed_paths:
+        os.remove(legacy_path)
+
+    logger.info(f"Legacy upload migration: {len(predictions)} predictions checked, "
+                f"{len(moved_paths - failed_paths)} flat files moved, {len(failed_paths)} failed")
+    return {
+        "predictions_checked": len(predictions),
+        "files_moved": len(moved_paths - failed_paths),
+        "files_failed": len(failed_paths)
+    }
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        print(migrate_legacy_uploads(db))
+    finally:
+        db.close()
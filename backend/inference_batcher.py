@@ -0,0 +1,107 @@
+"""
+Micro-batching inference queue
+Collects single-image requests into batches so the model runs once per batch
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+import numpy as np
+import torch
+from logger import logger
+
+
+class InferenceBatcher:
+    """Bounded queue feeding a single worker that runs batched model calls"""
+
+    def __init__(self, max_batch_size: int = 16, max_wait_ms: int = 5, max_queue_size: int = 256):
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_queue_size = max_queue_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._classify: Optional[Callable[[torch.Tensor], np.ndarray]] = None
+        # A single thread keeps model calls serialized and off the event loop
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="inference")
+        self.batches_run = 0
+        self.items_run = 0
+
+    @property
+    def running(self) -> bool:
+        return self._worker is not None and not self._worker.done()
+
+    def start(self, classify: Callable[[torch.Tensor], np.ndarray]):
+        """Start the worker task; `classify` maps an NCHW batch to per-row probabilities"""
+        if self.running:
+            return
+        self._classify = classify
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._worker = asyncio.create_task(self._run())
+        logger.info(f"✅ Inference batcher started (batch={self.max_batch_size}, wait={self.max_wait * 1000:.0f}ms)")
+
+    async def stop(self):
+        """Stop the worker and fail anything still queued"""
+        if not self.running:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        while not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("Inference batcher stopped"))
+        self._worker = None
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    async def submit(self, img_tensor: torch.Tensor) -> np.ndarray:
+        """
+        Queue one preprocessed (1, C, H, W) tensor and wait for its probabilities
+        Waits for queue space when the queue is full, which backpressures callers
+        """
+        if not self.running:
+            raise RuntimeError("Inference batcher is not running")
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((img_tensor, future))
+        return await future
+
+    async def submit_many(self, img_tensor: torch.Tensor) -> np.ndarray:
+        """
+        Queue each row of a preprocessed (N, C, H, W) batch and wait for all of
+        them, so multi-frame uploads share the single model thread too
+        """
+        rows = await asyncio.gather(*(self.submit(img_tensor[i:i + 1]) for i in range(len(img_tensor))))
+        return np.stack(rows)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+
+            # Gather more items until the batch is full or the wait window closes
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            tensors = [item[0] for item in batch]
+            futures = [item[1] for item in batch]
+            try:
+                probs = await loop.run_in_executor(self._executor, self._classify, torch.cat(tensors))
+                for future, row in zip(futures, probs):
+                    if not future.done():
+                        future.set_result(row)
+                self.batches_run += 1
+                self.items_run += len(batch)
+            except Exception as e:
+                logger.error(f"Batched inference error: {e}", exc_info=True)
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
@@ -0,0 +1,195 @@
+"""
+Login brute-force guard
+Sliding-window counters of failed logins per email and per client IP, kept
+in memory and consulted before the password is verified, so a blocked
+attacker costs no bcrypt work and no database query. Counters are rebuilt
+from the failed-login partitions on startup, so a restart does not reset them.
+Each worker process keeps its own counters. Behind a reverse proxy the
+client IP comes from X-Forwarded-For, believed only from TRUSTED_PROXIES;
+otherwise every client would share the proxy's address and its lockout.
+"""
+import ipaddress
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from typing import List, Optional, Union
+from fastapi import Request
+from sqlalchemy import select
+from config import settings
+from logger import logger
+
+
+# ============= CLIENT ADDRESS =============
+
+Network = Union[ipaddress.IPv4Network, ipaddress.IPv6Network]
+
+def parse_networks(spec: str) -> List[Network]:
+    """'10.0.0.1, 172.16.0.0/12' -> networks (a bare address is a /32 or /128)"""
+    return [ipaddress.ip_network(item.strip(), strict=False) for item in spec.split(",") if item.strip()]
+
+
+TRUSTED_PROXIES = parse_networks(settings.TRUSTED_PROXIES)
+
+
+def _trusted(address: str, proxies: List[Network]) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in proxies)
+
+
+def client_ip(request: Request, proxies: Optional[List[Network]] = None) -> Optional[str]:
+    """
+    Address of the client behind any trusted proxies
+    X-Forwarded-For is only read when the peer is a trusted proxy. Hops are
+    walked right to left (each proxy appends the address it received from),
+    and the first one that is not a trusted proxy is the client; entries left
+    of it are client-supplied and ignored.
+    """
+    proxies = TRUSTED_PROXIES if proxies is None else proxies
+    peer = request.client.host if request.client else None
+    if peer is None or not _trusted(peer, proxies):
+        return peer
+    hops = [hop.strip() for hop in ",".join(request.headers.getlist("x-forwarded-for")).split(",") if hop.strip()]
+    for hop in reversed(hops):
+        if not _trusted(hop, proxies):
+            return hop
+    # Every hop is a proxy (or no header): the request started inside
+    return hops[0] if hops else peer
+
+
+# ============= COUNTERS =============
+
+
+class SlidingWindowCounter:
+    """Event timestamps per key within the last `window` seconds, LRU-bounded to `max_keys`"""
+
+    def __init__(self, limit: int, window: float, max_keys: int):
+        self.limit = limit
+        self.window = window
+        self.max_keys = max_keys
+        self._events: "OrderedDict[str, deque]" = OrderedDict()
+
+    def _prune(self, key: str, now: float) -> Optional[deque]:
+        events = self._events.get(key)
+        if events is None:
+            return None
+        while events and events[0] <= now - self.window:
+            events.popleft()
+        if not events:
+            del self._events[key]
+            return None
+        return events
+
+    def retry_after(self, key: str, now: float) -> float:
+        """Seconds until `key` drops below the limit (0 if it is not blocked)"""
+        events = self._prune(key, now)
+        if events is None or len(events) < self.limit:
+            return 0.0
+        # Oldest event that must expire before one more attempt is allowed
+        return events[len(events) - self.limit] + self.window - now
+
+    def add(self, key: str, at: float):
+        events = self._events.get(key)
+        if events is None:
+            events = self._events[key] = deque()
+            while len(self._events) > self.max_keys:
+                self._events.popitem(last=False)
+        else:
+            self._events.move_to_end(key)
+        events.append(at)
+        # Only the newest `limit` events can affect a decision
+        while len(events) > self.limit:
+            events.popleft()
+
+    def reset(self, key: str):
+        self._events.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+
+class LoginGuard:
+    def __init__(self, max_per_email: int = 5, max_per_ip: int = 20, window_seconds: int = 900, max_keys: int = 100000):
+        self.window = window_seconds
+        self._by_email = SlidingWindowCounter(max_per_email, window_seconds, max_keys)
+        self._by_ip = SlidingWindowCounter(max_per_ip, window_seconds, max_keys)
+        self.per_ip = max_per_ip > 0
+        self._lock = threading.Lock()
+        self.blocked = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0
+
+    def check(self, email: str, ip_address: Optional[str]) -> int:
+        """Seconds the caller must wait before trying again, 0 if allowed"""
+        if not self.enabled:
+            return 0
+        now = time.time()
+        with self._lock:
+            wait = self._by_email.retry_after(email.lower(), now)
+            if ip_address and self.per_ip:
+                wait = max(wait, self._by_ip.retry_after(ip_address, now))
+            if wait > 0:
+                self.blocked += 1
+        return int(wait) + 1 if wait > 0 else 0
+
+    def record_failure(self, email: str, ip_address: Optional[str], at: Optional[float] = None):
+        if not self.enabled:
+            return
+        at = at or time.time()
+        with self._lock:
+            self._by_email.add(email.lower(), at)
+            if ip_address and self.per_ip:
+                self._by_ip.add(ip_address, at)
+
+    def record_success(self, email: str):
+        """A correct password clears the account's counter (the IP's is kept)"""
+        with self._lock:
+            self._by_email.reset(email.lower())
+
+    def rebuild(self, conn, failed_logins) -> int:
+        """Reload failures inside the current window from the failed-login partitions"""
+        if not self.enabled:
+            return 0
+        cutoff_iso = datetime.utcfromtimestamp(time.time() - self.window).isoformat()
+        rows = []
+        # Oldest month first, so events are replayed in time order
+        for table in reversed(failed_logins.covering(cutoff_iso)):
+            rows += conn.execute(
+                select(table.c.email, table.c.ip_address, table.c.attempt_time)
+                .where(table.c.attempt_time >= cutoff_iso)
+                .order_by(table.c.attempt_time)
+            ).all()
+        with self._lock:
+            self._by_email = SlidingWindowCounter(self._by_email.limit, self.window, self._by_email.max_keys)
+            self._by_ip = SlidingWindowCounter(self._by_ip.limit, self.window, self._by_ip.max_keys)
+        for email, ip_address, attempt_time in rows:
+            at = datetime.fromisoformat(attempt_time).replace(tzinfo=timezone.utc).timestamp()
+            self.record_failure(email, ip_address, at)
+        logger.info(f"✅ Login guard rebuilt from {len(rows)} recent failed attempts")
+        return len(rows)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "window_seconds": self.window,
+                "max_per_email": self._by_email.limit,
+                "max_per_ip": self._by_ip.limit if self.per_ip else None,
+                "trusted_proxies": [str(network) for network in TRUSTED_PROXIES],
+                "tracked_emails": len(self._by_email),
+                "tracked_ips": len(self._by_ip),
+                "blocked": self.blocked
+            }
+
+
+login_guard = LoginGuard(
+    max_per_email=settings.LOGIN_MAX_FAILURES_PER_EMAIL,
+    max_per_ip=settings.LOGIN_MAX_FAILURES_PER_IP,
+    window_seconds=settings.LOGIN_FAILURE_WINDOW_SECONDS,
+    max_keys=settings.LOGIN_GUARD_MAX_KEYS
+)
@@ -0,0 +1,380 @@
+"""
+Schema Migrations
+Versioned, in-place upgrades for existing databases. create_all only creates
+missing tables, so anything that changes an existing table (new indexes,
+columns) is added here as a numbered migration.
+
+Usage (from backend/):
+    python migrations.py                 # apply pending migrations
+    python migrations.py --status        # show applied versions
+    python migrations.py --check-plans   # verify hot queries use their indexes
+
+tests/test_query_plans.py runs the plan check against a freshly migrated
+database, so an index regression fails the test suite.
+"""
+import sys
+import time
+from datetime import datetime
+from typing import Callable, List, NamedTuple
+from sqlalchemy import Column, Integer, String, Table, desc, func, inspect, select, text, true, tuple_
+from sqlalchemy.exc import IntegrityError, OperationalError
+import activity_partitions
+import models as db_models
+import phone_verification
+import rollups
+import user_activity
+import user_cache
+from config import settings
+from database import Base, engine
+from logger import logger
+
+schema_version = Table(
+    "schema_version", Base.metadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String, nullable=False),
+    Column("applied_at", String, nullable=False)
+)
+
+
+# Arbitrary application-wide key for the PostgreSQL advisory lock
+SCHEMA_LOCK_KEY = 0x6d616c61
+
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    upgrade: Callable
+
+
+MIGRATIONS: List[Migration] = []
+
+
+def migration(version: int, description: str):
+    """Register an upgrade function; versions must be unique and increasing"""
+    def register(upgrade: Callable):
+        assert not MIGRATIONS or version > MIGRATIONS[-1].version, "Migrations must be added in order"
+        MIGRATIONS.append(Migration(version, description, upgrade))
+        return upgrade
+    return register
+
+
+# ============= HELPERS =============
+
+def create_index(conn, name: str, table: str, columns: str, where: str = None):
+    """CREATE INDEX IF NOT EXISTS, so tables created by create_all are unaffected"""
+    sql = f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})"
+    if where:
+        sql += f" WHERE {where}"
+    conn.execute(text(sql))
+
+
+def add_column(conn, table: str, column: str, ddl: str):
+    """ALTER TABLE ADD COLUMN unless the column already exists"""
+    existing = {c["name"] for c in inspect(conn).get_columns(table)}
+    if column not in existing:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+
+# ============= MIGRATIONS =============
+
+@migration(1, "Composite indexes for prediction and appointment queries")
+def _hot_query_indexes(conn):
+    create_index(conn, "ix_predictions_user_created", "predictions", "user_id, created_at")
+    create_index(conn, "ix_predictions_user_prediction", "predictions", "user_id, prediction")
+    create_index(conn, "ix_predictions_patient_user", "predictions", "patient_id, user_id, created_at")
+    create_index(conn, "ix_predictions_created_at", "predictions", "created_at")
+    create_index(conn, "ix_predictions_image_path", "predictions", "image_path")
+    create_index(conn, "ix_patients_user_id", "patients", "user_id")
+    create_index(conn, "ix_appointments_doctor_date", "appointments", "doctor_id, appointment_date")
+    create_index(conn, "ix_appointments_patient_date", "appointments", "patient_id, appointment_date")
+
+
+@migration(2, "Backfill prediction rollups")
+def _backfill_rollups(conn):
+    rollups.rebuild_rollups(conn)
+
+
+@migration(3, "Keyset pagination indexes for list endpoints")
+def _pagination_indexes(conn):
+    create_index(conn, "ix_users_created_at", "users", "created_at")
+    create_index(conn, "ix_users_role_created", "users", "role, created_at")
+    create_index(conn, "ix_patients_user_created", "patients", "user_id, created_at")
+    create_index(conn, "ix_appointments_appointment_date", "appointments", "appointment_date")
+
+
+@migration(4, "Review queue columns and indexes")
+def _review_queue(conn):
+    add_column(conn, "predictions", "priority", "INTEGER DEFAULT 0")
+    add_column(conn, "predictions", "claimed_by", "INTEGER REFERENCES users(id)")
+    add_column(conn, "predictions", "claim_expires_at", "DATETIME")
+    add_column(conn, "predictions", "reviewed_at", "DATETIME")
+    conn.execute(text(
+        "UPDATE predictions SET priority = "
+        "(CASE WHEN prediction = 'Parasitized' THEN 2 ELSE 0 END) + "
+        "(CASE WHEN confidence < :uncertain THEN 1 ELSE 0 END)"
+    ), {"uncertain": settings.REVIEW_UNCERTAIN_CONFIDENCE})
+    create_index(conn, "ix_predictions_review_queue", "predictions", "status, priority DESC, created_at")
+    create_index(conn, "ix_predictions_doctor_reviewed", "predictions", "doctor_id, reviewed_at")
+
+
+@migration(5, "Failed login attempt indexes")
+def _failed_login_indexes(conn):
+    create_index(conn, "idx_failed_email_time", "failed_login_attempts", "email, attempt_time")
+    create_index(conn, "idx_failed_ip_time", "failed_login_attempts", "ip_address, attempt_time")
+    create_index(conn, "idx_failed_time", "failed_login_attempts", "attempt_time")
+
+
+@migration(6, "Partial indexes on active sessions")
+def _active_session_indexes(conn):
+    # Created from the table definition so the WHERE clause matches the dialect
+    for index in user_activity.user_sessions.indexes:
+        if index.name in ("idx_session_active_activity", "idx_session_active_user"):
+            index.create(conn, checkfirst=True)
+
+
+@migration(7, "OTP attempt counter and phone verification indexes")
+def _otp_store(conn):
+    add_column(conn, "phone_verifications", "attempts", "INTEGER DEFAULT 0")
+    create_index(conn, "ix_phone_verifications_lookup", "phone_verifications", "phone, is_verified, expires_at")
+    create_index(conn, "ix_phone_verifications_expires_at", "phone_verifications", "expires_at")
+
+
+@migration(8, "Move activity history into monthly partitions")
+def _partition_activity(conn):
+    for partitioned in (user_activity.login_history, user_activity.activity_log, user_activity.failed_logins):
+        moved = partitioned.absorb(conn)
+        if moved:
+            logger.info(f"📦 {partitioned.name}: {moved} rows moved into monthly partitions")
+
+
+@migration(9, "Flag stored images that recompression cannot shrink")
+def _incompressible_flag(conn):
+    add_column(conn, "stored_images", "incompressible", "BOOLEAN DEFAULT 0")
+
+
+@migration(10, "Claimed cases index for doctor stats")
+def _claimed_cases_index(conn):
+    create_index(conn, "ix_predictions_claimed_by", "predictions", "claimed_by, status")
+
+
+@migration(11, "User cache invalidation log")
+def _user_cache_invalidations(conn):
+    user_cache.invalidations.create(conn, checkfirst=True)
+
+
+@migration(12, "Per-phone OTP attempt window")
+def _otp_attempt_window(conn):
+    add_column(conn, "phone_verifications", "window_started_at", "DATETIME")
+
+
+@migration(13, "Maintenance lease table")
+def _maintenance_leases(conn):
+    activity_partitions.maintenance_leases.create(conn, checkfirst=True)
+
+
+# ============= RUNNER =============
+
+def applied_versions(conn) -> List[int]:
+    return [row[0] for row in conn.execute(select(schema_version.c.version).order_by(schema_version.c.version))]
+
+
+def lock_schema(conn, timeout: float = 600):
+    """
+    Begin a transaction that holds the schema lock until commit, so only one
+    process checks and applies migrations at a time
+    SQLite takes the database write lock up front (BEGIN IMMEDIATE) instead of
+    at the first INSERT, which pysqlite would issue after the DDL had already
+    run; a process still migrating may hold it past busy_timeout, so waiting
+    is retried up to `timeout` seconds. PostgreSQL takes a transaction-level
+    advisory lock, which needs no table to exist yet.
+    """
+    dialect = conn.dialect.name
+    if dialect == "sqlite":
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                conn.exec_driver_sql("BEGIN IMMEDIATE")
+                return
+            except OperationalError as e:
+                conn.rollback()
+                if "locked" not in str(e) or time.monotonic() > deadline:
+                    raise
+                time.sleep(0.5)
+    if dialect == "postgresql":
+        conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": SCHEMA_LOCK_KEY})
+
+
+def run_migrations(bind=engine) -> int:
+    """
+    Create missing tables, then apply pending migrations in order, each in
+    its own transaction under the schema lock. Safe to run on every startup
+    and from several processes at once: a version is re-checked once the
+    lock is held, so a process that waited skips what the winner applied.
+    Returns the number of migrations applied.
+    """
+    with bind.connect() as conn:
+        lock_schema(conn)
+        Base.metadata.create_all(bind=conn)
+        done = set(applied_versions(conn))
+        conn.commit()
+
+    applied = 0
+    for m in MIGRATIONS:
+        if m.version in done:
+            continue
+        try:
+            with bind.connect() as conn:
+                lock_schema(conn)
+                if m.version in applied_versions(conn):
+                    # Another process applied it while we waited for the lock
+                    conn.rollback()
+                    continue
+                m.upgrade(conn)
+                conn.execute(schema_version.insert().values(
+                    version=m.version,
+                    description=m.description,
+                    applied_at=datetime.utcnow().isoformat()
+                ))
+                conn.commit()
+        except IntegrityError:
+            # Dialects without a schema lock: another process recorded this version first
+            continue
+        applied += 1
+        logger.info(f"✅ Migration {m.version} applied: {m.description}")
+
+    return applied
+
+
+# ============= QUERY PLAN CHECKS =============
+
+def hot_queries():
+    """(name, statement, expected index) for the endpoint queries the indexes serve"""
+    P = db_models.Prediction
+    A = db_models.Appointment
+    U = db_models.User
+    F = user_activity.failed_logins.current()
+    L = user_activity.login_history.current()
+    month = F.name[-6:]
+    S = user_activity.user_sessions
+    V = phone_verification.verifications
+    keyset = lambda sort, key: tuple_(sort, key) < tuple_(datetime(2024, 1, 1), 1000)
+    return [
+        ("predictions by user, newest first",
+         select(P).where(P.user_id == 1).order_by(desc(P.created_at)).limit(100),
+         "ix_predictions_user_created"),
+        ("predictions by user in date range",
+         select(P).where(P.user_id == 1, P.created_at >= datetime(2024, 1, 1)).order_by(desc(P.created_at)),
+         "ix_predictions_user_created"),
+        ("user infected count",
+         select(func.count()).select_from(P).where(P.user_id == 1, P.prediction == "Parasitized"),
+         "ix_predictions_user_prediction"),
+        ("patient history",
+         select(P).where(P.patient_id == 1, P.user_id == 1).order_by(desc(P.created_at)),
+         "ix_predictions_patient_user"),
+        ("predictions since date",
+         select(func.count()).select_from(P).where(P.created_at >= datetime(2024, 1, 1)),
+         "ix_predictions_created_at"),
+        ("doctor appointments",
+         select(A).where(A.doctor_id == 1).order_by(desc(A.appointment_date)),
+         "ix_appointments_doctor_date"),
+        ("patient appointments",
+         select(A).where(A.patient_id == 1).order_by(desc(A.appointment_date)),
+         "ix_appointments_patient_date"),
+        ("user predictions page",
+         select(P).where(P.user_id == 1, keyset(P.created_at, P.id))
+         .order_by(desc(P.created_at), desc(P.id)).limit(101),
+         "ix_predictions_user_created"),
+        ("admin predictions page",
+         select(P).where(keyset(P.created_at, P.id)).order_by(desc(P.created_at), desc(P.id)).limit(101),
+         "ix_predictions_created_at"),
+        ("admin users page",
+         select(U).where(keyset(U.created_at, U.id)).order_by(desc(U.created_at), desc(U.id)).limit(101),
+         "ix_users_created_at"),
+        ("doctors page",
+         select(U).where(U.role == "doctor", keyset(U.created_at, U.id))
+         .order_by(desc(U.created_at), desc(U.id)).limit(101),
+         "ix_users_role_created"),
+        ("admin appointments page",
+         select(A).where(keyset(A.appointment_date, A.id))
+         .order_by(desc(A.appointment_date), desc(A.id)).limit(101),
+         "ix_appointments_appointment_date"),
+        ("review queue head",
+         select(P.id).where(P.status == "pending").order_by(desc(P.priority), P.created_at).limit(1),
+         "ix_predictions_review_queue"),
+        ("doctor recent reviews",
+         select(P).where(P.doctor_id == 1, P.reviewed_at.isnot(None)).order_by(desc(P.reviewed_at)).limit(5),
+         "ix_predictions_doctor_reviewed"),
+        ("doctor claimed cases",
+         select(func.count()).select_from(P).where(P.claimed_by == 1, P.status == "pending"),
+         "ix_predictions_claimed_by"),
+        ("failed logins for email",
+         select(F).where(F.c.email == "user@example.com", F.c.attempt_time >= "2024-01-01T00:00:00")
+         .order_by(desc(F.c.attempt_time)),
+         f"idx_failed_email_time_{month}"),
+        ("recent failed logins (guard rebuild)",
+         select(F.c.email, F.c.ip_address, F.c.attempt_time).where(F.c.attempt_time >= "2024-01-01T00:00:00")
+         .order_by(F.c.attempt_time),
+         f"idx_failed_time_{month}"),
+        ("login history for user",
+         select(L).where(L.c.user_id == 1).order_by(desc(L.c.login_time)).limit(50),
+         f"idx_login_user_time_{month}"),
+        ("daily logins since date",
+         select(func.substr(L.c.login_time, 1, 10), func.count()).where(L.c.login_time >= "2024-01-01T00:00:00")
+         .group_by(func.substr(L.c.login_time, 1, 10)),
+         f"idx_login_time_{month}"),
+        ("active sessions for user",
+         select(S).where(S.c.user_id == 1, S.c.is_active == true()).order_by(desc(S.c.last_activity)),
+         "idx_session_active_user"),
+        ("idle active sessions (sweep)",
+         select(S.c.id).where(S.c.is_active == true(), S.c.last_activity < "2024-01-01T00:00:00"),
+         "idx_session_active_activity"),
+        ("live otp for phone",
+         select(V).where(V.c.phone == "+10000000000", V.c.is_verified == False, V.c.expires_at > datetime(2024, 1, 1))
+         .order_by(desc(V.c.id)).limit(1),
+         "ix_phone_verifications_lookup"),
+        ("expired otps (purge)",
+         select(V.c.id).where(V.c.is_verified == False, V.c.expires_at <= datetime(2024, 1, 1)),
+         "ix_phone_verifications_expires_at"),
+    ]
+
+
+def check_query_plans(bind=engine) -> List[dict]:
+    """Run EXPLAIN QUERY PLAN (SQLite) for each hot query and report index use"""
+    if bind.dialect.name != "sqlite":
+        raise RuntimeError("Query plan checks are only implemented for SQLite")
+
+    results = []
+    with bind.connect() as conn:
+        for name, statement, index in hot_queries():
+            sql = str(statement.compile(bind, compile_kwargs={"literal_binds": True}))
+            plan = [row[-1] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"))]
+            results.append({
+                "query": name,
+                "index": index,
+                "uses_index": any(index in step for step in plan),
+                "plan": plan
+            })
+    return results
+
+
+if __name__ == "__main__":
+    if "--status" in sys.argv:
+        Base.metadata.create_all(bind=engine, tables=[schema_version])
+        with engine.connect() as conn:
+            done = set(applied_versions(conn))
+        for m in MIGRATIONS:
+            print(f"{'applied' if m.version in done else 'pending':<8} {m.version:>3}  {m.description}")
+    elif "--check-plans" in sys.argv:
+        run_migrations()
+        failures = 0
+        for result in check_query_plans():
+            status = "ok" if result["uses_index"] else "MISSING"
+            failures += not result["uses_index"]
+            print(f"{status:<8} {result['query']:<36} {result['index']}")
+            if not result["uses_index"]:
+                for step in result["plan"]:
+                    print(f"         {step}")
+        sys.exit(1 if failures else 0)
+    else:
+        count = run_migrations()
+        print(f"{count} migration(s) applied")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Boolean, Text
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Boolean, Text, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from database import Base
@@ -18,13 +18,17 @@ class User(Base):
     date_of_birth = Column(DateTime, nullable=True)  # For patients
     gender = Column(String, nullable=True)
     is_active = Column(Boolean, default=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     predictions = relationship("Prediction", back_populates="user", foreign_keys="Prediction.user_id")
     patients = relationship("Patient", back_populates="user")
     appointments = relationship("Appointment", back_populates="patient", foreign_keys="Appointment.patient_id")
     doctor_appointments = relationship("Appointment", back_populates="doctor", foreign_keys="Appointment.doctor_id")
+    
+    __table_args__ = (
+        Index("ix_users_role_created", "role", "created_at"),
+    )
 
 class Patient(Base):
     __tablename__ = "patients"
@@ -34,11 +38,15 @@ class Patient(Base):
     name = Column(String)
     age = Column(Integer)
     gender = Column(String)
-    user_id = Column(Integer, ForeignKey("users.id"))
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     
     user = relationship("User", back_populates="patients")
     predictions = relationship("Prediction", back_populates="patient")
+    
+    __table_args__ = (
+        Index("ix_patients_user_created", "user_id", "created_at"),
+    )
 
 class Prediction(Base):
     __tablename__ = "predictions"
@@ -47,7 +55,7 @@ class Prediction(Base):
     user_id = Column(Integer, ForeignKey("users.id"))
     patient_id = Column(Integer, ForeignKey("patients.id"), nullable=True)
     doctor_id = Column(Integer, ForeignKey("users.id"), nullable=True)  # Doctor who reviewed
-    image_path = Column(String)
+    image_path = Column(String, index=True)
     prediction = Column(String)
     confidence = Column(Float)
     prob_parasitized = Column(Float)
@@ -57,12 +65,27 @@ class Prediction(Base):
     prescription = Column(Text, nullable=True)
     diagnosis = Column(Text, nullable=True)
     status = Column(String, default="pending")  # pending, reviewed, completed
+    priority = Column(Integer, default=0)  # Review order, higher first (see review_queue)
+    claimed_by = Column(Integer, ForeignKey("users.id"), nullable=True)  # Doctor holding the review lease
+    claim_expires_at = Column(DateTime, nullable=True)
+    reviewed_at = Column(DateTime, nullable=True)
     share_token = Column(String, nullable=True, unique=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     user = relationship("User", foreign_keys=[user_id], back_populates="predictions")
     patient = relationship("Patient", back_populates="predictions")
+    
+    # Composite indexes for the per-user listing, stats and patient history
+    # queries (added to existing databases by migration 1)
+    __table_args__ = (
+        Index("ix_predictions_user_created", "user_id", "created_at"),
+        Index("ix_predictions_user_prediction", "user_id", "prediction"),
+        Index("ix_predictions_patient_user", "patient_id", "user_id", "created_at"),
+        Index("ix_predictions_review_queue", "status", priority.desc(), "created_at"),
+        Index("ix_predictions_doctor_reviewed", "doctor_id", "reviewed_at"),
+        Index("ix_predictions_claimed_by", "claimed_by", "status"),
+    )
 
 class MLModel(Base):
     __tablename__ = "ml_models"
@@ -82,7 +105,7 @@ class Appointment(Base):
     id = Column(Integer, primary_key=True, index=True)
     patient_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     doctor_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    appointment_date = Column(DateTime, nullable=False)
+    appointment_date = Column(DateTime, nullable=False, index=True)
     reason = Column(Text, nullable=True)
     status = Column(String, default="scheduled")  # scheduled, completed, cancelled
     notes = Column(Text, nullable=True)
@@ -91,3 +114,43 @@ class Appointment(Base):
     
     patient = relationship("User", foreign_keys=[patient_id], back_populates="appointments")
     doctor = relationship("User", foreign_keys=[doctor_id], back_populates="doctor_appointments")
+    
+    __table_args__ = (
+        Index("ix_appointments_doctor_date", "doctor_id", "appointment_date"),
+        Index("ix_appointments_patient_date", "patient_id", "appointment_date"),
+    )
+
+class StoredImage(Base):
+    """Content-addressed upload stored once per unique SHA-256 digest"""
+    __tablename__ = "stored_images"
+    
+    digest = Column(String, primary_key=True)  # SHA-256 hex of the uploaded bytes
+    path = Column(String, unique=True, nullable=False)
+    size_bytes = Column(Integer, nullable=False)
+    format = Column(String, nullable=True)  # PNG, JPEG
+    incompressible = Column(Boolean, default=False)  # Recompression would not shrink it
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class PredictionRollup(Base):
+    """Prediction counts per day, user and class, kept in step by rollups.py"""
+    __tablename__ = "prediction_rollups"
+    
+    day = Column(String, primary_key=True)  # YYYY-MM-DD (UTC) of Prediction.created_at
+    user_id = Column(Integer, primary_key=True)  # 0 for predictions without a user
+    prediction = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+    
+    __table_args__ = (
+        Index("ix_prediction_rollups_user", "user_id", "prediction"),
+    )
+
+class DoctorReviewStats(Base):
+    """Running review totals per doctor, updated with each review (review_queue.py)"""
+    __tablename__ = "doctor_review_stats"
+    
+    doctor_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    reviewed_count = Column(Integer, nullable=False, default=0)
+    confirmed_count = Column(Integer, nullable=False, default=0)  # Reviews agreeing with the AI result
+    parasitized_count = Column(Integer, nullable=False, default=0)
+    total_response_seconds = Column(Float, nullable=False, default=0)  # Sum of upload-to-review times
+    last_reviewed_at = Column(DateTime, nullable=True)
@@ -0,0 +1,87 @@
+"""
+Keyset Pagination
+Cursor-based paging on (timestamp, id) for list endpoints. Pages are read
+with an indexed range condition instead of OFFSET, so page 1000 costs the
+same as page 1. Responses stay plain JSON arrays; the cursor for the next
+page is returned in the X-Next-Cursor header (absent on the last page).
+Paging is opt-in: a request with neither cursor nor limit gets the full
+list, as clients written before pagination expect.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import List, Optional
+from fastapi import HTTPException, Response
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Query
+from config import settings
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(sort_value: Optional[datetime], row_id: int) -> str:
+    sort_text = sort_value.isoformat() if sort_value is not None else None
+    payload = json.dumps([sort_text, row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_text, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        sort_value = datetime.fromisoformat(sort_text) if sort_text is not None else None
+        return sort_value, int(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def page_limit(limit: Optional[int]) -> int:
+    """Page size for a paged request (cursor given without a limit: the default)"""
+    if limit is None:
+        return settings.PAGE_SIZE_DEFAULT
+    if limit < 1:
+        raise HTTPException(status_code=400, detail="limit must be positive")
+    return min(limit, settings.PAGE_SIZE_MAX)
+
+
+def paginate(
+    query: Query,
+    sort_column,
+    id_column,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None
+) -> List:
+    """
+    Return one page of `query`, newest first by (sort_column, id_column)
+    Rows must expose the sort and id columns as attributes of the same name.
+    Without cursor and limit every row is returned, unpaged. Rows with a NULL
+    sort value come last (by id); they never satisfy the (sort, id) range
+    condition, so they are read by a separate IS NULL query once the dated
+    rows run out, keeping both on the index.
+    """
+    def ordered(q: Query) -> Query:
+        return q.order_by(sort_column.desc().nulls_last(), id_column.desc())
+
+    if cursor is None and limit is None:
+        return ordered(query).all()
+
+    limit = page_limit(limit)
+    sort_value, row_id = decode_cursor(cursor) if cursor else (None, None)
+    if cursor and sort_value is None:
+        rows = ordered(query.filter(sort_column.is_(None), id_column < row_id)).limit(limit + 1).all()
+    else:
+        dated = query.filter(sort_column.isnot(None))
+        if cursor:
+            dated = dated.filter(tuple_(sort_column, id_column) < tuple_(sort_value, row_id))
+        rows = ordered(dated).limit(limit + 1).all()
+        if len(rows) <= limit:
+            rows += ordered(query.filter(sort_column.is_(None))).limit(limit + 1 - len(rows)).all()
+
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(
+            getattr(last, sort_column.key), getattr(last, id_column.key)
+        )
+    return rows
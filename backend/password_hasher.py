@@ -0,0 +1,125 @@
+"""
+Password hashing executor
+bcrypt is deliberately slow (~100-300ms of CPU per call). Login and
+register await it on a small dedicated pool instead of running it on the
+event loop or tying up the shared request threadpool, so a login burst
+queues here while every other endpoint stays responsive. The pool can be
+a process pool to take hashing off the server process entirely. When more
+than `max_pending` calls are waiting, new ones are refused with 503.
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional, Tuple
+from fastapi import HTTPException
+from passlib.context import CryptContext
+from config import settings
+from logger import logger
+
+# Hashes with a different cost than BCRYPT_ROUNDS are reported by
+# verify_and_update as needing a rehash, which login applies transparently
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__max_rounds=settings.BCRYPT_ROUNDS
+)
+
+
+def _hash(password: str) -> Tuple[str, float]:
+    started = time.perf_counter()
+    return pwd_context.hash(password), time.perf_counter() - started
+
+
+def _verify(password: str, hashed_password: str) -> Tuple[Tuple[bool, Optional[str]], float]:
+    started = time.perf_counter()
+    return pwd_context.verify_and_update(password, hashed_password), time.perf_counter() - started
+
+
+class PasswordHasher:
+    def __init__(self, workers: int = 2, use_processes: bool = False, max_pending: int = 64):
+        self.workers = workers
+        self.use_processes = use_processes
+        self.max_pending = max_pending
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+        self.pending = 0  # Submitted and not yet finished (queued + running)
+        self.completed = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.total_hash = 0.0
+
+    def _get_executor(self) -> Executor:
+        with self._lock:
+            if self._executor is None:
+                if self.use_processes:
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                else:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+                kind = "processes" if self.use_processes else "threads"
+                logger.info(f"✅ Password hasher started ({self.workers} {kind}, rounds={settings.BCRYPT_ROUNDS})")
+            return self._executor
+
+    def stop(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+    async def _run(self, fn, *args):
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=503,
+                    detail="Authentication is busy, please retry",
+                    headers={"Retry-After": "1"}
+                )
+            self.pending += 1
+        submitted = time.perf_counter()
+        try:
+            result, hash_seconds = await asyncio.wrap_future(self._get_executor().submit(fn, *args))
+        finally:
+            with self._lock:
+                self.pending -= 1
+        wait = time.perf_counter() - submitted - hash_seconds
+        with self._lock:
+            self.completed += 1
+            self.total_hash += hash_seconds
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+        return result
+
+    async def hash(self, password: str) -> str:
+        return await self._run(_hash, password)
+
+    async def verify(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """(valid, new_hash); new_hash is set when the stored hash uses outdated settings"""
+        return await self._run(_verify, password, hashed_password)
+
+    def stats(self) -> dict:
+        with self._lock:
+            completed = self.completed
+            return {
+                "workers": self.workers,
+                "use_processes": self.use_processes,
+                "bcrypt_rounds": settings.BCRYPT_ROUNDS,
+                "in_flight": self.pending,
+                "queued": max(0, self.pending - self.workers),
+                "max_pending": self.max_pending,
+                "completed": completed,
+                "rejected": self.rejected,
+                "avg_wait_ms": round(self.total_wait / completed * 1000, 2) if completed else 0.0,
+                "max_wait_ms": round(self.max_wait * 1000, 2),
+                "avg_hash_ms": round(self.total_hash / completed * 1000, 2) if completed else 0.0
+            }
+
+
+password_hasher = PasswordHasher(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    use_processes=settings.PASSWORD_HASH_USE_PROCESSES,
+    max_pending=settings.PASSWORD_HASH_MAX_PENDING
+)
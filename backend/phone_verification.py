@@ -1,27 +1,307 @@
 """
 Phone verification system for patient registration
+Live OTPs are held in an expiring in-memory map keyed by phone (one dict
+lookup per verify) and mirrored to phone_verifications, which remains the
+source of truth across workers and restarts. Wrong codes are counted per
+phone over OTP_ATTEMPT_WINDOW_SECONDS, carried over when a code is resent:
+after OTP_MAX_ATTEMPTS the live OTP is invalidated and no new one is issued
+until the window ends. A background thread drops expired entries from the map
+and deletes expired unverified rows once they hold no count worth keeping.
 """
-import random
+import hmac
+import secrets
 import string
+import threading
 from datetime import datetime, timedelta
-from sqlalchemy import Column, Integer, String, DateTime, Boolean
-from database import Base, SessionLocal
+from typing import Dict, NamedTuple, Optional
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Index, case, delete, func, insert, or_, select, update
+from config import settings
+from database import Base, SessionLocal, engine
 from logger import logger
 
 class PhoneVerification(Base):
     """Phone verification OTP storage"""
     __tablename__ = "phone_verifications"
-    
+
     id = Column(Integer, primary_key=True, index=True)
     phone = Column(String, nullable=False, index=True)
     otp = Column(String, nullable=False)
     is_verified = Column(Boolean, default=False)
+    attempts = Column(Integer, default=0)  # Wrong codes for the phone since window_started_at
+    window_started_at = Column(DateTime, nullable=True)
     expires_at = Column(DateTime, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        # Live OTP for a phone, and verified-phone checks
+        Index("ix_phone_verifications_lookup", "phone", "is_verified", "expires_at"),
+        # Expiry purge
+        Index("ix_phone_verifications_expires_at", "expires_at"),
+    )
+
+verifications = PhoneVerification.__table__
+
 def generate_otp(length=6):
     """Generate a random OTP"""
-    return ''.join(random.choices(string.digits, k=length))
+    return ''.join(secrets.choice(string.digits) for _ in range(length))
+
+# ============= OTP STORE =============
+
+class PendingOtp(NamedTuple):
+    id: int
+    otp: str
+    expires_at: datetime
+    attempts: int
+
+class OtpLocked(Exception):
+    """Too many wrong codes for the phone in the current window"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"retry after {retry_after}s")
+        self.retry_after = retry_after
+
+class OtpStore:
+    def __init__(
+        self,
+        ttl_seconds: int = 300,
+        max_attempts: int = 5,
+        attempt_window_seconds: int = 3600,
+        purge_interval_seconds: float = 60
+    ):
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self.max_attempts = max_attempts
+        self.attempt_window = timedelta(seconds=attempt_window_seconds)
+        self.purge_interval = purge_interval_seconds
+        self._pending: Dict[str, PendingOtp] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.issued = 0
+        self.verified = 0
+        self.rejected = 0
+        self.locked_out = 0
+        self.memory_misses = 0
+        self.purged = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="otp-purge", daemon=True)
+        self._thread.start()
+        logger.info(f"✅ OTP store started (ttl={self.ttl}, max attempts={self.max_attempts})")
+
+    def stop(self, timeout: float = 5):
+        if not self.running:
+            return
+        self._stop.set()
+        self._thread.join(timeout=timeout)
+        self._thread = None
+
+    def issue(self, phone: str) -> PendingOtp:
+        """
+        Replace any unverified OTP for the phone with a new one, carrying its
+        wrong-attempt count while the window lasts; raises OtpLocked if the
+        phone used up its attempts in this window
+        """
+        otp = generate_otp()
+        now = datetime.utcnow()
+        expires_at = now + self.ttl
+        with engine.begin() as conn:
+            # DELETE ... RETURNING reads and replaces the previous code atomically
+            previous = conn.execute(
+                delete(verifications)
+                .where(verifications.c.phone == phone, verifications.c.is_verified == False)
+                .returning(verifications.c.attempts, verifications.c.window_started_at)
+            ).all()
+            attempts, window_started_at = 0, now
+            for row in previous:
+                if row.window_started_at is not None and row.window_started_at > now - self.attempt_window:
+                    attempts = max(attempts, row.attempts or 0)
+                    window_started_at = min(window_started_at, row.window_started_at)
+            if attempts >= self.max_attempts:
+                # Raising rolls the delete back, so the count survives
+                retry_after = window_started_at + self.attempt_window - now
+                raise OtpLocked(int(retry_after.total_seconds()) + 1)
+            row_id = conn.execute(insert(verifications).values(
+                phone=phone, otp=otp, is_verified=False, attempts=attempts,
+                window_started_at=window_started_at, expires_at=expires_at, created_at=now
+            )).inserted_primary_key[0]
+        entry = PendingOtp(row_id, otp, expires_at, attempts)
+        with self._lock:
+            self._pending[phone] = entry
+            self.issued += 1
+        return entry
+
+    def _load(self, phone: str) -> Optional[PendingOtp]:
+        """Live OTP for the phone from the table (issued by another worker or before a restart)"""
+        with engine.connect() as conn:
+            row = conn.execute(
+                select(verifications.c.id, verifications.c.otp, verifications.c.expires_at, verifications.c.attempts)
+                .where(
+                    verifications.c.phone == phone,
+                    verifications.c.is_verified == False,
+                    verifications.c.expires_at > datetime.utcnow()
+                )
+                .order_by(verifications.c.id.desc())
+                .limit(1)
+            ).first()
+        if row is None:
+            return None
+        return PendingOtp(row.id, row.otp, row.expires_at, row.attempts or 0)
+
+    def _get(self, phone: str) -> Optional[PendingOtp]:
+        with self._lock:
+            entry = self._pending.get(phone)
+        if entry is not None and entry.expires_at > datetime.utcnow():
+            return entry
+        with self._lock:
+            self.memory_misses += 1
+        entry = self._load(phone)
+        with self._lock:
+            if entry is None:
+                self._pending.pop(phone, None)
+            else:
+                self._pending[phone] = entry
+        return entry
+
+    def verify(self, phone: str, otp: str) -> Optional[str]:
+        """None on success, otherwise the reason the code was refused"""
+        entry = self._get(phone)
+        if entry is None:
+            with self._lock:
+                self.rejected += 1
+            return "Invalid or expired OTP"
+        if not hmac.compare_digest(entry.otp, otp):
+            return self._record_failure(phone, entry, otp)
+        return self._accept(phone, entry)
+
+    def _accept(self, phone: str, entry: PendingOtp) -> Optional[str]:
+        # Conditional update, so a code is accepted at most once across workers.
+        # otp is matched too: SQLite may reuse a replaced row's id for its successor.
+        with engine.begin() as conn:
+            accepted = conn.execute(
+                update(verifications)
+                .where(
+                    verifications.c.id == entry.id,
+                    verifications.c.otp == entry.otp,
+                    verifications.c.is_verified == False,
+                    verifications.c.attempts < self.max_attempts,
+                    verifications.c.expires_at > datetime.utcnow()
+                )
+                .values(is_verified=True)
+            ).rowcount
+        with self._lock:
+            self._pending.pop(phone, None)
+            if accepted:
+                self.verified += 1
+            else:
+                self.rejected += 1
+        return None if accepted else "Invalid or expired OTP"
+
+    def _record_failure(self, phone: str, entry: PendingOtp, otp: str, reload: bool = True) -> str:
+        """
+        Count a wrong code on the row in one UPDATE, expiring it at the limit
+        so no worker accepts it, even one with a stale copy. No row matching
+        means this worker's copy predates a resend handled by another worker:
+        only then is the live OTP reloaded and the code checked against it.
+        """
+        now = datetime.utcnow()
+        attempts = verifications.c.attempts + 1
+        with engine.begin() as conn:
+            row = conn.execute(
+                update(verifications)
+                .where(
+                    verifications.c.id == entry.id,
+                    verifications.c.otp == entry.otp,
+                    verifications.c.is_verified == False
+                )
+                .values(
+                    attempts=attempts,
+                    expires_at=case((attempts >= self.max_attempts, now), else_=verifications.c.expires_at)
+                )
+                .returning(verifications.c.attempts)
+            ).first()
+        if row is None:
+            latest = self._load(phone) if reload else None
+            with self._lock:
+                if latest is None:
+                    self._pending.pop(phone, None)
+                    self.rejected += 1
+                else:
+                    self._pending[phone] = latest
+            if latest is None:
+                return "Invalid or expired OTP"
+            if hmac.compare_digest(latest.otp, otp):
+                return self._accept(phone, latest)
+            return self._record_failure(phone, latest, otp, reload=False)
+
+        with self._lock:
+            if row.attempts >= self.max_attempts:
+                self._pending.pop(phone, None)
+                self.locked_out += 1
+            else:
+                self._pending[phone] = entry._replace(attempts=row.attempts)
+                self.rejected += 1
+        if row.attempts >= self.max_attempts:
+            logger.warning(f"⚠️ OTP for {phone} invalidated after {row.attempts} wrong attempts")
+            return "Too many attempts, please request a new OTP later"
+        return "Invalid or expired OTP"
+
+    def purge(self) -> int:
+        """
+        Drop expired map entries and delete expired unverified rows, except
+        those still carrying wrong attempts for an open window
+        """
+        now = datetime.utcnow()
+        with self._lock:
+            for phone in [p for p, entry in self._pending.items() if entry.expires_at <= now]:
+                del self._pending[phone]
+        with engine.begin() as conn:
+            deleted = conn.execute(delete(verifications).where(
+                verifications.c.is_verified == False,
+                verifications.c.expires_at <= now,
+                or_(
+                    func.coalesce(verifications.c.attempts, 0) == 0,
+                    func.coalesce(verifications.c.window_started_at, verifications.c.created_at)
+                    <= now - self.attempt_window
+                )
+            )).rowcount
+        self.purged += deleted
+        return deleted
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "running": self.running,
+                "pending": len(self._pending),
+                "issued": self.issued,
+                "verified": self.verified,
+                "rejected": self.rejected,
+                "locked_out": self.locked_out,
+                "memory_misses": self.memory_misses,
+                "purged": self.purged
+            }
+
+    def _run(self):
+        while not self._stop.wait(self.purge_interval):
+            try:
+                self.purge()
+            except Exception as e:
+                logger.error(f"❌ OTP purge failed: {e}")
+
+otp_store = OtpStore(
+    ttl_seconds=settings.OTP_TTL_SECONDS,
+    max_attempts=settings.OTP_MAX_ATTEMPTS,
+    attempt_window_seconds=settings.OTP_ATTEMPT_WINDOW_SECONDS,
+    purge_interval_seconds=settings.OTP_PURGE_INTERVAL_SECONDS
+)
+
+# ============= API =============
 
 def send_otp(phone: str) -> dict:
     """
@@ -29,86 +309,55 @@ def send_otp(phone: str) -> dict:
     In production, integrate with SMS service like Twilio
     For now, we'll just store it in database
     """
-    db = SessionLocal()
     try:
-        # Generate OTP
-        otp = generate_otp()
-        
-        # Set expiration (5 minutes)
-        expires_at = datetime.utcnow() + timedelta(minutes=5)
-        
-        # Delete old OTPs for this phone
-        db.query(PhoneVerification).filter(
-            PhoneVerification.phone == phone,
-            PhoneVerification.is_verified == False
-        ).delete()
-        
-        # Create new verification
-        verification = PhoneVerification(
-            phone=phone,
-            otp=otp,
-            expires_at=expires_at
-        )
-        db.add(verification)
-        db.commit()
-        
-        logger.info(f"OTP generated for {phone}: {otp}")
-        
+        entry = otp_store.issue(phone)
+
+        logger.info(f"OTP generated for {phone}: {entry.otp}")
+
         # In production, send SMS here
         # For demo, return OTP in response
         return {
             "success": True,
             "message": "OTP sent successfully",
-            "otp": otp,  # Remove this in production!
-            "expires_in": 300  # 5 minutes
+            "otp": entry.otp,  # Remove this in production!
+            "expires_in": settings.OTP_TTL_SECONDS
+        }
+    except OtpLocked as e:
+        logger.warning(f"⚠️ OTP for {phone} refused: attempts used up for this window")
+        return {
+            "success": False,
+            "message": "Too many attempts, please try again later",
+            "retry_after": e.retry_after
         }
     except Exception as e:
         logger.error(f"Error sending OTP: {e}")
-        db.rollback()
         return {
             "success": False,
             "message": "Failed to send OTP"
         }
-    finally:
-        db.close()
 
 def verify_otp(phone: str, otp: str) -> dict:
     """Verify OTP for phone number"""
-    db = SessionLocal()
     try:
-        # Find verification
-        verification = db.query(PhoneVerification).filter(
-            PhoneVerification.phone == phone,
-            PhoneVerification.otp == otp,
-            PhoneVerification.is_verified == False,
-            PhoneVerification.expires_at > datetime.utcnow()
-        ).first()
-        
-        if not verification:
+        reason = otp_store.verify(phone, otp)
+        if reason is not None:
             return {
                 "success": False,
-                "message": "Invalid or expired OTP"
+                "message": reason
             }
-        
-        # Mark as verified
-        verification.is_verified = True
-        db.commit()
-        
+
         logger.info(f"Phone verified: {phone}")
-        
+
         return {
             "success": True,
             "message": "Phone verified successfully"
         }
     except Exception as e:
         logger.error(f"Error verifying OTP: {e}")
-        db.rollback()
         return {
             "success": False,
             "message": "Verification failed"
         }
-    finally:
-        db.close()
 
 def is_phone_verified(phone: str) -> bool:
     """Check if phone is verified"""
@@ -124,6 +373,5 @@ def is_phone_verified(phone: str) -> bool:
 
 def create_phone_verification_table():
     """Create phone verification table"""
-    from database import engine
     Base.metadata.create_all(bind=engine, tables=[PhoneVerification.__table__])
     logger.info("Phone verification table created")
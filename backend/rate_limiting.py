@@ -0,0 +1,142 @@
+"""
+Rate limiting
+Shared counter storage and key functions for slowapi. The default limits
+storage is per process, so with several uvicorn workers each one counted
+separately. SQLiteStorage keeps fixed-window counters in a small WAL-mode
+SQLite file that every local worker shares, incremented with one atomic
+upsert per hit. Clients are keyed by JWT subject when authenticated (so a
+user's limit follows them across IPs) and by remote address otherwise, and
+raw batch uploads cost one unit per frame.
+"""
+import threading
+import time
+from typing import Optional
+from fastapi import Request
+from jose import JWTError, jwt
+from limits.storage import Storage
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+import auth
+import raw_ingest
+from database import create_db_engine
+from login_guard import client_ip
+
+PURGE_EVERY = 1000  # Increments between deletions of expired counters
+
+
+class SQLiteStorage(Storage):
+    """
+    limits storage backed by a SQLite table, for fixed-window limits
+
+    URI: sqlite:///path/to/rate_limits.db
+    """
+
+    STORAGE_SCHEME = ["sqlite"]
+
+    def __init__(self, uri: str, wrap_exceptions: bool = False, **options):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        self.engine = create_db_engine(uri)
+        self._increments = 0
+        self._lock = threading.Lock()
+        with self.engine.begin() as conn:
+            conn.execute(text(
+                "CREATE TABLE IF NOT EXISTS rate_limits ("
+                "key TEXT PRIMARY KEY, count INTEGER NOT NULL, expires_at REAL NOT NULL)"
+            ))
+
+    @property
+    def base_exceptions(self):
+        return SQLAlchemyError
+
+    def incr(self, key: str, expiry: int, elastic_expiry: bool = False, amount: int = 1) -> int:
+        """Add `amount` to the key's window, starting a new window if it has expired"""
+        now = time.time()
+        with self.engine.begin() as conn:
+            count = conn.execute(text("""
+                INSERT INTO rate_limits (key, count, expires_at) VALUES (:key, :amount, :expires_at)
+                ON CONFLICT(key) DO UPDATE SET
+                    count = CASE WHEN expires_at <= :now THEN :amount ELSE count + :amount END,
+                    expires_at = CASE WHEN expires_at <= :now OR :elastic THEN :expires_at ELSE expires_at END
+                RETURNING count
+            """), {
+                "key": key,
+                "amount": amount,
+                "now": now,
+                "expires_at": now + expiry,
+                "elastic": elastic_expiry
+            }).scalar()
+        self._maybe_purge(now)
+        return count
+
+    def _maybe_purge(self, now: float):
+        with self._lock:
+            self._increments += 1
+            if self._increments % PURGE_EVERY:
+                return
+        with self.engine.begin() as conn:
+            conn.execute(text("DELETE FROM rate_limits WHERE expires_at <= :now"), {"now": now})
+
+    def get(self, key: str) -> int:
+        with self.engine.connect() as conn:
+            count = conn.execute(
+                text("SELECT count FROM rate_limits WHERE key = :key AND expires_at > :now"),
+                {"key": key, "now": time.time()}
+            ).scalar()
+        return count or 0
+
+    def get_expiry(self, key: str) -> float:
+        with self.engine.connect() as conn:
+            expires_at = conn.execute(
+                text("SELECT expires_at FROM rate_limits WHERE key = :key"), {"key": key}
+            ).scalar()
+        return expires_at or time.time()
+
+    def check(self) -> bool:
+        try:
+            with self.engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+            return True
+        except SQLAlchemyError:
+            return False
+
+    def reset(self) -> Optional[int]:
+        with self.engine.begin() as conn:
+            return conn.execute(text("DELETE FROM rate_limits")).rowcount
+
+    def clear(self, key: str) -> None:
+        with self.engine.begin() as conn:
+            conn.execute(text("DELETE FROM rate_limits WHERE key = :key"), {"key": key})
+
+
+# ============= KEY AND COST FUNCTIONS =============
+
+def user_or_ip_key(request: Request) -> str:
+    """
+    JWT subject for authenticated requests, client address otherwise
+    Only the token signature is checked here (no DB lookup); an invalid
+    token falls back to the address and is rejected later by the endpoint.
+    """
+    authorization = request.headers.get("authorization", "")
+    token = authorization[7:] if authorization.lower().startswith("bearer ") else request.query_params.get("access_token")
+    if token:
+        try:
+            subject = jwt.decode(token, auth.SECRET_KEY, algorithms=[auth.ALGORITHM]).get("sub")
+            if subject:
+                return f"user:{subject}"
+        except JWTError:
+            pass
+    return f"ip:{client_ip(request) or '127.0.0.1'}"
+
+
+def raw_frame_cost_known(request: Request) -> bool:
+    """Whether raw_frame_cost can price the request; raw uploads without it are refused"""
+    return request.headers.get("content-length", "").isdigit()
+
+
+def raw_frame_cost(request: Request) -> int:
+    """One unit per frame in a raw upload, from Content-Length (header bytes round down)"""
+    try:
+        length = int(request.headers.get("content-length", 0))
+    except ValueError:
+        return 1
+    return min(max(1, length // raw_ingest.FRAME_BYTES), raw_ingest.MAX_BATCH_FRAMES)
@@ -0,0 +1,78 @@
+"""
+Raw frame ingest for edge capture devices
+Parses pre-resized 224x224 uint8 RGB frames so they can skip image decoding and resizing
+"""
+import io
+import struct
+import numpy as np
+import torch
+from PIL import Image
+from fastapi import HTTPException
+
+FRAME_SIZE = 224
+FRAME_CHANNELS = 3
+FRAME_BYTES = FRAME_SIZE * FRAME_SIZE * FRAME_CHANNELS
+
+# Packed batch layout: header followed by `count` frames in HWC order
+#   magic (4s) | version (H) | count (H) | height (H) | width (H)
+BATCH_MAGIC = b"PDRB"
+BATCH_VERSION = 1
+BATCH_HEADER = struct.Struct("<4sHHHH")
+MAX_BATCH_FRAMES = 64
+
+# Same normalization as the torchvision transform used for uploaded images
+_MEAN = torch.tensor([0.485, 0.456, 0.406]).view(1, 3, 1, 1)
+_STD = torch.tensor([0.229, 0.224, 0.225]).view(1, 3, 1, 1)
+
+
+def parse_frames(body: bytes) -> np.ndarray:
+    """
+    Parse a request body into an (N, 224, 224, 3) uint8 array
+
+    A body of exactly FRAME_BYTES is a single headerless frame,
+    anything else must be a packed batch starting with BATCH_HEADER.
+    """
+    if len(body) == FRAME_BYTES:
+        return np.frombuffer(body, dtype=np.uint8).reshape(1, FRAME_SIZE, FRAME_SIZE, FRAME_CHANNELS)
+
+    if len(body) < BATCH_HEADER.size or body[:4] != BATCH_MAGIC:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Body must be a single {FRAME_SIZE}x{FRAME_SIZE} RGB frame ({FRAME_BYTES} bytes) or a packed batch"
+        )
+
+    magic, version, count, height, width = BATCH_HEADER.unpack_from(body)
+
+    if version != BATCH_VERSION:
+        raise HTTPException(status_code=400, detail=f"Unsupported batch version: {version}")
+    if height != FRAME_SIZE or width != FRAME_SIZE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Frames must be pre-resized to {FRAME_SIZE}x{FRAME_SIZE}, got {width}x{height}"
+        )
+    if count < 1 or count > MAX_BATCH_FRAMES:
+        raise HTTPException(status_code=400, detail=f"Batch must contain 1-{MAX_BATCH_FRAMES} frames")
+
+    expected = BATCH_HEADER.size + count * FRAME_BYTES
+    if len(body) != expected:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Batch size mismatch: header declares {count} frames ({expected} bytes), got {len(body)} bytes"
+        )
+
+    return np.frombuffer(body, dtype=np.uint8, offset=BATCH_HEADER.size).reshape(
+        count, FRAME_SIZE, FRAME_SIZE, FRAME_CHANNELS
+    )
+
+
+def frames_to_tensor(frames: np.ndarray) -> torch.Tensor:
+    """Convert (N, H, W, 3) uint8 frames into a normalized NCHW float batch"""
+    batch = torch.from_numpy(np.ascontiguousarray(frames).copy()).permute(0, 3, 1, 2).float().div_(255.0)
+    return (batch - _MEAN) / _STD
+
+
+def encode_frame(frame: np.ndarray) -> bytes:
+    """Encode a raw frame as PNG for storage, using fast compression"""
+    buffer = io.BytesIO()
+    Image.fromarray(frame).save(buffer, format="PNG", compress_level=1)
+    return buffer.getvalue()
@@ -0,0 +1,235 @@
+"""
+Doctor Review Queue
+Pending predictions are served in priority order (parasitized and
+low-confidence results first) from the ix_predictions_review_queue index.
+Doctors take a time-limited lease on a case with a compare-and-set UPDATE,
+so concurrent claims never hand the same case to two doctors, and an
+abandoned claim becomes available again once its lease expires.
+"""
+from datetime import datetime, timedelta
+from typing import List, Optional
+from sqlalchemy import and_, event, or_, update
+from sqlalchemy.orm import Session
+import models as db_models
+import event_bus
+import rollups
+from config import settings
+
+Prediction = db_models.Prediction
+
+PENDING = "pending"
+CLAIM_RETRIES = 5
+
+
+def review_priority(prediction: Optional[str], confidence: Optional[float]) -> int:
+    """0-3: +2 for a parasitized result, +1 when the model was unsure"""
+    priority = 2 if prediction == "Parasitized" else 0
+    if confidence is not None and confidence < settings.REVIEW_UNCERTAIN_CONFIDENCE:
+        priority += 1
+    return priority
+
+
+@event.listens_for(Prediction, "before_insert")
+def _set_priority(mapper, connection, target):
+    if target.priority is None:
+        target.priority = review_priority(target.prediction, target.confidence)
+
+
+def _available(now: datetime, doctor_id: Optional[int] = None):
+    """Pending and either unclaimed, lease expired, or (optionally) held by doctor_id"""
+    conditions = [Prediction.claimed_by.is_(None), Prediction.claim_expires_at < now]
+    if doctor_id is not None:
+        conditions.append(Prediction.claimed_by == doctor_id)
+    return and_(Prediction.status == PENDING, or_(*conditions))
+
+
+def _queue_order():
+    return Prediction.priority.desc(), Prediction.created_at
+
+
+def pending_cases(db: Session, doctor_id: int, limit: int = 50) -> List:
+    """Cases this doctor can work on: their own claims and everything unclaimed"""
+    return db.query(Prediction, db_models.Patient.name.label("patient_name")).outerjoin(
+        db_models.Patient, db_models.Patient.id == Prediction.patient_id
+    ).filter(
+        _available(datetime.utcnow(), doctor_id)
+    ).order_by(*_queue_order()).limit(limit).all()
+
+
+def claim_case(db: Session, prediction_id: int, doctor_id: int) -> bool:
+    """
+    Take or renew the lease on one case. The UPDATE only matches while the
+    case is still available, so of several concurrent claims exactly one
+    sees rowcount == 1.
+    """
+    now = datetime.utcnow()
+    result = db.execute(
+        update(Prediction)
+        .where(Prediction.id == prediction_id, _available(now, doctor_id))
+        .values(claimed_by=doctor_id, claim_expires_at=now + timedelta(minutes=settings.REVIEW_CLAIM_MINUTES))
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    if result.rowcount != 1:
+        return False
+    event_bus.case_changed("case.claimed", prediction_id, doctor_id)
+    return True
+
+
+def claim_next(db: Session, doctor_id: int) -> Optional[int]:
+    """Claim the highest-priority available case; returns its id or None if the queue is empty"""
+    for _ in range(CLAIM_RETRIES):
+        candidate = db.query(Prediction.id).filter(
+            _available(datetime.utcnow())
+        ).order_by(*_queue_order()).limit(1).scalar()
+        if candidate is None:
+            return None
+        if claim_case(db, candidate, doctor_id):
+            return candidate
+        # Another doctor won this one; look again
+    return None
+
+
+def release_case(db: Session, prediction_id: int, doctor_id: int) -> bool:
+    result = db.execute(
+        update(Prediction)
+        .where(
+            Prediction.id == prediction_id,
+            Prediction.status == PENDING,
+            Prediction.claimed_by == doctor_id
+        )
+        .values(claimed_by=None, claim_expires_at=None)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    if result.rowcount != 1:
+        return False
+    event_bus.case_changed("case.released", prediction_id, doctor_id)
+    return True
+
+
+def review_case(
+    db: Session,
+    prediction_id: int,
+    doctor_id: int,
+    status: str,
+    diagnosis: Optional[str] = None,
+    notes: Optional[str] = None,
+    prescription: Optional[str] = None
+) -> bool:
+    """
+    Record a review if the case is still available to this doctor, and fold
+    it into doctor_review_stats in the same transaction. Returns False if
+    the case was already reviewed or is leased to someone else.
+    """
+    now = datetime.utcnow()
+    case = db.query(Prediction.user_id, Prediction.prediction, Prediction.created_at).filter(
+        Prediction.id == prediction_id
+    ).first()
+    if case is None:
+        return False
+
+    values = {
+        "status": status,
+        "doctor_id": doctor_id,
+        "reviewed_at": now,
+        "claimed_by": None,
+        "claim_expires_at": None
+    }
+    if diagnosis is not None:
+        values["diagnosis"] = diagnosis
+    if notes is not None:
+        values["doctor_notes"] = notes
+    if prescription is not None:
+        values["prescription"] = prescription
+
+    result = db.execute(
+        update(Prediction)
+        .where(Prediction.id == prediction_id, _available(now, doctor_id))
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        db.rollback()
+        return False
+
+    _record_review(db, doctor_id, case, diagnosis, now)
+    db.commit()
+    event_bus.case_changed(
+        "case.reviewed", prediction_id, doctor_id, owner_id=case.user_id,
+        status=status, diagnosis=diagnosis, reviewed_at=now
+    )
+    return True
+
+
+def _record_review(db: Session, doctor_id: int, case, diagnosis: Optional[str], now: datetime):
+    """Fold one review into the doctor's running totals (upsert, as rollups.bump)"""
+    S = db_models.DoctorReviewStats
+    table = S.__table__
+    response_seconds = (now - case.created_at).total_seconds() if case.created_at else 0
+    confirmed = 1 if (diagnosis or "").lower() == "confirmed" else 0
+    parasitized = 1 if case.prediction == "Parasitized" else 0
+    increments = {
+        "reviewed_count": table.c.reviewed_count + 1,
+        "confirmed_count": table.c.confirmed_count + confirmed,
+        "parasitized_count": table.c.parasitized_count + parasitized,
+        "total_response_seconds": table.c.total_response_seconds + response_seconds,
+        "last_reviewed_at": now
+    }
+
+    # A doctor's first two reviews may race; ON CONFLICT makes the second an update
+    dialect_insert = rollups.UPSERT_DIALECTS.get(db.get_bind().dialect.name)
+    if dialect_insert is not None:
+        db.execute(dialect_insert(table).values(
+            doctor_id=doctor_id,
+            reviewed_count=1,
+            confirmed_count=confirmed,
+            parasitized_count=parasitized,
+            total_response_seconds=response_seconds,
+            last_reviewed_at=now
+        ).on_conflict_do_update(index_elements=["doctor_id"], set_=increments))
+        return
+
+    updated = db.execute(update(table).where(table.c.doctor_id == doctor_id).values(**increments)).rowcount
+    if updated == 0:
+        db.add(S(
+            doctor_id=doctor_id,
+            reviewed_count=1,
+            confirmed_count=confirmed,
+            parasitized_count=parasitized,
+            total_response_seconds=response_seconds,
+            last_reviewed_at=now
+        ))
+
+
+def doctor_stats(db: Session, doctor_id: int) -> dict:
+    """Dashboard figures from the running totals plus two indexed lookups"""
+    S = db_models.DoctorReviewStats
+    stats = db.query(S).filter(S.doctor_id == doctor_id).first()
+    reviewed = stats.reviewed_count if stats else 0
+
+    claimed = db.query(Prediction.id).filter(
+        Prediction.claimed_by == doctor_id,
+        Prediction.status == PENDING
+    ).count()
+    total_patients = db.query(db_models.Appointment.patient_id).filter(
+        db_models.Appointment.doctor_id == doctor_id
+    ).distinct().count()
+    recent = db.query(Prediction.id, Prediction.prediction, Prediction.reviewed_at).filter(
+        Prediction.doctor_id == doctor_id,
+        Prediction.reviewed_at.isnot(None)
+    ).order_by(Prediction.reviewed_at.desc()).limit(5).all()
+
+    return {
+        "total_patients": total_patients,
+        "reviewed_cases": reviewed,
+        "claimed_cases": claimed,
+        "total_cases": reviewed + claimed,
+        "parasitized_reviewed": stats.parasitized_count if stats else 0,
+        "accuracy": round(stats.confirmed_count / reviewed * 100, 1) if reviewed else 0,
+        "avg_response_time": round(stats.total_response_seconds / reviewed / 3600, 1) if reviewed else 0,
+        "recent_activity": [
+            {"description": f"Reviewed case #{r.id} ({r.prediction})", "time": r.reviewed_at.isoformat()}
+            for r in recent
+        ]
+    }
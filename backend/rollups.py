@@ -0,0 +1,165 @@
+"""
+Prediction Rollups
+Keeps prediction_rollups (count per day, user and class) in step with the
+predictions table so dashboard stats read O(days) rows instead of scanning
+every prediction. Counters are adjusted in the same flush as the change
+that caused them; rebuild_rollups/verify_rollups reconcile from scratch.
+
+Usage (from backend/):
+    python rollups.py --verify    # report drift, exit 1 if any
+    python rollups.py --rebuild   # recompute from predictions
+"""
+import sys
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import delete, event, func, insert, inspect, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection
+import models as db_models
+from database import engine
+from logger import logger
+
+Prediction = db_models.Prediction
+rollup_table = db_models.PredictionRollup.__table__
+
+RollupKey = Tuple[str, int, str]
+
+# Dialects with INSERT ... ON CONFLICT DO UPDATE
+UPSERT_DIALECTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+
+def rollup_key(created_at: Optional[datetime], user_id: Optional[int], prediction: Optional[str]) -> RollupKey:
+    day = (created_at or datetime.utcnow()).strftime("%Y-%m-%d")
+    return day, user_id or 0, prediction or ""
+
+
+def bump(conn: Connection, key: RollupKey, delta: int):
+    """Add `delta` to one rollup counter, creating the row if needed"""
+    day, user_id, prediction = key
+    dialect_insert = UPSERT_DIALECTS.get(conn.dialect.name)
+    if dialect_insert is not None:
+        stmt = dialect_insert(rollup_table).values(day=day, user_id=user_id, prediction=prediction, count=delta)
+        conn.execute(stmt.on_conflict_do_update(
+            index_elements=["day", "user_id", "prediction"],
+            set_={"count": rollup_table.c.count + delta}
+        ))
+        return
+
+    result = conn.execute(update(rollup_table).where(
+        rollup_table.c.day == day,
+        rollup_table.c.user_id == user_id,
+        rollup_table.c.prediction == prediction
+    ).values(count=rollup_table.c.count + delta))
+    if result.rowcount == 0:
+        conn.execute(insert(rollup_table).values(day=day, user_id=user_id, prediction=prediction, count=delta))
+
+
+# ============= INCREMENTAL MAINTENANCE =============
+# ORM-level events: bulk query.update()/query.delete() on predictions bypass
+# them, so code paths that need those must call bump() or rebuild_rollups()
+
+@event.listens_for(Prediction, "after_insert")
+def _on_insert(mapper, connection, target):
+    bump(connection, rollup_key(target.created_at, target.user_id, target.prediction), 1)
+
+
+@event.listens_for(Prediction, "after_delete")
+def _on_delete(mapper, connection, target):
+    bump(connection, rollup_key(target.created_at, target.user_id, target.prediction), -1)
+
+
+@event.listens_for(Prediction, "after_update")
+def _on_update(mapper, connection, target):
+    """Move the count when a prediction changes owner, class or date"""
+    state = inspect(target)
+    tracked = ("created_at", "user_id", "prediction")
+    if not any(state.attrs[name].history.has_changes() for name in tracked):
+        return
+
+    def previous(name):
+        history = state.attrs[name].history
+        return history.deleted[0] if history.deleted else getattr(target, name)
+
+    old_key = rollup_key(previous("created_at"), previous("user_id"), previous("prediction"))
+    new_key = rollup_key(target.created_at, target.user_id, target.prediction)
+    if old_key != new_key:
+        bump(connection, old_key, -1)
+        bump(connection, new_key, 1)
+
+
+# ============= RECONCILIATION =============
+
+def compute_rollups(conn: Connection) -> Dict[RollupKey, int]:
+    """Aggregate the predictions table directly (full scan)"""
+    rows = conn.execute(
+        select(
+            func.date(Prediction.created_at),
+            Prediction.user_id,
+            Prediction.prediction,
+            func.count()
+        ).group_by(func.date(Prediction.created_at), Prediction.user_id, Prediction.prediction)
+    )
+    counts = Counter()
+    for day, user_id, prediction, count in rows:
+        counts[(str(day), user_id or 0, prediction or "")] += count
+    return dict(counts)
+
+
+def stored_rollups(conn: Connection) -> Dict[RollupKey, int]:
+    rows = conn.execute(select(
+        rollup_table.c.day, rollup_table.c.user_id, rollup_table.c.prediction, rollup_table.c.count
+    ).where(rollup_table.c.count != 0))
+    return {(day, user_id, prediction): count for day, user_id, prediction, count in rows}
+
+
+def verify_rollups(conn: Connection) -> List[dict]:
+    """Differences between stored rollups and a fresh aggregate"""
+    expected = compute_rollups(conn)
+    actual = stored_rollups(conn)
+    mismatches = []
+    for key in sorted(set(expected) | set(actual)):
+        if expected.get(key, 0) != actual.get(key, 0):
+            day, user_id, prediction = key
+            mismatches.append({
+                "day": day,
+                "user_id": user_id,
+                "prediction": prediction,
+                "expected": expected.get(key, 0),
+                "stored": actual.get(key, 0)
+            })
+    return mismatches
+
+
+def rebuild_rollups(conn: Connection) -> int:
+    """Replace every rollup row with a fresh aggregate; returns the row count"""
+    counts = compute_rollups(conn)
+    conn.execute(delete(rollup_table))
+    if counts:
+        conn.execute(insert(rollup_table), [
+            {"day": day, "user_id": user_id, "prediction": prediction, "count": count}
+            for (day, user_id, prediction), count in counts.items()
+        ])
+    return len(counts)
+
+
+def reconcile(conn: Connection) -> dict:
+    """Verify, and rebuild only if the stored rollups have drifted"""
+    mismatches = verify_rollups(conn)
+    if mismatches:
+        logger.warning(f"⚠️ Prediction rollups drifted ({len(mismatches)} keys), rebuilding")
+        rebuild_rollups(conn)
+    return {"mismatches": len(mismatches), "rebuilt": bool(mismatches), "details": mismatches[:100]}
+
+
+if __name__ == "__main__":
+    with engine.begin() as conn:
+        if "--rebuild" in sys.argv:
+            print(f"{rebuild_rollups(conn)} rollup rows written")
+        else:
+            mismatches = verify_rollups(conn)
+            for m in mismatches:
+                print(f"{m['day']} user={m['user_id']} {m['prediction']}: "
+                      f"stored {m['stored']}, expected {m['expected']}")
+            print(f"{len(mismatches)} mismatched rollup keys")
+            sys.exit(1 if mismatches else 0)
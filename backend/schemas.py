@@ -1,6 +1,6 @@
 from pydantic import BaseModel, EmailStr
-from datetime import datetime
-from typing import Optional
+from datetime import date, datetime
+from typing import List, Literal, Optional
 
 # User Schemas
 class UserBase(BaseModel):
@@ -29,6 +29,11 @@ class Token(BaseModel):
     token_type: str
     user: User
 
+class MediaToken(BaseModel):
+    access_token: str
+    scope: str
+    expires_in: int
+
 # Patient Schemas
 class PatientBase(BaseModel):
     patient_id: str
@@ -74,6 +79,35 @@ class Prediction(PredictionBase):
 class PredictionWithPatient(Prediction):
     patient: Optional[Patient] = None
 
+class PredictionListItem(PredictionBase):
+    """List projection: no doctor_notes/prescription/diagnosis text columns"""
+    id: int
+    user_id: Optional[int]
+    patient_id: Optional[int]
+    image_path: str
+    gradcam_path: Optional[str]
+    status: Optional[str] = None
+    created_at: datetime
+    
+    class Config:
+        from_attributes = True
+
+class PredictionListItemWithPatient(PredictionListItem):
+    patient: Optional[Patient] = None
+
+class PendingCase(PredictionListItem):
+    """Review queue entry"""
+    priority: int = 0
+    claimed_by: Optional[int] = None
+    claim_expires_at: Optional[datetime] = None
+    patient_name: Optional[str] = None
+
+class CaseReview(BaseModel):
+    diagnosis: Optional[str] = None
+    notes: Optional[str] = None
+    prescription: Optional[str] = None
+    status: Literal["reviewed", "completed"] = "reviewed"
+
 # Stats Schemas
 class Stats(BaseModel):
     total_scans: int
@@ -88,6 +122,61 @@ class AdminStats(Stats):
     predictions_this_week: int
     predictions_this_month: int
 
+class StorageStats(BaseModel):
+    stored_images: int
+    stored_bytes: int
+    referenced_images: int
+    referenced_bytes: int
+    dedup_ratio: float
+    bytes_saved: int
+
+# Analytics Schemas
+class AnalyticsTotals(BaseModel):
+    total: int
+    parasitized: int
+    uninfected: int
+    infection_rate: float
+    high_confidence: int
+    high_confidence_rate: float
+    mean_confidence: Optional[float] = None
+
+class AnalyticsBucket(BaseModel):
+    bucket: str  # YYYY-MM-DD (day, week start) or YYYY-MM
+    total: int
+    parasitized: int
+    uninfected: int
+    infection_rate: float
+
+class ConfidenceBin(BaseModel):
+    lower: float
+    upper: float
+    count: int
+
+class UserBreakdown(BaseModel):
+    user_id: int
+    email: Optional[str] = None
+    full_name: Optional[str] = None
+    total: int
+    parasitized: int
+    infection_rate: float
+
+class RecentPrediction(BaseModel):
+    id: int
+    user_id: Optional[int] = None
+    prediction: Optional[str] = None
+    confidence: Optional[float] = None
+    created_at: datetime
+
+class AnalyticsReport(BaseModel):
+    start: date
+    end: date
+    bucket: str
+    totals: AnalyticsTotals
+    series: List[AnalyticsBucket]
+    confidence_histogram: List[ConfidenceBin]
+    by_user: List[UserBreakdown]
+    recent: List[RecentPrediction]
+
 # Appointment Schemas
 class AppointmentBase(BaseModel):
     doctor_id: int
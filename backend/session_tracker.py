@@ -0,0 +1,155 @@
+"""
+Session activity tracking
+Authenticated requests mark their session as seen in memory; a background
+thread writes the latest timestamp per session in one batched UPDATE every
+`flush_interval` seconds, so tracking costs no write per request. The same
+thread ends sessions idle for longer than `idle_timeout` and deletes ended
+sessions older than the retention period, so user_sessions stays small.
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+from sqlalchemy import bindparam, delete, func, true, update
+from config import settings
+from database import engine
+from logger import logger
+from user_activity import user_sessions
+
+
+class SessionTracker:
+    def __init__(
+        self,
+        flush_interval_seconds: float = 30,
+        idle_timeout_minutes: int = 1440,
+        sweep_interval_seconds: float = 300,
+        retention_days: int = 90
+    ):
+        self.flush_interval = flush_interval_seconds
+        self.idle_timeout = timedelta(minutes=idle_timeout_minutes)
+        self.sweep_interval = sweep_interval_seconds
+        self.retention = timedelta(days=retention_days) if retention_days > 0 else None
+        self._pending: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_sweep = 0.0
+        self.touches = 0
+        self.flushed = 0
+        self.flushes = 0
+        self.expired = 0
+        self.purged = 0
+        self.failed = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="session-tracker", daemon=True)
+        self._thread.start()
+        logger.info(f"✅ Session tracker started (flush={self.flush_interval}s, idle timeout={self.idle_timeout})")
+
+    def stop(self, timeout: float = 10):
+        """Stop the thread after a final flush"""
+        if not self.running:
+            return
+        self._stop.set()
+        self._thread.join(timeout=timeout)
+        self._thread = None
+
+    def touch(self, session_token: str):
+        """Record activity on a session; O(1), no database access"""
+        now = datetime.utcnow().isoformat()
+        with self._lock:
+            self._pending[session_token] = now
+            self.touches += 1
+
+    def discard(self, session_token: str):
+        with self._lock:
+            self._pending.pop(session_token, None)
+
+    def flush(self) -> int:
+        """Write pending last-activity times in one executemany UPDATE"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        statement = update(user_sessions).where(
+            user_sessions.c.session_token == bindparam("token"),
+            user_sessions.c.is_active == true()
+        ).values(last_activity=bindparam("seen"))
+        try:
+            with engine.begin() as conn:
+                conn.execute(statement, [{"token": token, "seen": seen} for token, seen in pending.items()])
+        except Exception as e:
+            self.failed += len(pending)
+            logger.error(f"❌ Session activity flush failed ({len(pending)} sessions): {e}")
+            return 0
+        self.flushed += len(pending)
+        self.flushes += 1
+        return len(pending)
+
+    def sweep(self) -> dict:
+        """End idle sessions and delete ended ones past retention"""
+        now = datetime.utcnow()
+        with engine.begin() as conn:
+            expired = conn.execute(
+                update(user_sessions)
+                .where(
+                    user_sessions.c.is_active == true(),
+                    user_sessions.c.last_activity < (now - self.idle_timeout).isoformat()
+                )
+                .values(is_active=False, logout_time=user_sessions.c.last_activity)
+            ).rowcount
+            purged = 0
+            if self.retention is not None:
+                purged = conn.execute(
+                    delete(user_sessions).where(
+                        user_sessions.c.is_active == False,  # noqa: E712
+                        func.coalesce(user_sessions.c.logout_time, user_sessions.c.last_activity)
+                        < (now - self.retention).isoformat()
+                    )
+                ).rowcount
+        self.expired += expired
+        self.purged += purged
+        if expired or purged:
+            logger.info(f"🧹 Sessions swept: {expired} expired, {purged} deleted")
+        return {"expired": expired, "purged": purged}
+
+    def stats(self) -> dict:
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            "running": self.running,
+            "pending": pending,
+            "touches": self.touches,
+            "flushed": self.flushed,
+            "flushes": self.flushes,
+            "coalesce_ratio": round(self.touches / self.flushed, 2) if self.flushed else 0.0,
+            "expired": self.expired,
+            "purged": self.purged,
+            "failed": self.failed
+        }
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+            if time.monotonic() - self._last_sweep >= self.sweep_interval:
+                self._last_sweep = time.monotonic()
+                try:
+                    self.sweep()
+                except Exception as e:
+                    logger.error(f"❌ Session sweep failed: {e}")
+        self.flush()
+
+
+session_tracker = SessionTracker(
+    flush_interval_seconds=settings.SESSION_FLUSH_INTERVAL_SECONDS,
+    idle_timeout_minutes=settings.SESSION_IDLE_TIMEOUT_MINUTES,
+    sweep_interval_seconds=settings.SESSION_SWEEP_INTERVAL_SECONDS,
+    retention_days=settings.SESSION_RETENTION_DAYS
+)
@@ -55,55 +55,9 @@ class SmartImageValidator:
             if image.mode != 'RGB':
                 image = image.convert('RGB')
             
-            # 4. Check image characteristics
+            # 4-6. Statistical checks on the pixel data
             img_array = np.array(image)
-            
-            # Check mean intensity (blood cell images have specific brightness)
-            mean_intensity = np.mean(img_array)
-            if mean_intensity < 20:
-                raise HTTPException(
-                    status_code=400,
-                    detail="❌ Image too dark. This doesn't look like a blood cell microscopy image."
-                )
-            if mean_intensity > 240:
-                raise HTTPException(
-                    status_code=400,
-                    detail="❌ Image too bright. This doesn't look like a blood cell microscopy image."
-                )
-            
-            # Check variance (blood cell images have detail)
-            variance = np.var(img_array)
-            if variance < 200:
-                raise HTTPException(
-                    status_code=400,
-                    detail="❌ Image lacks detail. Please upload a clear blood cell microscopy image."
-                )
-            
-            # 5. Check color distribution (blood cells have specific colors)
-            # Blood cell images typically have pinkish/purple tones
-            r_mean = np.mean(img_array[:, :, 0])
-            g_mean = np.mean(img_array[:, :, 1])
-            b_mean = np.mean(img_array[:, :, 2])
-            
-            # Check if image has reasonable color distribution
-            color_std = np.std([r_mean, g_mean, b_mean])
-            if color_std < 5:
-                raise HTTPException(
-                    status_code=400,
-                    detail="❌ Image appears to be grayscale or lacks color variation. Blood cell images should have color."
-                )
-            
-            # 6. Check image complexity (edges, textures)
-            # Blood cells have specific texture patterns
-            gray = np.mean(img_array, axis=2)
-            edges = np.abs(np.diff(gray, axis=0)).sum() + np.abs(np.diff(gray, axis=1)).sum()
-            edge_density = edges / (width * height)
-            
-            if edge_density < 5:
-                raise HTTPException(
-                    status_code=400,
-                    detail="❌ Image too simple. This doesn't appear to be a microscopy image."
-                )
+            stats = self.validate_array(img_array)
             
             # 7. AI-based validation (if model is available)
             if self.model is not None:
@@ -125,15 +79,14 @@ class SmartImageValidator:
                 )
             
             logger.info(f"✓ Image validation passed: {filename} ({width}x{height}, "
-                       f"mean={mean_intensity:.1f}, var={variance:.1f}, edge_density={edge_density:.1f})")
+                       f"mean={stats['mean_intensity']:.1f}, var={stats['variance']:.1f}, "
+                       f"edge_density={stats['edge_density']:.1f})")
             
             return {
                 "valid": True,
                 "width": width,
                 "height": height,
-                "mean_intensity": float(mean_intensity),
-                "variance": float(variance),
-                "edge_density": float(edge_density)
+                **stats
             }
             
         except HTTPException:
@@ -145,6 +98,68 @@ class SmartImageValidator:
                 detail=f"❌ Invalid image file: {str(e)}"
             )
     
+    def validate_array(self, img_array: np.ndarray) -> dict:
+        """
+        Statistical checks on a decoded HxWx3 uint8 RGB array
+        Used directly for raw frames that skip image decoding
+        Returns: dict with the computed statistics
+        """
+        height, width = img_array.shape[:2]
+        
+        # 4. Check image characteristics
+        # Check mean intensity (blood cell images have specific brightness)
+        mean_intensity = np.mean(img_array)
+        if mean_intensity < 20:
+            raise HTTPException(
+                status_code=400,
+                detail="❌ Image too dark. This doesn't look like a blood cell microscopy image."
+            )
+        if mean_intensity > 240:
+            raise HTTPException(
+                status_code=400,
+                detail="❌ Image too bright. This doesn't look like a blood cell microscopy image."
+            )
+        
+        # Check variance (blood cell images have detail)
+        variance = np.var(img_array)
+        if variance < 200:
+            raise HTTPException(
+                status_code=400,
+                detail="❌ Image lacks detail. Please upload a clear blood cell microscopy image."
+            )
+        
+        # 5. Check color distribution (blood cells have specific colors)
+        # Blood cell images typically have pinkish/purple tones
+        r_mean = np.mean(img_array[:, :, 0])
+        g_mean = np.mean(img_array[:, :, 1])
+        b_mean = np.mean(img_array[:, :, 2])
+        
+        # Check if image has reasonable color distribution
+        color_std = np.std([r_mean, g_mean, b_mean])
+        if color_std < 5:
+            raise HTTPException(
+                status_code=400,
+                detail="❌ Image appears to be grayscale or lacks color variation. Blood cell images should have color."
+            )
+        
+        # 6. Check image complexity (edges, textures)
+        # Blood cells have specific texture patterns
+        gray = np.mean(img_array, axis=2)
+        edges = np.abs(np.diff(gray, axis=0)).sum() + np.abs(np.diff(gray, axis=1)).sum()
+        edge_density = edges / (width * height)
+        
+        if edge_density < 5:
+            raise HTTPException(
+                status_code=400,
+                detail="❌ Image too simple. This doesn't appear to be a microscopy image."
+            )
+        
+        return {
+            "mean_intensity": float(mean_intensity),
+            "variance": float(variance),
+            "edge_density": float(edge_density)
+        }
+    
     def _check_with_model(self, image: Image.Image) -> float:
         """
         Use the trained model to check if image is similar to training data
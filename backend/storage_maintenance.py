@@ -0,0 +1,266 @@
+"""
+Background maintenance for stored uploads
+Recompresses aged PNG objects losslessly and moves cold objects into
+immutable zip archives that image_storage.read_image serves transparently.
+Every worker runs the thread, but only the holder of the
+"storage-maintenance" lease does the work; file names are still unique per
+attempt, so a file is only ever deleted by the attempt that created it.
+"""
+import io
+import os
+import socket
+import threading
+import time
+import uuid
+import zipfile
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional
+from PIL import Image
+import models as db_models
+import image_storage
+from activity_partitions import acquire_lease, release_lease
+from config import settings
+from database import SessionLocal
+from logger import logger
+
+# Marker for objects that have already been through recompression
+RECOMPRESSED_MARKER = ".z."
+
+
+class StorageMaintenance:
+    """Periodic, throttled recompression and archival of stored images"""
+
+    LEASE = "storage-maintenance"
+
+    def __init__(
+        self,
+        interval_minutes: int = 60,
+        recompress_after_days: int = 7,
+        recompress_format: str = "png",
+        archive_after_days: int = 0,
+        batch_size: int = 100,
+        duty_cycle: float = 0.1
+    ):
+        self.interval = interval_minutes * 60
+        self.recompress_after = timedelta(days=recompress_after_days)
+        self.recompress_format = recompress_format.lower()
+        self.archive_after = timedelta(days=archive_after_days) if archive_after_days > 0 else None
+        self.batch_size = batch_size
+        self.duty_cycle = duty_cycle
+        self.holder = f"{socket.gethostname()}:{os.getpid()}"
+        self.leader = False
+        self._is_busy: Optional[Callable[[], bool]] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, is_busy: Optional[Callable[[], bool]] = None):
+        """Start the maintenance thread; work pauses while `is_busy()` is true"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._is_busy = is_busy
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="storage-maintenance", daemon=True)
+        self._thread.start()
+        logger.info("✅ Storage maintenance started")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=10)
+            self._thread = None
+        if self.leader:
+            try:
+                release_lease(self.LEASE, self.holder)
+            except Exception as e:
+                logger.warning(f"⚠️ Storage maintenance lease not released: {e}")
+            self.leader = False
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Storage maintenance error: {e}", exc_info=True)
+
+    def _throttle(self, work_seconds: float):
+        """
+        Sleep long enough that maintenance uses at most `duty_cycle` of a core,
+        and back off entirely while inference has work queued
+        """
+        time.sleep(work_seconds * (1 / self.duty_cycle - 1))
+        while self._is_busy and self._is_busy() and not self._stop.is_set():
+            time.sleep(0.5)
+
+    def run_once(self) -> dict:
+        """Run one recompression pass and one archive pass, if this worker holds the lease"""
+        self.leader = acquire_lease(self.LEASE, self.holder, self.interval * 1.5)
+        if not self.leader:
+            return {"leader": False, "recompressed": 0, "bytes_saved": 0, "archived": 0}
+        db = SessionLocal()
+        try:
+            recompressed, bytes_saved = self._recompress_aged(db)
+            archived = self._archive_cold(db) if self.archive_after else 0
+        finally:
+            db.close()
+
+        if recompressed or archived:
+            logger.info(f"Storage maintenance: {recompressed} recompressed "
+                        f"({bytes_saved} bytes saved), {archived} archived")
+        return {"leader": True, "recompressed": recompressed, "bytes_saved": bytes_saved, "archived": archived}
+
+    def _repoint(self, db, stored: db_models.StoredImage, old_path: str, new_path: str, **values) -> bool:
+        """
+        Move the object row and every prediction reference in the current transaction
+        The row only moves if it still points at old_path; False means it was
+        changed concurrently and the caller must keep both files.
+        """
+        S = db_models.StoredImage
+        matched = db.query(S).filter(S.digest == stored.digest, S.path == old_path).update(
+            {S.path: new_path, **{getattr(S, k): v for k, v in values.items()}},
+            synchronize_session=False
+        )
+        if not matched:
+            return False
+        db.query(db_models.Prediction).filter(
+            db_models.Prediction.image_path == old_path
+        ).update({db_models.Prediction.image_path: new_path}, synchronize_session=False)
+        return True
+
+    # ============= RECOMPRESSION =============
+
+    def _recompress_aged(self, db):
+        cutoff = datetime.utcnow() - self.recompress_after
+        candidates = db.query(db_models.StoredImage).filter(
+            db_models.StoredImage.created_at < cutoff,
+            db_models.StoredImage.format == "PNG",
+            db_models.StoredImage.incompressible.isnot(True),
+            ~db_models.StoredImage.path.like(f"{image_storage.ARCHIVE_PREFIX}%"),
+            ~db_models.StoredImage.path.like(f"%{RECOMPRESSED_MARKER}%")
+        ).limit(self.batch_size).all()
+
+        recompressed = 0
+        bytes_saved = 0
+        for stored in candidates:
+            if self._stop.is_set():
+                break
+            started = time.monotonic()
+            old_path = stored.path
+            new_path = None
+            try:
+                with open(old_path, "rb") as f:
+                    original = f.read()
+                encoded = self._encode_lossless(original)
+                if encoded is None:
+                    # Not smaller: leave the object (and its ETag) alone for good
+                    stored.incompressible = True
+                    db.commit()
+                    self._throttle(time.monotonic() - started)
+                    continue
+                data, ext = encoded
+
+                # Unique per attempt: a losing attempt then only removes its own file
+                new_path = f"{old_path.rsplit('.', 1)[0]}{RECOMPRESSED_MARKER}{uuid.uuid4().hex[:12]}.{ext}"
+                image_storage.atomic_write(new_path, data)
+                values = {"size_bytes": len(data)}
+                if ext == "webp":
+                    values["format"] = "WEBP"
+                if not self._repoint(db, stored, old_path, new_path, **values):
+                    db.rollback()
+                    os.remove(new_path)
+                    logger.warning(f"Stored object moved during recompression, skipping: {old_path}")
+                    self._throttle(time.monotonic() - started)
+                    continue
+                db.commit()
+
+                # Only the transaction that moved the row may delete the old file
+                os.remove(old_path)
+                recompressed += 1
+                bytes_saved += len(original) - len(data)
+            except FileNotFoundError:
+                db.rollback()
+                logger.warning(f"Stored object missing, skipping recompression: {old_path}")
+            except Exception as e:
+                db.rollback()
+                if new_path and os.path.exists(new_path):
+                    os.remove(new_path)
+                logger.error(f"Recompression failed for {old_path}: {e}")
+            self._throttle(time.monotonic() - started)
+
+        return recompressed, bytes_saved
+
+    def _encode_lossless(self, original: bytes):
+        """Re-encode losslessly; (data, ext), or None if that is not smaller"""
+        image = Image.open(io.BytesIO(original))
+        buffer = io.BytesIO()
+        if self.recompress_format == "webp":
+            image.save(buffer, format="WEBP", lossless=True, quality=100, method=6)
+            ext = "webp"
+        else:
+            image.save(buffer, format="PNG", optimize=True)
+            ext = "png"
+
+        data = buffer.getvalue()
+        if len(data) >= len(original):
+            return None
+        return data, ext
+
+    # ============= ARCHIVE TIER =============
+
+    def _archive_cold(self, db) -> int:
+        cutoff = datetime.utcnow() - self.archive_after
+        candidates: List[db_models.StoredImage] = db.query(db_models.StoredImage).filter(
+            db_models.StoredImage.created_at < cutoff,
+            ~db_models.StoredImage.path.like(f"{image_storage.ARCHIVE_PREFIX}%")
+        ).limit(self.batch_size).all()
+        if not candidates:
+            return 0
+
+        # Each run writes a new archive and renames it into place, so existing
+        # archives are never modified while they are being read
+        os.makedirs(image_storage.ARCHIVE_DIR, exist_ok=True)
+        # Unique per run, so a failed run only ever removes its own archive
+        archive_file = f"{image_storage.ARCHIVE_DIR}/{datetime.utcnow():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:12]}.zip"
+        tmp_file = f"{archive_file}.{os.getpid()}.tmp"
+
+        archived = []
+        with zipfile.ZipFile(tmp_file, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+            for stored in candidates:
+                if self._stop.is_set():
+                    break
+                started = time.monotonic()
+                if os.path.exists(stored.path):
+                    member = os.path.basename(stored.path)
+                    zf.write(stored.path, arcname=member)
+                    archived.append((stored, stored.path, member))
+                self._throttle(time.monotonic() - started)
+
+        if not archived:
+            os.remove(tmp_file)
+            return 0
+
+        os.replace(tmp_file, archive_file)
+        moved = []
+        try:
+            for stored, old_path, member in archived:
+                if self._repoint(db, stored, old_path, image_storage.archive_member_path(archive_file, member)):
+                    moved.append(old_path)
+            db.commit()
+        except Exception:
+            db.rollback()
+            os.remove(archive_file)
+            raise
+
+        # Objects repointed elsewhere meanwhile keep their file (their archive copy is unused)
+        for old_path in moved:
+            os.remove(old_path)
+        return len(moved)
+
+
+storage_maintenance = StorageMaintenance(
+    interval_minutes=settings.STORAGE_MAINTENANCE_INTERVAL_MINUTES,
+    recompress_after_days=settings.STORAGE_RECOMPRESS_AFTER_DAYS,
+    recompress_format=settings.STORAGE_RECOMPRESS_FORMAT,
+    archive_after_days=settings.STORAGE_ARCHIVE_AFTER_DAYS,
+    batch_size=settings.STORAGE_MAINTENANCE_BATCH_SIZE,
+    duty_cycle=settings.STORAGE_MAINTENANCE_DUTY_CYCLE
+)
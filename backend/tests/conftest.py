@@ -0,0 +1,35 @@
+"""
+Test configuration
+Points the app at a throwaway SQLite database before any backend module
+creates the engine, and migrates it once per session.
+
+Usage (from backend/): python -m pytest tests
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+_tmp = tempfile.mkdtemp(prefix="paradetect-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp}/test.db"
+os.environ.setdefault("UPLOAD_DIR", f"{_tmp}/uploads")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session", autouse=True)
+def database():
+    import migrations
+    migrations.run_migrations()
+    from database import engine
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(database):
+    from database import SessionLocal
+    session = SessionLocal()
+    yield session
+    session.close()
@@ -0,0 +1,81 @@
+import pytest
+from sqlalchemy import inspect, insert
+import activity_partitions
+import user_activity
+from activity_partitions import PartitionMaintenance, maintenance_leases
+from database import engine
+
+
+@pytest.fixture
+def maintenance(tmp_path):
+    workers = []
+
+    def worker(holder):
+        m = PartitionMaintenance(interval_hours=24, archive_dir=str(tmp_path))
+        m.holder = holder
+        workers.append(m)
+        return m
+
+    yield worker
+    for m in workers:
+        m.stop()
+    with engine.begin() as conn:
+        conn.execute(maintenance_leases.delete())
+
+
+def _aged_partition(partitioned, day="2020-01-15"):
+    table = partitioned.table_for(f"{day}T08:00:00")
+    with engine.begin() as conn:
+        conn.execute(insert(table).values(user_activity._failed_login_row("old@example.com", "10.0.0.1")
+                                          | {partitioned.time_column: f"{day}T08:00:00"}))
+    return table
+
+
+def test_only_the_lease_holder_archives(maintenance):
+    first, second = maintenance("worker-a"), maintenance("worker-b")
+    table = _aged_partition(user_activity.failed_logins)
+
+    assert second.run_once()["leader"] is True
+    result = first.run_once()
+    assert result["leader"] is False
+    assert result["archived"] == 0
+    assert table.name not in inspect(engine).get_table_names()
+
+    # A stopping holder hands over at the next run instead of after expiry
+    second.stop()
+    assert first.run_once()["leader"] is True
+
+
+def test_month_dropped_by_another_worker_is_forgotten(maintenance):
+    worker = maintenance("worker-c")
+    partitioned = user_activity.failed_logins
+    table = _aged_partition(partitioned, "2020-02-15")
+    # Another worker archived it; this one's partition list is stale
+    table.drop(engine)
+    assert "202002" in partitioned._tables
+
+    result = worker.run_once()
+    assert result["leader"] is True
+    assert result["failed"] == 0
+    assert "202002" not in partitioned._tables
+
+    # Even when asked directly with the stale table object
+    partitioned._tables["202002"] = table
+    assert partitioned.archive("202002", table, None) == 0
+    assert "202002" not in partitioned._tables
+
+
+def test_failing_table_does_not_stop_the_others(maintenance, monkeypatch):
+    worker = maintenance("worker-d")
+    broken = user_activity.login_history
+    healthy = user_activity.failed_logins
+    table = _aged_partition(healthy, "2020-03-15")
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("disk full")
+    monkeypatch.setattr(broken, "refresh", fail)
+    assert activity_partitions.PARTITIONED.index(broken) < activity_partitions.PARTITIONED.index(healthy)
+
+    result = worker.run_once()
+    assert result["failed"] == 1
+    assert table.name not in inspect(engine).get_table_names()
@@ -0,0 +1,45 @@
+from sqlalchemy import func, select
+import user_activity
+from activity_writer import ActivityWriter
+from database import engine
+
+
+def _count(table, **filters):
+    with engine.connect() as conn:
+        query = select(func.count()).select_from(table)
+        for column, value in filters.items():
+            query = query.where(table.c[column] == value)
+        return conn.execute(query).scalar()
+
+
+def _enqueue(writer, table, row):
+    writer.enqueue(user_activity._route(table, row), row)
+
+
+def test_duplicate_session_token_loses_only_the_duplicate():
+    writer = ActivityWriter(flush_interval_ms=1000, batch_size=100)
+    # Same-second logins by one user produce the same JWT
+    for _ in range(2):
+        _enqueue(writer, user_activity.user_sessions,
+                 user_activity._session_row(1, "dup@example.com", "dup-token"))
+        _enqueue(writer, user_activity.user_login_history,
+                 user_activity._login_row(1, "dup@example.com"))
+    # Unrelated events queued in the same batch
+    _enqueue(writer, user_activity.user_sessions,
+             user_activity._session_row(2, "other@example.com", "other-token"))
+    _enqueue(writer, user_activity.user_login_history, user_activity._login_row(2, "other@example.com"))
+    _enqueue(writer, user_activity.failed_login_attempts,
+             user_activity._failed_login_row("other@example.com", "10.0.0.1"))
+
+    writer.start()
+    writer.flush()
+    writer.stop()
+
+    assert writer.written == 6
+    assert writer.failed == 1
+    assert _count(user_activity.user_sessions, session_token="dup-token") == 1
+    assert _count(user_activity.user_sessions, session_token="other-token") == 1
+    logins = user_activity.login_history.current()
+    assert _count(logins, email="dup@example.com") == 2
+    assert _count(logins, email="other@example.com") == 1
+    assert _count(user_activity.failed_logins.current(), email="other@example.com") == 1
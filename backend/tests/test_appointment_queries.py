@@ -0,0 +1,57 @@
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import pytest
+from fastapi import Response
+from sqlalchemy import event
+import models as db_models
+from appointment_queries import appointment_details_query, to_details
+from pagination import paginate
+
+A = db_models.Appointment
+
+
+@contextmanager
+def count_statements(db):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engine = db.get_bind()
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+
+@pytest.fixture
+def appointments(db):
+    patient = db_models.User(email="apt-patient@example.com", hashed_password="x", full_name="Pat", role="patient")
+    doctor = db_models.User(email="apt-doctor@example.com", hashed_password="x", full_name="Doc", role="doctor")
+    db.add_all([patient, doctor])
+    db.flush()
+    start = datetime(2024, 1, 1)
+    db.add_all([
+        A(patient_id=patient.id, doctor_id=doctor.id, appointment_date=start + timedelta(hours=n), reason="Checkup")
+        for n in range(25)
+    ])
+    db.commit()
+    yield patient, doctor
+    db.query(A).filter(A.patient_id == patient.id).delete()
+    db.delete(patient)
+    db.delete(doctor)
+    db.commit()
+
+
+@pytest.mark.parametrize("limit", [None, 10])
+def test_listing_takes_one_query(db, appointments, limit):
+    patient, doctor = appointments
+    query = appointment_details_query(db).filter(A.patient_id == patient.id)
+
+    with count_statements(db) as statements:
+        rows = [to_details(row) for row in paginate(query, A.appointment_date, A.id, Response(), limit=limit)]
+
+    assert len(statements) == 1, statements
+    assert len(rows) == (limit or 25)
+    assert {(r["patient_name"], r["doctor_name"], r["doctor_email"]) for r in rows} == {("Pat", "Doc", doctor.email)}
@@ -0,0 +1,56 @@
+import threading
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool, StaticPool
+from config import settings
+from database import Base, create_db_engine
+
+
+def test_memory_database_shares_one_connection_across_sessions():
+    engine = create_db_engine("sqlite:///:memory:")
+    try:
+        assert isinstance(engine.pool, StaticPool)
+        Base.metadata.create_all(bind=engine)
+        Session = sessionmaker(bind=engine)
+
+        writer = Session()
+        writer.execute(text("INSERT INTO users (email, hashed_password) VALUES ('mem@example.com', 'x')"))
+        writer.commit()
+        writer.close()
+
+        seen = []
+
+        def read():
+            reader = Session()
+            try:
+                seen.append(reader.execute(text("SELECT email FROM users")).scalars().all())
+            finally:
+                reader.close()
+
+        # Another session, from another thread, sees the same schema and rows
+        thread = threading.Thread(target=read)
+        thread.start()
+        thread.join()
+        assert seen == [["mem@example.com"]]
+    finally:
+        engine.dispose()
+
+
+def test_file_database_pragmas_on_every_pooled_connection(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path}/pragmas.db")
+    try:
+        assert isinstance(engine.pool, QueuePool)
+        # Hold several connections at once so the pool opens distinct ones
+        connections = [engine.connect() for _ in range(3)]
+        try:
+            assert len({id(conn.connection.dbapi_connection) for conn in connections}) == 3
+            for conn in connections:
+                assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+                assert conn.exec_driver_sql("PRAGMA busy_timeout").scalar() == settings.SQLITE_BUSY_TIMEOUT_MS
+                assert conn.exec_driver_sql("PRAGMA synchronous").scalar() == 1  # NORMAL
+                assert conn.exec_driver_sql("PRAGMA temp_store").scalar() == 2  # MEMORY
+        finally:
+            for conn in connections:
+                conn.close()
+    finally:
+        engine.dispose()
@@ -0,0 +1,41 @@
+from starlette.requests import Request
+from login_guard import LoginGuard, client_ip, parse_networks
+
+PROXY = parse_networks("10.0.0.0/8, ::1")
+
+
+def _request(peer, forwarded=None):
+    headers = [(b"x-forwarded-for", value.encode()) for value in (forwarded or [])]
+    return Request({"type": "http", "client": (peer, 12345), "headers": headers})
+
+
+def test_forwarded_for_ignored_from_untrusted_peer():
+    assert client_ip(_request("203.0.113.9", ["198.51.100.1"]), PROXY) == "203.0.113.9"
+    assert client_ip(_request("10.0.0.2", ["198.51.100.1"]), []) == "10.0.0.2"
+
+
+def test_client_is_first_untrusted_hop_from_the_right():
+    assert client_ip(_request("10.0.0.2", ["198.51.100.1"]), PROXY) == "198.51.100.1"
+    # Client-supplied entries left of the real client are ignored
+    assert client_ip(_request("10.0.0.2", ["1.2.3.4, 198.51.100.1, 10.0.0.7"]), PROXY) == "198.51.100.1"
+    assert client_ip(_request("10.0.0.2", ["1.2.3.4", "198.51.100.1"]), PROXY) == "198.51.100.1"
+    assert client_ip(_request("10.0.0.2"), PROXY) == "10.0.0.2"
+
+
+def test_clients_behind_one_proxy_are_locked_out_separately():
+    guard = LoginGuard(max_per_email=100, max_per_ip=3, window_seconds=900)
+    attacker = client_ip(_request("10.0.0.2", ["198.51.100.1"]), PROXY)
+    for i in range(3):
+        guard.record_failure(f"victim{i}@example.com", attacker)
+
+    assert guard.check("new@example.com", attacker) > 0
+    bystander = client_ip(_request("10.0.0.2", ["198.51.100.2"]), PROXY)
+    assert guard.check("new@example.com", bystander) == 0
+
+
+def test_per_ip_limit_can_be_disabled():
+    guard = LoginGuard(max_per_email=100, max_per_ip=0, window_seconds=900)
+    for i in range(50):
+        guard.record_failure(f"user{i}@example.com", "10.0.0.2")
+    assert guard.check("new@example.com", "10.0.0.2") == 0
+    assert guard.stats()["tracked_ips"] == 0
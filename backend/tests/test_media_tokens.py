@@ -0,0 +1,30 @@
+import pytest
+from fastapi import HTTPException
+import auth
+import models as db_models
+
+
+@pytest.fixture
+def user(db):
+    user = db_models.User(email="streamer@example.com", hashed_password="x", role="doctor")
+    db.add(user)
+    db.commit()
+    yield user
+    db.delete(user)
+    db.commit()
+
+
+def test_stream_token_authenticates_the_classify_socket(db, user):
+    token = auth.create_media_token(user.email, "stream")
+    assert auth.get_media_token_user(token, "stream", db).email == user.email
+
+
+@pytest.mark.parametrize("make_token", [
+    lambda email: auth.create_access_token({"sub": email}),
+    lambda email: auth.create_media_token(email, "images"),
+    lambda email: "not-a-jwt",
+])
+def test_session_jwt_and_other_scopes_are_refused(db, user, make_token):
+    with pytest.raises(HTTPException) as refused:
+        auth.get_media_token_user(make_token(user.email), "stream", db)
+    assert refused.value.status_code == 401
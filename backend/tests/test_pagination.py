@@ -0,0 +1,56 @@
+from datetime import datetime, timedelta
+from fastapi import Response
+import models as db_models
+from pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor, paginate
+
+
+def _seed(db, prefix, dates):
+    users = [
+        db_models.User(email=f"{prefix}{i}@example.com", hashed_password="x", role=prefix, created_at=created_at)
+        for i, created_at in enumerate(dates)
+    ]
+    db.add_all(users)
+    db.commit()
+    # created_at has a Python-side default, so NULLs are written explicitly
+    for user, created_at in zip(users, dates):
+        if created_at is None:
+            db.query(db_models.User).filter(db_models.User.id == user.id).update({"created_at": None})
+    db.commit()
+    return db.query(db_models.User).filter(db_models.User.role == prefix)
+
+
+def _pages(query, limit):
+    ids, cursor = [], None
+    while True:
+        response = Response()
+        rows = paginate(query, db_models.User.created_at, db_models.User.id, response, cursor, limit)
+        ids += [row.id for row in rows]
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if cursor is None:
+            return ids
+
+
+def test_cursor_round_trips_null_sort_value():
+    assert decode_cursor(encode_cursor(None, 7)) == (None, 7)
+    stamp = datetime(2026, 10, 19, 8, 30)
+    assert decode_cursor(encode_cursor(stamp, 7)) == (stamp, 7)
+
+
+def test_pages_cover_rows_with_null_sort_values(db):
+    base = datetime(2026, 1, 1)
+    dates = [base, None, base + timedelta(days=1), base, None, base + timedelta(days=2), None]
+    query = _seed(db, "pagenull", dates)
+    expected = [u.id for u in paginate(query, db_models.User.created_at, db_models.User.id, Response())]
+
+    assert len(expected) == len(dates)
+    assert [u.created_at for u in query.filter(db_models.User.id.in_(expected[-3:]))] == [None] * 3
+    for limit in (1, 2, 3, 4, 7, 10):
+        assert _pages(query, limit) == expected
+
+
+def test_unpaged_without_cursor_or_limit(db):
+    query = _seed(db, "pageall", [datetime(2026, 1, 1) + timedelta(minutes=i) for i in range(5)])
+    response = Response()
+    rows = paginate(query, db_models.User.created_at, db_models.User.id, response)
+    assert len(rows) == 5
+    assert NEXT_CURSOR_HEADER not in response.headers
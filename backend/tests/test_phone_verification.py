@@ -0,0 +1,79 @@
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import select, update
+from database import engine
+from phone_verification import OtpLocked, OtpStore, verifications
+
+
+def _store():
+    return OtpStore(ttl_seconds=300, max_attempts=3, attempt_window_seconds=3600)
+
+
+def _wrong(otp):
+    return "000000" if otp != "000000" else "111111"
+
+
+def test_attempts_are_counted_per_phone_across_resends():
+    store = _store()
+    phone = "+15550000001"
+    first = store.issue(phone)
+    assert store.verify(phone, _wrong(first.otp)) == "Invalid or expired OTP"
+    assert store.verify(phone, _wrong(first.otp)) == "Invalid or expired OTP"
+
+    second = store.issue(phone)
+    assert second.attempts == 2
+    assert store.verify(phone, _wrong(second.otp)).startswith("Too many attempts")
+    # The last code is dead and no new one is issued within the window
+    assert store.verify(phone, second.otp) == "Invalid or expired OTP"
+    with pytest.raises(OtpLocked) as locked:
+        store.issue(phone)
+    assert 0 < locked.value.retry_after <= 3600
+
+    # Purge keeps the locked row, so the lockout outlives the code's expiry
+    with engine.begin() as conn:
+        conn.execute(update(verifications).where(verifications.c.phone == phone)
+                     .values(expires_at=datetime.utcnow() - timedelta(seconds=1)))
+    store.purge()
+    with pytest.raises(OtpLocked):
+        store.issue(phone)
+
+
+def test_attempts_reset_when_the_window_ends():
+    store = _store()
+    phone = "+15550000002"
+    entry = store.issue(phone)
+    for _ in range(3):
+        store.verify(phone, _wrong(entry.otp))
+    with engine.begin() as conn:
+        conn.execute(update(verifications).where(verifications.c.phone == phone)
+                     .values(window_started_at=datetime.utcnow() - timedelta(hours=2)))
+
+    fresh = store.issue(phone)
+    assert fresh.attempts == 0
+    assert store.verify(phone, fresh.otp) is None
+
+
+def test_wrong_code_costs_no_reload(monkeypatch):
+    store = _store()
+    phone = "+15550000003"
+    entry = store.issue(phone)
+    loads = []
+    original = store._load
+    monkeypatch.setattr(store, "_load", lambda p: loads.append(p) or original(p))
+
+    store.verify(phone, _wrong(entry.otp))
+    store.verify(phone, _wrong(entry.otp))
+    assert loads == []
+    with engine.connect() as conn:
+        assert conn.execute(select(verifications.c.attempts).where(verifications.c.id == entry.id)).scalar() == 2
+
+
+def test_stale_copy_accepts_code_resent_by_another_worker():
+    worker_a, worker_b = _store(), _store()
+    phone = "+15550000004"
+    first = worker_a.issue(phone)
+    assert worker_b.verify(phone, _wrong(first.otp)) == "Invalid or expired OTP"
+
+    resent = worker_a.issue(phone)
+    assert resent.attempts == 1
+    assert worker_b.verify(phone, resent.otp) is None
@@ -0,0 +1,8 @@
+import migrations
+
+
+def test_hot_queries_use_their_indexes(database):
+    results = migrations.check_query_plans(database)
+    assert len(results) == len(migrations.hot_queries())
+    regressions = [f"{r['query']}: expected {r['index']}, plan {r['plan']}" for r in results if not r["uses_index"]]
+    assert not regressions, "\n".join(regressions)
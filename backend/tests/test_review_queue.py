@@ -0,0 +1,39 @@
+from datetime import datetime, timedelta
+import pytest
+import models as db_models
+import review_queue
+from database import SessionLocal
+
+
+@pytest.fixture
+def doctor_and_cases(db):
+    owner = db_models.User(email="rq-owner@example.com", hashed_password="x", role="patient")
+    doctor = db_models.User(email="rq-doctor@example.com", hashed_password="x", role="doctor")
+    db.add_all([owner, doctor])
+    db.flush()
+    cases = [
+        db_models.Prediction(
+            user_id=owner.id, image_path=f"rq-{n}.png", prediction=label, confidence=0.9,
+            status=review_queue.PENDING, created_at=datetime.utcnow() - timedelta(hours=1)
+        )
+        for n, label in enumerate(["Parasitized", "Uninfected"])
+    ]
+    db.add_all(cases)
+    db.commit()
+    return doctor.id, [case.id for case in cases]
+
+
+def test_first_reviews_in_separate_sessions_share_one_stats_row(db, doctor_and_cases):
+    doctor_id, case_ids = doctor_and_cases
+    # Each review in its own session, as two concurrent requests would be
+    for case_id, diagnosis in zip(case_ids, ["confirmed", "rejected"]):
+        session = SessionLocal()
+        try:
+            assert review_queue.review_case(session, case_id, doctor_id, "reviewed", diagnosis=diagnosis)
+        finally:
+            session.close()
+
+    stats = db.get(db_models.DoctorReviewStats, doctor_id)
+    assert (stats.reviewed_count, stats.confirmed_count, stats.parasitized_count) == (2, 1, 1)
+    assert stats.total_response_seconds >= 2 * 3600 - 5
+    assert review_queue.doctor_stats(db, doctor_id)["reviewed_cases"] == 2
@@ -0,0 +1,79 @@
+import hashlib
+import io
+import os
+import pytest
+from PIL import Image
+import image_storage
+import models as db_models
+from activity_partitions import maintenance_leases
+from database import SessionLocal, engine
+from storage_maintenance import StorageMaintenance
+
+
+def _maintenance(holder, **options):
+    m = StorageMaintenance(recompress_after_days=0, duty_cycle=1.0, **options)
+    m.holder = holder
+    return m
+
+
+@pytest.fixture(autouse=True)
+def clean_leases():
+    yield
+    with engine.begin() as conn:
+        conn.execute(maintenance_leases.delete())
+
+
+def _store_png(db, seed):
+    # Uncompressed PNG of a flat image, so optimize=True always shrinks it
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 64), (seed, 0, 0)).save(buffer, format="PNG", compress_level=0)
+    data = buffer.getvalue()
+    digest = hashlib.sha256(data).hexdigest()
+    path, _ = image_storage.register_image(db, digest, data, "PNG")
+    return digest, path
+
+
+def test_only_the_lease_holder_runs():
+    first, second = _maintenance("storage-a"), _maintenance("storage-b")
+    assert first.run_once()["leader"] is True
+    assert second.run_once() == {"leader": False, "recompressed": 0, "bytes_saved": 0, "archived": 0}
+    first.stop()
+    assert second.run_once()["leader"] is True
+
+
+def test_losing_recompression_keeps_the_winners_file(db):
+    digest, original_path = _store_png(db, 1)
+    winner, loser = _maintenance("storage-c"), _maintenance("storage-d")
+    real_repoint = loser._repoint
+
+    def race(session, stored, old_path, new_path, **values):
+        # The winner commits its own recompression of the same object first
+        other = SessionLocal()
+        try:
+            winner._recompress_aged(other)
+        finally:
+            other.close()
+        return real_repoint(session, stored, old_path, new_path, **values)
+
+    loser._repoint = race
+    assert loser._recompress_aged(db) == (0, 0)
+
+    db.expire_all()
+    stored = db.get(db_models.StoredImage, digest)
+    assert stored.path != original_path
+    assert os.path.exists(stored.path)
+    assert image_storage.read_image(stored.path) == image_storage.read_image(stored.path, db)
+    siblings = [name for name in os.listdir(os.path.dirname(stored.path)) if name.startswith(digest)]
+    assert siblings == [os.path.basename(stored.path)]
+
+
+def test_archive_names_are_unique_per_run(db):
+    _store_png(db, 2)
+    first = _maintenance("storage-e", archive_after_days=1)
+    first.archive_after = first.recompress_after  # Everything counts as cold
+    assert first._archive_cold(db) >= 1
+    _store_png(db, 3)
+    assert first._archive_cold(db) == 1
+
+    archives = [name for name in os.listdir(image_storage.ARCHIVE_DIR) if name.endswith(".zip")]
+    assert len(archives) == len(set(archives)) >= 2
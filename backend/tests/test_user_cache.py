@@ -0,0 +1,65 @@
+import pytest
+from fastapi import HTTPException
+import auth
+import models as db_models
+from user_cache import UserCache, user_cache
+
+
+@pytest.fixture
+def user(db):
+    user = db_models.User(email="cached@example.com", hashed_password="x", full_name="Before", role="patient")
+    db.add(user)
+    db.commit()
+    yield user
+    db.delete(user)
+    db.commit()
+
+
+def test_update_evicts_in_this_worker(db, user):
+    user_cache.put(user.email, user)
+    assert user_cache.get(user.email).full_name == "Before"
+
+    user.full_name = "After"
+    db.commit()
+
+    assert user_cache.get(user.email) is None
+    assert auth._active_user(user.email, db).full_name == "After"
+
+
+def test_deactivation_evicts_in_this_worker(db, user):
+    assert auth._active_user(user.email, db).is_active
+
+    user.is_active = False
+    db.commit()
+
+    with pytest.raises(HTTPException) as refused:
+        auth._active_user(user.email, db)
+    assert refused.value.status_code == 403
+
+
+def test_deactivation_reaches_other_workers(db, user):
+    # Another worker: its own cache, sharing only the database
+    other = UserCache(ttl_seconds=3600, sync_interval_seconds=3600)
+    other.sync(force=True)
+    other.put(user.email, user)
+
+    user.is_active = False
+    db.commit()
+    assert other.get(user.email).is_active  # Still within its sync interval
+
+    other.sync(force=True)
+    assert other.get(user.email) is None
+    assert other.stats()["remote_invalidations"] == 1
+
+
+def test_rolled_back_update_is_not_broadcast(db, user):
+    other = UserCache(ttl_seconds=3600, sync_interval_seconds=3600)
+    other.sync(force=True)
+    other.put(user.email, user)
+
+    user.full_name = "Discarded"
+    db.flush()
+    db.rollback()
+
+    other.sync(force=True)
+    assert other.get(user.email) is not None
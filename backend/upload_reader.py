@@ -0,0 +1,191 @@
+"""
+Size-capped upload handling
+Reads uploads in chunks, hashing as it goes, and rejects oversized or
+unrecognized images as early as possible
+"""
+import hashlib
+import struct
+from typing import NamedTuple, Optional, Tuple
+from fastapi import HTTPException, UploadFile
+from logger import logger
+
+CHUNK_SIZE = 64 * 1024
+
+# Same bounds as SmartImageValidator, checked here from the header alone
+MIN_DIMENSION = 50
+MAX_DIMENSION = 5000
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# JPEG start-of-frame markers carrying dimensions (excludes DHT, JPG and DAC)
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+class UploadedImage(NamedTuple):
+    data: bytes
+    sha256: str
+    format: str
+    width: Optional[int]
+    height: Optional[int]
+
+
+def sniff_image_header(chunk: bytes) -> Tuple[Optional[str], Optional[int], Optional[int]]:
+    """
+    Detect format and dimensions from the first bytes of a file
+    Returns (format, width, height); dimensions are None when not in the chunk
+    """
+    if chunk.startswith(PNG_SIGNATURE):
+        # IHDR is always the first chunk: length(4) type(4) width(4) height(4)
+        if len(chunk) >= 24 and chunk[12:16] == b"IHDR":
+            width, height = struct.unpack(">II", chunk[16:24])
+            return "PNG", width, height
+        return "PNG", None, None
+
+    if chunk.startswith(b"\xff\xd8"):
+        pos = 2
+        while pos + 4 <= len(chunk):
+            if chunk[pos] != 0xFF:
+                break
+            marker = chunk[pos + 1]
+            if marker == 0xFF:
+                pos += 1
+                continue
+            segment_length = struct.unpack(">H", chunk[pos + 2:pos + 4])[0]
+            if marker in JPEG_SOF_MARKERS:
+                if pos + 9 > len(chunk):
+                    break
+                height, width = struct.unpack(">HH", chunk[pos + 5:pos + 9])
+                return "JPEG", width, height
+            pos += 2 + segment_length
+        return "JPEG", None, None
+
+    return None, None, None
+
+
+def check_image_header(chunk: bytes, filename: str) -> Tuple[str, Optional[int], Optional[int]]:
+    """Reject uploads whose header is not a PNG/JPEG of acceptable size"""
+    image_format, width, height = sniff_image_header(chunk)
+
+    if image_format is None:
+        raise HTTPException(
+            status_code=400,
+            detail="❌ Invalid format. Only PNG and JPEG images are accepted."
+        )
+
+    if width is not None and height is not None:
+        if width < MIN_DIMENSION or height < MIN_DIMENSION:
+            raise HTTPException(
+                status_code=400,
+                detail=f"❌ Image too small (minimum {MIN_DIMENSION}x{MIN_DIMENSION} pixels)."
+            )
+        if width > MAX_DIMENSION or height > MAX_DIMENSION:
+            raise HTTPException(
+                status_code=400,
+                detail=f"❌ Image too large (maximum {MAX_DIMENSION}x{MAX_DIMENSION} pixels)."
+            )
+
+    logger.debug(f"Upload header: {filename} {image_format} {width}x{height}")
+    return image_format, width, height
+
+
+async def read_upload_capped(file: UploadFile, max_bytes: int, chunk_size: int = CHUNK_SIZE) -> UploadedImage:
+    """
+    Read an upload chunk by chunk, stopping as soon as max_bytes is exceeded
+    The SHA-256 digest is computed in the same pass and the header is
+    checked on the first chunk before anything else is read.
+    """
+    digest = hashlib.sha256()
+    chunks = []
+    total = 0
+    image_format = width = height = None
+
+    while True:
+        chunk = await file.read(chunk_size)
+        if not chunk:
+            break
+
+        if total == 0:
+            image_format, width, height = check_image_header(chunk, file.filename)
+
+        total += len(chunk)
+        if total > max_bytes:
+            raise HTTPException(
+                status_code=413,
+                detail=f"File too large. Maximum size: {max_bytes / 1024 / 1024}MB"
+            )
+
+        digest.update(chunk)
+        chunks.append(chunk)
+
+    if total == 0:
+        raise HTTPException(status_code=400, detail="Empty file")
+
+    return UploadedImage(b"".join(chunks), digest.hexdigest(), image_format, width, height)
+
+
+class BodySizeLimitMiddleware:
+    """
+    ASGI middleware that stops reading request bodies past a byte limit
+    Requests declaring a larger Content-Length are refused before any body
+    is read; chunked bodies are cut off as soon as they cross the limit.
+    """
+
+    def __init__(self, app, max_body_size: int):
+        self.app = app
+        self.max_body_size = max_body_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        for name, value in scope.get("headers", []):
+            if name == b"content-length":
+                try:
+                    declared = int(value)
+                except ValueError:
+                    declared = 0
+                if declared > self.max_body_size:
+                    await self._send_too_large(send)
+                    return
+                break
+
+        received = 0
+        response_started = False
+        rejected = False
+
+        async def limited_receive():
+            nonlocal received, rejected
+            if rejected:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_size:
+                    rejected = True
+                    if not response_started:
+                        await self._send_too_large(send)
+                    # Make the application stop as if the client had gone away
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def guarded_send(message):
+            nonlocal response_started
+            if rejected:
+                return
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        await self.app(scope, limited_receive, guarded_send)
+
+    async def _send_too_large(self, send):
+        body = b'{"detail":"Request body too large"}'
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode())
+            ]
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -1,126 +1,269 @@
 """
-User Activity Tracking with SQLite3
-Logs user login, signup, and activity events
+User Activity Tracking
+Logs user login, signup, and activity events through the shared database engine
+Login history, the activity log and failed logins are stored in monthly
+partitions (see activity_partitions)
 """
-import sqlite3
-from datetime import datetime
+import json
+from datetime import datetime, timedelta
 from typing import Optional, Dict, Any, List
 from contextlib import contextmanager
+from sqlalchemy import Table, Column, Integer, String, Text, Boolean, ForeignKey, Index, func, insert, select, text, true, union
+from activity_partitions import PartitionedTable
+from activity_writer import activity_writer
+from config import settings
+from database import Base, engine
 from logger import logger
 
-DATABASE_PATH = "paradetect.db"
+# Timestamps are stored as ISO-8601 strings and compared against ISO cutoffs
+# computed in Python, which sorts correctly on every supported database
+
+user_login_history = Table(
+    "user_login_history", Base.metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("user_id", Integer, ForeignKey("users.id"), nullable=False),
+    Column("email", String, nullable=False),
+    Column("login_time", String, nullable=False),
+    Column("ip_address", String),
+    Column("user_agent", String),
+    Column("device_type", String),
+    Column("browser", String),
+    Column("os", String),
+    Column("location", String),
+    Column("success", Boolean, server_default=true()),
+    Index("idx_login_user_id", "user_id"),
+    Index("idx_login_time", "login_time")
+)
+
+user_signup_history = Table(
+    "user_signup_history", Base.metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("user_id", Integer, ForeignKey("users.id"), nullable=False),
+    Column("email", String, nullable=False),
+    Column("full_name", String),
+    Column("signup_time", String, nullable=False),
+    Column("ip_address", String),
+    Column("user_agent", String),
+    Column("device_type", String),
+    Column("browser", String),
+    Column("os", String),
+    Column("location", String),
+    Column("referral_source", String)
+)
+
+user_activity_log = Table(
+    "user_activity_log", Base.metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("user_id", Integer, ForeignKey("users.id"), nullable=False),
+    Column("email", String, nullable=False),
+    Column("activity_type", String, nullable=False),
+    Column("activity_description", Text),
+    Column("timestamp", String, nullable=False),
+    Column("ip_address", String),
+    Column("metadata", Text),
+    Index("idx_activity_user_id", "user_id"),
+    Index("idx_activity_time", "timestamp")
+)
+
+failed_login_attempts = Table(
+    "failed_login_attempts", Base.metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("email", String, nullable=False),
+    Column("attempt_time", String, nullable=False),
+    Column("ip_address", String),
+    Column("user_agent", String),
+    Column("reason", String),
+    Index("idx_failed_email_time", "email", "attempt_time"),
+    Index("idx_failed_ip_time", "ip_address", "attempt_time"),
+    Index("idx_failed_time", "attempt_time")
+)
+
+user_sessions = Table(
+    "user_sessions", Base.metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("user_id", Integer, ForeignKey("users.id"), nullable=False),
+    Column("email", String, nullable=False),
+    Column("session_token", String, unique=True, nullable=False),
+    Column("login_time", String, nullable=False),
+    Column("last_activity", String, nullable=False),
+    Column("logout_time", String),
+    Column("ip_address", String),
+    Column("is_active", Boolean, server_default=true()),
+    Index("idx_session_user_id", "user_id"),
+    Index("idx_session_token", "session_token")
+)
+
+# Partial indexes over active sessions only; ended sessions (most rows) are
+# not indexed. Queries must compare is_active to a literal (== true()), not a
+# bound parameter, for SQLite to use them.
+_session_active = user_sessions.c.is_active == true()
+Index(
+    "idx_session_active_activity", user_sessions.c.last_activity,
+    sqlite_where=_session_active, postgresql_where=_session_active
+)
+Index(
+    "idx_session_active_user", user_sessions.c.user_id, user_sessions.c.last_activity,
+    sqlite_where=_session_active, postgresql_where=_session_active
+)
+
+ACTIVITY_TABLES = [
+    user_login_history,
+    user_signup_history,
+    user_activity_log,
+    failed_login_attempts,
+    user_sessions
+]
+
+# Append-only history is written to and read from month partitions; the
+# tables above only define their shape and are emptied by migration 8
+login_history = PartitionedTable(
+    user_login_history, "login_time",
+    {"idx_login_user_time": ("user_id", "login_time"), "idx_login_time": ("login_time",)},
+    retention_months=settings.LOGIN_HISTORY_RETENTION_MONTHS
+)
+activity_log = PartitionedTable(
+    user_activity_log, "timestamp",
+    {"idx_activity_user_time": ("user_id", "timestamp"), "idx_activity_time": ("timestamp",)},
+    retention_months=settings.ACTIVITY_LOG_RETENTION_MONTHS
+)
+failed_logins = PartitionedTable(
+    failed_login_attempts, "attempt_time",
+    {
+        "idx_failed_email_time": ("email", "attempt_time"),
+        "idx_failed_ip_time": ("ip_address", "attempt_time"),
+        "idx_failed_time": ("attempt_time",)
+    },
+    retention_months=settings.FAILED_LOGIN_RETENTION_MONTHS
+)
+
+_PARTITIONED = {p.template: p for p in (login_history, activity_log, failed_logins)}
 
 
 @contextmanager
-def get_connection():
-    """Context manager for SQLite connection"""
-    conn = sqlite3.connect(DATABASE_PATH)
-    conn.row_factory = sqlite3.Row
-    try:
+def get_connection(conn=None):
+    """
+    Transactional connection from the shared engine pool
+    Passing an open connection joins its transaction instead, so several
+    writes can share one commit (see record_login)
+    """
+    if conn is not None:
         yield conn
-        conn.commit()
+        return
+    try:
+        with engine.begin() as conn:
+            yield conn
     except Exception as e:
-        conn.rollback()
         logger.error(f"Database error: {e}")
         raise
-    finally:
-        conn.close()
+
+
+def _rows(result) -> List[Dict[str, Any]]:
+    return [dict(row) for row in result.mappings().all()]
+
+
+def _cutoff(days: int = 0, hours: int = 0) -> str:
+    return (datetime.utcnow() - timedelta(days=days, hours=hours)).isoformat()
+
+
+def _route(table: Table, row: Dict[str, Any]) -> Table:
+    """Month partition for a row of a partitioned table, else the table itself"""
+    partitioned = _PARTITIONED.get(table)
+    return partitioned.table_for(row[partitioned.time_column]) if partitioned else table
+
+
+def _newest(partitioned: PartitionedTable, where, limit: int) -> List[Dict[str, Any]]:
+    """Up to `limit` rows matching where(table), newest first, reading months until it fills"""
+    rows = []
+    with get_connection() as conn:
+        for table in partitioned.covering():
+            rows += _rows(conn.execute(
+                select(table)
+                .where(where(table))
+                .order_by(table.c[partitioned.time_column].desc())
+                .limit(limit - len(rows))
+            ))
+            if len(rows) >= limit:
+                break
+    return rows
 
 
 def init_activity_tables():
     """Create activity tracking tables if they don't exist"""
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        
-        # User login history table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS user_login_history (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                email VARCHAR NOT NULL,
-                login_time DATETIME NOT NULL,
-                ip_address VARCHAR,
-                user_agent VARCHAR,
-                device_type VARCHAR,
-                browser VARCHAR,
-                os VARCHAR,
-                location VARCHAR,
-                success BOOLEAN DEFAULT 1,
-                FOREIGN KEY (user_id) REFERENCES users(id)
-            )
-        """)
-        
-        # User signup history table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS user_signup_history (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                email VARCHAR NOT NULL,
-                full_name VARCHAR,
-                signup_time DATETIME NOT NULL,
-                ip_address VARCHAR,
-                user_agent VARCHAR,
-                device_type VARCHAR,
-                browser VARCHAR,
-                os VARCHAR,
-                location VARCHAR,
-                referral_source VARCHAR,
-                FOREIGN KEY (user_id) REFERENCES users(id)
-            )
-        """)
-        
-        # User activity log table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS user_activity_log (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                email VARCHAR NOT NULL,
-                activity_type VARCHAR NOT NULL,
-                activity_description TEXT,
-                timestamp DATETIME NOT NULL,
-                ip_address VARCHAR,
-                metadata TEXT,
-                FOREIGN KEY (user_id) REFERENCES users(id)
-            )
-        """)
-        
-        # Failed login attempts table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS failed_login_attempts (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                email VARCHAR NOT NULL,
-                attempt_time DATETIME NOT NULL,
-                ip_address VARCHAR,
-                user_agent VARCHAR,
-                reason VARCHAR
-            )
-        """)
-        
-        # User session table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS user_sessions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                email VARCHAR NOT NULL,
-                session_token VARCHAR UNIQUE NOT NULL,
-                login_time DATETIME NOT NULL,
-                last_activity DATETIME NOT NULL,
-                logout_time DATETIME,
-                ip_address VARCHAR,
-                is_active BOOLEAN DEFAULT 1,
-                FOREIGN KEY (user_id) REFERENCES users(id)
-            )
-        """)
-        
-        # Create indexes for better performance
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_login_user_id ON user_login_history(user_id)")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_login_time ON user_login_history(login_time)")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_activity_user_id ON user_activity_log(user_id)")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_activity_time ON user_activity_log(timestamp)")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_session_user_id ON user_sessions(user_id)")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_session_token ON user_sessions(session_token)")
-        
-        logger.info("✅ Activity tracking tables initialized")
+    Base.metadata.create_all(bind=engine, tables=ACTIVITY_TABLES)
+    logger.info("✅ Activity tracking tables initialized")
+
+
+# Row builders shared by the direct writes below and the write-behind queue;
+# every row for a table carries the same keys so batches can use executemany
+
+def _login_row(user_id, email, ip_address=None, user_agent=None, device_info=None) -> Dict[str, Any]:
+    device_info = device_info or {}
+    return {
+        "user_id": user_id,
+        "email": email,
+        "login_time": datetime.utcnow().isoformat(),
+        "ip_address": ip_address,
+        "user_agent": user_agent,
+        "device_type": device_info.get('device_type'),
+        "browser": device_info.get('browser'),
+        "os": device_info.get('os'),
+        "location": device_info.get('location'),
+        "success": True
+    }
+
+
+def _failed_login_row(email, ip_address=None, user_agent=None, reason="Invalid credentials") -> Dict[str, Any]:
+    return {
+        "email": email,
+        "attempt_time": datetime.utcnow().isoformat(),
+        "ip_address": ip_address,
+        "user_agent": user_agent,
+        "reason": reason
+    }
+
+
+def _signup_row(user_id, email, full_name=None, ip_address=None, user_agent=None,
+                device_info=None, referral_source=None) -> Dict[str, Any]:
+    device_info = device_info or {}
+    return {
+        "user_id": user_id,
+        "email": email,
+        "full_name": full_name,
+        "signup_time": datetime.utcnow().isoformat(),
+        "ip_address": ip_address,
+        "user_agent": user_agent,
+        "device_type": device_info.get('device_type'),
+        "browser": device_info.get('browser'),
+        "os": device_info.get('os'),
+        "location": device_info.get('location'),
+        "referral_source": referral_source
+    }
+
+
+def _activity_row(user_id, email, activity_type, activity_description=None,
+                  ip_address=None, metadata=None) -> Dict[str, Any]:
+    return {
+        "user_id": user_id,
+        "email": email,
+        "activity_type": activity_type,
+        "activity_description": activity_description,
+        "timestamp": datetime.utcnow().isoformat(),
+        "ip_address": ip_address,
+        "metadata": json.dumps(metadata) if metadata else None
+    }
+
+
+def _session_row(user_id, email, session_token, ip_address=None) -> Dict[str, Any]:
+    now = datetime.utcnow().isoformat()
+    return {
+        "user_id": user_id,
+        "email": email,
+        "session_token": session_token,
+        "login_time": now,
+        "last_activity": now,
+        "ip_address": ip_address,
+        "is_active": True
+    }
 
 
 # ============= LOGIN TRACKING =============
@@ -130,25 +273,15 @@ def log_user_login(
     email: str,
     ip_address: Optional[str] = None,
     user_agent: Optional[str] = None,
-    device_info: Optional[Dict[str, str]] = None
+    device_info: Optional[Dict[str, str]] = None,
+    conn=None
 ) -> int:
     """Log successful user login"""
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        
-        device_type = device_info.get('device_type') if device_info else None
-        browser = device_info.get('browser') if device_info else None
-        os = device_info.get('os') if device_info else None
-        location = device_info.get('location') if device_info else None
-        
-        cursor.execute("""
-            INSERT INTO user_login_history 
-            (user_id, email, login_time, ip_address, user_agent, device_type, browser, os, location, success)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 1)
-        """, (user_id, email, datetime.utcnow().isoformat(), ip_address, user_agent, 
-              device_type, browser, os, location))
-        
-        login_id = cursor.lastrowid
+    row = _login_row(user_id, email, ip_address, user_agent, device_info)
+    with get_connection(conn) as conn:
+        result = conn.execute(insert(_route(user_login_history, row)).values(**row))
+
+        login_id = result.inserted_primary_key[0]
         logger.info(f"✅ Login logged: {email} (ID: {login_id})")
         return login_id
 
@@ -160,47 +293,32 @@ def log_failed_login(
     reason: str = "Invalid credentials"
 ) -> int:
     """Log failed login attempt"""
+    row = _failed_login_row(email, ip_address, user_agent, reason)
     with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO failed_login_attempts 
-            (email, attempt_time, ip_address, user_agent, reason)
-            VALUES (?, ?, ?, ?, ?)
-        """, (email, datetime.utcnow().isoformat(), ip_address, user_agent, reason))
-        
-        attempt_id = cursor.lastrowid
+        result = conn.execute(insert(_route(failed_login_attempts, row)).values(**row))
+
+        attempt_id = result.inserted_primary_key[0]
         logger.warning(f"⚠️ Failed login: {email} - {reason}")
         return attempt_id
 
 
 def get_user_login_history(user_id: int, limit: int = 50) -> List[Dict[str, Any]]:
     """Get user's login history"""
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT * FROM user_login_history 
-            WHERE user_id = ? 
-            ORDER BY login_time DESC 
-            LIMIT ?
-        """, (user_id, limit))
-        
-        columns = [description[0] for description in cursor.description]
-        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+    return _newest(login_history, lambda t: t.c.user_id == user_id, limit)
 
 
 def get_failed_login_attempts(email: str, hours: int = 24) -> List[Dict[str, Any]]:
     """Get failed login attempts for an email in the last N hours"""
+    cutoff = _cutoff(hours=hours)
+    rows = []
     with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT * FROM failed_login_attempts 
-            WHERE email = ? 
-            AND attempt_time >= datetime('now', ? || ' hours')
-            ORDER BY attempt_time DESC
-        """, (email, -hours))
-        
-        columns = [description[0] for description in cursor.description]
-        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+        for table in failed_logins.covering(cutoff):
+            rows += _rows(conn.execute(
+                select(table)
+                .where(table.c.email == email, table.c.attempt_time >= cutoff)
+                .order_by(table.c.attempt_time.desc())
+            ))
+    return rows
 
 
 # ============= SIGNUP TRACKING =============
@@ -212,26 +330,16 @@ def log_user_signup(
     ip_address: Optional[str] = None,
     user_agent: Optional[str] = None,
     device_info: Optional[Dict[str, str]] = None,
-    referral_source: Optional[str] = None
+    referral_source: Optional[str] = None,
+    conn=None
 ) -> int:
     """Log new user signup"""
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        
-        device_type = device_info.get('device_type') if device_info else None
-        browser = device_info.get('browser') if device_info else None
-        os = device_info.get('os') if device_info else None
-        location = device_info.get('location') if device_info else None
-        
-        cursor.execute("""
-            INSERT INTO user_signup_history 
-            (user_id, email, full_name, signup_time, ip_address, user_agent, 
-             device_type, browser, os, location, referral_source)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (user_id, email, full_name, datetime.utcnow().isoformat(), ip_address, 
-              user_agent, device_type, browser, os, location, referral_source))
-        
-        signup_id = cursor.lastrowid
+    with get_connection(conn) as conn:
+        result = conn.execute(insert(user_signup_history).values(
+            **_signup_row(user_id, email, full_name, ip_address, user_agent, device_info, referral_source)
+        ))
+
+        signup_id = result.inserted_primary_key[0]
         logger.info(f"✅ Signup logged: {email} (ID: {signup_id})")
         return signup_id
 
@@ -239,16 +347,12 @@ def log_user_signup(
 def get_recent_signups(days: int = 7, limit: int = 100) -> List[Dict[str, Any]]:
     """Get recent signups"""
     with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT * FROM user_signup_history 
-            WHERE signup_time >= datetime('now', ? || ' days')
-            ORDER BY signup_time DESC 
-            LIMIT ?
-        """, (-days, limit))
-        
-        columns = [description[0] for description in cursor.description]
-        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+        return _rows(conn.execute(text("""
+            SELECT * FROM user_signup_history
+            WHERE signup_time >= :cutoff
+            ORDER BY signup_time DESC
+            LIMIT :limit
+        """), {"cutoff": _cutoff(days=days), "limit": limit}))
 
 
 # ============= ACTIVITY TRACKING =============
@@ -259,40 +363,21 @@ def log_user_activity(
     activity_type: str,
     activity_description: Optional[str] = None,
     ip_address: Optional[str] = None,
-    metadata: Optional[Dict[str, Any]] = None
+    metadata: Optional[Dict[str, Any]] = None,
+    conn=None
 ) -> int:
     """Log user activity"""
-    import json
-    
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        
-        metadata_json = json.dumps(metadata) if metadata else None
-        
-        cursor.execute("""
-            INSERT INTO user_activity_log 
-            (user_id, email, activity_type, activity_description, timestamp, ip_address, metadata)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (user_id, email, activity_type, activity_description, 
-              datetime.utcnow().isoformat(), ip_address, metadata_json))
-        
-        activity_id = cursor.lastrowid
+    row = _activity_row(user_id, email, activity_type, activity_description, ip_address, metadata)
+    with get_connection(conn) as conn:
+        result = conn.execute(insert(_route(user_activity_log, row)).values(**row))
+
+        activity_id = result.inserted_primary_key[0]
         return activity_id
 
 
 def get_user_activity(user_id: int, limit: int = 100) -> List[Dict[str, Any]]:
     """Get user's activity log"""
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT * FROM user_activity_log 
-            WHERE user_id = ? 
-            ORDER BY timestamp DESC 
-            LIMIT ?
-        """, (user_id, limit))
-        
-        columns = [description[0] for description in cursor.description]
-        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+    return _newest(activity_log, lambda t: t.c.user_id == user_id, limit)
 
 
 # ============= SESSION MANAGEMENT =============
@@ -301,100 +386,159 @@ def create_user_session(
     user_id: int,
     email: str,
     session_token: str,
-    ip_address: Optional[str] = None
+    ip_address: Optional[str] = None,
+    conn=None
 ) -> int:
     """Create new user session"""
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        now = datetime.utcnow().isoformat()
-        
-        cursor.execute("""
-            INSERT INTO user_sessions 
-            (user_id, email, session_token, login_time, last_activity, ip_address, is_active)
-            VALUES (?, ?, ?, ?, ?, ?, 1)
-        """, (user_id, email, session_token, now, now, ip_address))
-        
-        session_id = cursor.lastrowid
+    with get_connection(conn) as conn:
+        result = conn.execute(insert(user_sessions).values(
+            **_session_row(user_id, email, session_token, ip_address)
+        ))
+
+        session_id = result.inserted_primary_key[0]
         logger.info(f"✅ Session created: {email} (Session ID: {session_id})")
         return session_id
 
 
 def update_session_activity(session_token: str):
-    """Update session last activity time"""
+    """Update session last activity time (batched by the session tracker when it runs)"""
+    from session_tracker import session_tracker
+    if session_tracker.running:
+        session_tracker.touch(session_token)
+        return
     with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            UPDATE user_sessions 
-            SET last_activity = ? 
-            WHERE session_token = ? AND is_active = 1
-        """, (datetime.utcnow().isoformat(), session_token))
+        conn.execute(text("""
+            UPDATE user_sessions
+            SET last_activity = :now
+            WHERE session_token = :token AND is_active = :active
+        """), {"now": datetime.utcnow().isoformat(), "token": session_token, "active": True})
 
 
 def end_user_session(session_token: str):
     """End user session (logout)"""
+    # The session row may still be queued in the write-behind buffer
+    activity_writer.flush()
     with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            UPDATE user_sessions 
-            SET logout_time = ?, is_active = 0 
-            WHERE session_token = ? AND is_active = 1
-        """, (datetime.utcnow().isoformat(), session_token))
-        
+        conn.execute(text("""
+            UPDATE user_sessions
+            SET logout_time = :now, is_active = :inactive
+            WHERE session_token = :token AND is_active = :active
+        """), {"now": datetime.utcnow().isoformat(), "token": session_token, "active": True, "inactive": False})
+
         logger.info(f"✅ Session ended: {session_token[:20]}...")
 
 
 def get_active_sessions(user_id: int) -> List[Dict[str, Any]]:
     """Get user's active sessions"""
     with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT * FROM user_sessions 
-            WHERE user_id = ? AND is_active = 1 
-            ORDER BY last_activity DESC
-        """, (user_id,))
-        
-        columns = [description[0] for description in cursor.description]
-        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+        return _rows(conn.execute(
+            select(user_sessions)
+            .where(user_sessions.c.user_id == user_id, _session_active)
+            .order_by(user_sessions.c.last_activity.desc())
+        ))
+
+
+# ============= COMBINED WRITES =============
+# Used on the login and register paths. With ACTIVITY_WRITE_BEHIND the rows
+# go to the activity writer queue and are group-committed in the background;
+# otherwise they are written here in a single transaction.
+
+def _record(rows) -> bool:
+    """Queue or write a group of (table, row) pairs; returns True if queued"""
+    if settings.ACTIVITY_WRITE_BEHIND and activity_writer.running:
+        for table, row in rows:
+            activity_writer.enqueue(_route(table, row), row)
+        return True
+
+    with get_connection() as conn:
+        for table, row in rows:
+            conn.execute(insert(_route(table, row)).values(**row))
+    return False
+
+
+def record_login(
+    user_id: int,
+    email: str,
+    session_token: str,
+    ip_address: Optional[str] = None,
+    user_agent: Optional[str] = None,
+    device_info: Optional[Dict[str, str]] = None
+):
+    """Log a successful login, its activity entry and the new session"""
+    _record([
+        (user_login_history, _login_row(user_id, email, ip_address, user_agent, device_info)),
+        (user_activity_log, _activity_row(
+            user_id, email, "login", "User logged in successfully", ip_address
+        )),
+        (user_sessions, _session_row(user_id, email, session_token, ip_address))
+    ])
+
+
+def record_signup(
+    user_id: int,
+    email: str,
+    full_name: Optional[str],
+    role: str,
+    session_token: str,
+    ip_address: Optional[str] = None,
+    user_agent: Optional[str] = None
+):
+    """Log a signup, its activity entry and the first session"""
+    _record([
+        (user_signup_history, _signup_row(user_id, email, full_name, ip_address, user_agent)),
+        (user_activity_log, _activity_row(
+            user_id, email, "signup", f"User registered successfully as {role}", ip_address
+        )),
+        (user_sessions, _session_row(user_id, email, session_token, ip_address))
+    ])
+
+
+def record_failed_login(
+    email: str,
+    ip_address: Optional[str] = None,
+    user_agent: Optional[str] = None,
+    reason: str = "Invalid credentials"
+):
+    """Log a failed login attempt"""
+    _record([(failed_login_attempts, _failed_login_row(email, ip_address, user_agent, reason))])
+    logger.warning(f"⚠️ Failed login: {email} - {reason}")
 
 
 # ============= STATISTICS =============
 
 def get_login_stats(days: int = 30) -> Dict[str, Any]:
     """Get login statistics"""
+    cutoff = _cutoff(days=days)
+    # Only the months inside the window are read
+    logins = login_history.covering(cutoff)
     with get_connection() as conn:
-        cursor = conn.cursor()
-        
         # Total logins
-        cursor.execute("""
-            SELECT COUNT(*) FROM user_login_history 
-            WHERE login_time >= datetime('now', ? || ' days')
-        """, (-days,))
-        total_logins = cursor.fetchone()[0]
-        
-        # Unique users
-        cursor.execute("""
-            SELECT COUNT(DISTINCT user_id) FROM user_login_history 
-            WHERE login_time >= datetime('now', ? || ' days')
-        """, (-days,))
-        unique_users = cursor.fetchone()[0]
-        
+        total_logins = sum(conn.execute(
+            select(func.count()).select_from(t).where(t.c.login_time >= cutoff)
+        ).scalar() for t in logins)
+
+        # Unique users (DISTINCT per month; UNION removes users seen in several)
+        unique_users = conn.execute(select(func.count()).select_from(
+            union(*(select(t.c.user_id).where(t.c.login_time >= cutoff).distinct() for t in logins)).subquery()
+        )).scalar()
+
         # Failed attempts
-        cursor.execute("""
-            SELECT COUNT(*) FROM failed_login_attempts 
-            WHERE attempt_time >= datetime('now', ? || ' days')
-        """, (-days,))
-        failed_attempts = cursor.fetchone()[0]
-        
-        # Daily login counts
-        cursor.execute("""
-            SELECT DATE(login_time) as date, COUNT(*) as count
-            FROM user_login_history 
-            WHERE login_time >= datetime('now', ? || ' days')
-            GROUP BY DATE(login_time)
-            ORDER BY date DESC
-        """, (-days,))
-        daily_logins = [dict(zip(['date', 'count'], row)) for row in cursor.fetchall()]
-        
+        failed_attempts = sum(conn.execute(
+            select(func.count()).select_from(t).where(t.c.attempt_time >= cutoff)
+        ).scalar() for t in failed_logins.covering(cutoff))
+
+        # Daily login counts (the date is the first 10 characters of the ISO timestamp);
+        # a day never spans two partitions, so per-partition groups are final
+        daily_logins = []
+        for t in logins:
+            day = func.substr(t.c.login_time, 1, 10)
+            daily_logins += _rows(conn.execute(
+                select(day.label("date"), func.count().label("count"))
+                .where(t.c.login_time >= cutoff)
+                .group_by(day)
+                .order_by(day.desc())
+            ))
+
         return {
             'total_logins': total_logins,
             'unique_users': unique_users,
@@ -407,25 +551,23 @@ def get_login_stats(days: int = 30) -> Dict[str, Any]:
 def get_signup_stats(days: int = 30) -> Dict[str, Any]:
     """Get signup statistics"""
     with get_connection() as conn:
-        cursor = conn.cursor()
-        
+        params = {"cutoff": _cutoff(days=days)}
+
         # Total signups
-        cursor.execute("""
-            SELECT COUNT(*) FROM user_signup_history 
-            WHERE signup_time >= datetime('now', ? || ' days')
-        """, (-days,))
-        total_signups = cursor.fetchone()[0]
-        
+        total_signups = conn.execute(text("""
+            SELECT COUNT(*) FROM user_signup_history
+            WHERE signup_time >= :cutoff
+        """), params).scalar()
+
         # Daily signup counts
-        cursor.execute("""
-            SELECT DATE(signup_time) as date, COUNT(*) as count
-            FROM user_signup_history 
-            WHERE signup_time >= datetime('now', ? || ' days')
-            GROUP BY DATE(signup_time)
+        daily_signups = _rows(conn.execute(text("""
+            SELECT SUBSTR(signup_time, 1, 10) as date, COUNT(*) as count
+            FROM user_signup_history
+            WHERE signup_time >= :cutoff
+            GROUP BY SUBSTR(signup_time, 1, 10)
             ORDER BY date DESC
-        """, (-days,))
-        daily_signups = [dict(zip(['date', 'count'], row)) for row in cursor.fetchall()]
-        
+        """), params))
+
         return {
             'total_signups': total_signups,
             'daily_signups': daily_signups,
@@ -435,30 +577,34 @@ def get_signup_stats(days: int = 30) -> Dict[str, Any]:
 
 def get_user_activity_summary(user_id: int) -> Dict[str, Any]:
     """Get user activity summary"""
+    logins = login_history.covering()
     with get_connection() as conn:
-        cursor = conn.cursor()
-        
         # Total logins
-        cursor.execute("SELECT COUNT(*) FROM user_login_history WHERE user_id = ?", (user_id,))
-        total_logins = cursor.fetchone()[0]
-        
-        # Last login
-        cursor.execute("""
-            SELECT login_time FROM user_login_history 
-            WHERE user_id = ? 
-            ORDER BY login_time DESC LIMIT 1
-        """, (user_id,))
-        last_login_row = cursor.fetchone()
-        last_login = last_login_row[0] if last_login_row else None
-        
+        total_logins = sum(conn.execute(
+            select(func.count()).select_from(t).where(t.c.user_id == user_id)
+        ).scalar() for t in logins)
+
+        # Last login (newest month with one)
+        last_login = None
+        for t in logins:
+            last_login = conn.execute(
+                select(func.max(t.c.login_time)).where(t.c.user_id == user_id)
+            ).scalar()
+            if last_login is not None:
+                break
+
         # Total activities
-        cursor.execute("SELECT COUNT(*) FROM user_activity_log WHERE user_id = ?", (user_id,))
-        total_activities = cursor.fetchone()[0]
-        
+        total_activities = sum(conn.execute(
+            select(func.count()).select_from(t).where(t.c.user_id == user_id)
+        ).scalar() for t in activity_log.covering())
+
         # Active sessions
-        cursor.execute("SELECT COUNT(*) FROM user_sessions WHERE user_id = ? AND is_active = 1", (user_id,))
-        active_sessions = cursor.fetchone()[0]
-        
+        active_sessions = conn.execute(
+            select(func.count())
+            .select_from(user_sessions)
+            .where(user_sessions.c.user_id == user_id, _session_active)
+        ).scalar()
+
         return {
             'total_logins': total_logins,
             'last_login': last_login,
@@ -473,13 +619,13 @@ def parse_user_agent(user_agent: str) -> Dict[str, str]:
     """Parse user agent string to extract device info"""
     if not user_agent:
         return {}
-    
+
     device_info = {
         'device_type': 'Unknown',
         'browser': 'Unknown',
         'os': 'Unknown'
     }
-    
+
     # Detect device type
     if 'Mobile' in user_agent or 'Android' in user_agent:
         device_info['device_type'] = 'Mobile'
@@ -487,7 +633,7 @@ def parse_user_agent(user_agent: str) -> Dict[str, str]:
         device_info['device_type'] = 'Tablet'
     else:
         device_info['device_type'] = 'Desktop'
-    
+
     # Detect browser
     if 'Chrome' in user_agent:
         device_info['browser'] = 'Chrome'
@@ -497,7 +643,7 @@ def parse_user_agent(user_agent: str) -> Dict[str, str]:
         device_info['browser'] = 'Safari'
     elif 'Edge' in user_agent:
         device_info['browser'] = 'Edge'
-    
+
     # Detect OS
     if 'Windows' in user_agent:
         device_info['os'] = 'Windows'
@@ -509,7 +655,7 @@ def parse_user_agent(user_agent: str) -> Dict[str, str]:
         device_info['os'] = 'Android'
     elif 'iOS' in user_agent or 'iPhone' in user_agent:
         device_info['os'] = 'iOS'
-    
+
     return device_info
 
 
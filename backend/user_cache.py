@@ -0,0 +1,209 @@
+"""
+Authenticated-user cache
+TTL + LRU cache of resolved User rows keyed by token subject (email), so
+get_current_user does not query the users table on every request. Entries
+are detached copies, never shared with a session. Any committed change to a
+User row through the ORM (update_user, delete_user, profile edits) evicts
+that user here at once, and is logged in user_cache_invalidations in the
+same transaction; every worker polls the log at most every `sync_interval`
+seconds before serving a hit, so a deactivated or edited user is stale in
+other workers for at most that long (the TTL only bounds it if polling fails).
+"""
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy import Column, DateTime, Integer, String, Table, delete, event, func, insert, inspect, select
+from sqlalchemy.orm import Session
+import models
+from config import settings
+from database import Base, engine
+from logger import logger
+
+_INVALIDATE_KEY = "user_cache_invalidate"
+
+# AUTOINCREMENT: ids never go back after a purge, so "id > last seen" stays exact
+invalidations = Table(
+    "user_cache_invalidations", Base.metadata,
+    Column("id", Integer, primary_key=True),
+    Column("email", String, nullable=False),
+    Column("created_at", DateTime, nullable=False, index=True),
+    sqlite_autoincrement=True
+)
+
+
+def detached_copy(user: models.User) -> models.User:
+    """Transient User carrying only column values (no lazy relationships)"""
+    return models.User(**{attr.key: getattr(user, attr.key) for attr in inspect(models.User).column_attrs})
+
+
+class UserCache:
+    def __init__(self, ttl_seconds: float = 60, max_size: int = 10000, sync_interval_seconds: float = 1):
+        self.ttl = ttl_seconds
+        self.max_size = max_size
+        self.sync_interval = sync_interval_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._synced_id: Optional[int] = None
+        self._next_sync = 0.0
+        self._next_purge = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.remote_invalidations = 0
+        self.sync_failures = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_size > 0
+
+    def get(self, subject: str) -> Optional[models.User]:
+        if self.enabled:
+            self.sync()
+        with self._lock:
+            entry = self._entries.get(subject)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, user = entry
+            if expires_at <= time.monotonic():
+                del self._entries[subject]
+                self.expired += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(subject)
+            self.hits += 1
+            return user
+
+    def put(self, subject: str, user: models.User):
+        if not self.enabled:
+            return
+        entry = (time.monotonic() + self.ttl, detached_copy(user))
+        with self._lock:
+            self._entries[subject] = entry
+            self._entries.move_to_end(subject)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, subject: str):
+        with self._lock:
+            if self._entries.pop(subject, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def sync(self, force: bool = False):
+        """Evict users changed by other workers since the last poll"""
+        now = time.monotonic()
+        if not force and now < self._next_sync:
+            return
+        # One poller at a time; other threads serve from the cache meanwhile
+        if not self._sync_lock.acquire(blocking=False):
+            return
+        try:
+            self._next_sync = now + self.sync_interval
+            with engine.connect() as conn:
+                if self._synced_id is None:
+                    # First poll (before the first lookup, so nothing is cached yet): start at the end
+                    self._synced_id = conn.execute(select(func.max(invalidations.c.id))).scalar() or 0
+                    return
+                rows = conn.execute(
+                    select(invalidations.c.id, invalidations.c.email)
+                    .where(invalidations.c.id > self._synced_id)
+                    .order_by(invalidations.c.id)
+                ).all()
+            if rows:
+                self._synced_id = rows[-1].id
+                with self._lock:
+                    for row in rows:
+                        if self._entries.pop(row.email, None) is not None:
+                            self.remote_invalidations += 1
+            if now >= self._next_purge:
+                self._next_purge = now + max(self.ttl, 60)
+                self._purge()
+        except Exception as e:
+            # Entries still expire after the TTL
+            self.sync_failures += 1
+            logger.warning(f"⚠️ User cache sync failed: {e}")
+        finally:
+            self._sync_lock.release()
+
+    def _purge(self):
+        """Drop log rows older than any entry they could still evict"""
+        cutoff = datetime.utcnow() - timedelta(seconds=self.ttl + self.sync_interval + 60)
+        with engine.begin() as conn:
+            conn.execute(delete(invalidations).where(invalidations.c.created_at < cutoff))
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+                "sync_interval_seconds": self.sync_interval,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "expired": self.expired,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "remote_invalidations": self.remote_invalidations,
+                "sync_failures": self.sync_failures
+            }
+
+
+user_cache = UserCache(
+    ttl_seconds=settings.USER_CACHE_TTL_SECONDS,
+    max_size=settings.USER_CACHE_MAX_SIZE,
+    sync_interval_seconds=settings.USER_CACHE_SYNC_SECONDS
+)
+
+
+# ============= INVALIDATION =============
+
+def _mark(connection, target: models.User):
+    """
+    Evict now and again after commit, so a request racing the commit can't
+    re-cache the old row, and log the eviction for the other workers in the
+    same transaction (rolled back with it)
+    """
+    session = inspect(target).session
+    emails = {target.email}
+    history = inspect(target).attrs.email.history
+    emails.update(email for email in history.deleted or () if email)
+    for email in emails:
+        user_cache.invalidate(email)
+        if session is not None:
+            session.info.setdefault(_INVALIDATE_KEY, set()).add(email)
+    now = datetime.utcnow()
+    connection.execute(insert(invalidations), [{"email": email, "created_at": now} for email in emails])
+
+
+@event.listens_for(models.User, "after_update")
+def _user_updated(mapper, connection, target):
+    _mark(connection, target)
+
+
+@event.listens_for(models.User, "after_delete")
+def _user_deleted(mapper, connection, target):
+    _mark(connection, target)
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session):
+    for email in session.info.pop(_INVALIDATE_KEY, ()):
+        user_cache.invalidate(email)
+
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session):
+    session.info.pop(_INVALIDATE_KEY, None)
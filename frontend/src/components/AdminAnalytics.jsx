@@ -4,37 +4,35 @@ import axios from 'axios'
 const API_URL = import.meta.env.VITE_API_URL || 'http://localhost:8000'
 
 export default function AdminAnalytics({ stats }) {
-  const [predictions, setPredictions] = useState([])
+  const [analytics, setAnalytics] = useState(null)
   const [loading, setLoading] = useState(true)
 
   useEffect(() => {
-    fetchPredictions()
+    fetchAnalytics()
   }, [])
 
-  const fetchPredictions = async () => {
+  // Aggregated server-side (last 30 days by default) instead of downloading every prediction
+  const fetchAnalytics = async () => {
     try {
       const token = localStorage.getItem('token')
-      const response = await axios.get(`${API_URL}/api/admin/predictions`, {
+      const response = await axios.get(`${API_URL}/api/admin/analytics`, {
         headers: { Authorization: `Bearer ${token}` }
       })
-      setPredictions(response.data || [])
+      setAnalytics(response.data)
     } catch (error) {
-      console.error('Error fetching predictions:', error)
+      console.error('Error fetching analytics:', error)
     } finally {
       setLoading(false)
     }
   }
 
   const calculateAccuracy = () => {
-    if (predictions.length === 0) return 0
-    const highConfidence = predictions.filter(p => p.confidence > 0.9).length
-    return ((highConfidence / predictions.length) * 100).toFixed(1)
+    if (!analytics) return 0
+    return (analytics.totals.high_confidence_rate * 100).toFixed(1)
   }
 
   const getRecentActivity = () => {
-    return predictions
-      .sort((a, b) => new Date(b.created_at) - new Date(a.created_at))
-      .slice(0, 10)
+    return analytics ? analytics.recent : []
   }
 
   const getInfectionRate = () => {
@@ -60,7 +58,7 @@ export default function AdminAnalytics({ stats }) {
           <div className="text-3xl font-bold">{calculateAccuracy()}%</div>
           <div className="text-sm opacity-90">High Confidence</div>
           <div className="mt-2 text-xs opacity-75">
-            Confidence &gt; 90%
+            Confidence &gt; 90% (last 30 days)
           </div>
         </div>
 
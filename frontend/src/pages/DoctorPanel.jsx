@@ -22,6 +22,77 @@ export default function DoctorPanel() {
     fetchDoctorData()
   }, [])
 
+  // Live updates: apply pushed deltas instead of re-fetching every list
+  useEffect(() => {
+    if (!localStorage.getItem('token')) return
+    let events = null
+    let closed = false
+    const removeCase = (e) => {
+      const { id, doctor_id } = JSON.parse(e.data)
+      // Cases claimed by another doctor leave this queue; our own claims stay
+      if (doctor_id !== user?.id || e.type === 'case.reviewed') {
+        setPendingCases((cases) => cases.filter((c) => c.id !== id))
+      }
+    }
+    const connect = async () => {
+      // Short-lived token scoped to the stream; the session JWT never goes in a URL
+      const { data } = await axios.post(`${API_URL}/api/auth/media-token`, null, { params: { scope: 'events' } })
+      if (closed) return
+      events = new EventSource(`${API_URL}/api/events?topics=prediction,case,appointment&access_token=${data.access_token}`)
+      events.addEventListener('prediction.created', (e) => {
+        const prediction = JSON.parse(e.data)
+        setPendingCases((cases) => [...cases, prediction].sort(
+          (a, b) => (b.priority || 0) - (a.priority || 0) || new Date(a.created_at) - new Date(b.created_at)
+        ))
+      })
+      events.addEventListener('case.claimed', removeCase)
+      events.addEventListener('case.reviewed', removeCase)
+      events.addEventListener('case.released', () => fetchPendingCases())
+      events.addEventListener('appointment.created', () => fetchAppointments())
+      events.addEventListener('appointment.updated', (e) => {
+        const change = JSON.parse(e.data)
+        setAppointments((apts) => apts.map((a) => (a.id === change.id ? { ...a, ...change } : a)))
+      })
+      events.addEventListener('appointment.deleted', (e) => {
+        const { id } = JSON.parse(e.data)
+        setAppointments((apts) => apts.filter((a) => a.id !== id))
+      })
+      // Fell too far behind for deltas: reload once
+      events.addEventListener('resync', () => fetchDoctorData())
+      // The browser reconnects with the same URL; once that token has expired
+      // the stream is closed, so fetch a fresh token and catch up
+      events.onerror = () => {
+        if (events.readyState === EventSource.CLOSED && !closed) {
+          setTimeout(() => {
+            if (closed) return
+            fetchDoctorData()
+            connect().catch(() => {})
+          }, 3000)
+        }
+      }
+    }
+    connect().catch((error) => console.error('Event stream unavailable:', error))
+    return () => {
+      closed = true
+      if (events) events.close()
+    }
+  }, [user?.id])
+
+  const fetchPendingCases = async () => {
+    const casesRes = await axios.get(`${API_URL}/api/doctor/pending-cases`)
+    setPendingCases(casesRes.data)
+  }
+
+  const fetchAppointments = async () => {
+    const appointmentsRes = await axios.get(`${API_URL}/api/doctor/appointments`)
+    setAppointments(appointmentsRes.data)
+  }
+
+  const fetchStats = async () => {
+    const statsRes = await axios.get(`${API_URL}/api/doctor/stats`)
+    setStats(statsRes.data)
+  }
+
   const fetchDoctorData = async () => {
     try {
       setLoading(true)
@@ -54,7 +125,9 @@ export default function DoctorPanel() {
         notes,
         status: 'reviewed'
       })
-      fetchDoctorData()
+      setPendingCases((cases) => cases.filter((c) => c.id !== caseId))
+      // Our own review counts; no SSE event updates the doctor's stats
+      await fetchStats()
     } catch (error) {
       console.error('Error reviewing case:', error)
     }